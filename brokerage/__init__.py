@@ -7,11 +7,13 @@ from brokerage.quote import Quote
 from brokerage.reply import Reply
 from enums import OhlcType
 from submodule.Xu3.utils import getLogger
+from utils.jikan import TradingCalendar
 
 
 class Brokerage:
     # TODO: 報價、請求處理、回報(請求結果)
-    def __init__(self, logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+    def __init__(self, calendar: TradingCalendar = None,
+                 logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
         self.logger_dir = logger_dir
         self.logger_name = logger_name
         self.extra = {"className": self.__class__.__name__}
@@ -24,7 +26,8 @@ class Brokerage:
         self.logger.setLevel(self.logger_level)
 
         self.order = Order(logger_dir=self.logger_dir, logger_name=self.logger_name)
-        self.quote = Quote(logger_dir=self.logger_dir, logger_name=self.logger_name)
+        # 有提供交易日曆時，報價系統只讀取交易日的數據
+        self.quote = Quote(calendar=calendar, logger_dir=self.logger_dir, logger_name=self.logger_name)
         self.reply = Reply(logger_dir=self.logger_dir, logger_name=self.logger_name)
         self.setListener()
 
@@ -47,13 +50,21 @@ class Brokerage:
         # self.reply.onDayStartProcessed += self.onDayStartProcessedListener
         # self.reply.onDayEndProcessed += self.onDayEndProcessedListener
 
-    # 提供給策略連結 Quote 的日線數據監聽器
-    def setDayOhlcNotifyListener(self, listener):
-        self.quote.onOrderDayOhlcNotify += listener
-
-    # 提供給 RivalStrategy 連結 Quote 的分線數據監聽器
-    def setMinuteOhlcNotifyListener(self, listener):
-        self.quote.onOrderMinuteOhlcNotify += listener
+    # 提供給策略連結 Quote 的日線數據監聽器，若有提供 stock_ids，則只會收到這些股票的數據
+    def setDayOhlcNotifyListener(self, listener, stock_ids: list = None):
+        if stock_ids is None:
+            self.quote.onOrderDayOhlcNotify += listener
+        else:
+            for stock_id in stock_ids:
+                self.quote.subscribeTopic(ohlc_type=OhlcType.Day, stock_id=stock_id, listener=listener)
+
+    # 提供給 RivalStrategy 連結 Quote 的分線數據監聽器，若有提供 stock_ids，則只會收到這些股票的數據
+    def setMinuteOhlcNotifyListener(self, listener, stock_ids: list = None):
+        if stock_ids is None:
+            self.quote.onOrderMinuteOhlcNotify += listener
+        else:
+            for stock_id in stock_ids:
+                self.quote.subscribeTopic(ohlc_type=OhlcType.Minute, stock_id=stock_id, listener=listener)
 
     def subscribe(self, ohlc_type: OhlcType, request_ohlcs: list):
         # TODO: 回測系統的參數是策略，自動取出策略的 OhlcType 和相對應的股票代碼
@@ -71,6 +82,26 @@ class Brokerage:
         # TODO: 時間的推進應考慮其他系統，而非自顧自地推進
         self.quote.run(start_time=start_time, end_time=end_time)
 
+    def resume(self, end_time: datetime.datetime):
+        # 由快照還原後，從重播進度的下一天繼續
+        self.quote.resume(end_time=end_time)
+
+    # region 狀態快照
+    def getState(self) -> dict:
+        """
+        交易系統的委託簿與報價系統的重播進度，Reply 沒有需要保存的狀態
+
+        :return:
+        """
+        return {"order": self.order.getState(),
+                "quote": self.quote.getState()}
+
+    def setState(self, state: dict):
+        self.order.setState(state["order"])
+        self.quote.setState(state["quote"])
+
+    # endregion
+
 
 if __name__ == "__main__":
     from data import Inventory
@@ -89,7 +120,8 @@ if __name__ == "__main__":
         sleep(0.1)
 
 
-    brokerage = Brokerage()
+    # 以資料庫中的日線日期作為交易日，只重播交易日
+    brokerage = Brokerage(calendar=TradingCalendar.fromDatabase())
     brokerage.setLoggerLevel(level=logging.DEBUG)
 
     brokerage.setDayOhlcNotifyListener(listener=onOhlcNotifyListener1)
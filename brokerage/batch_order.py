@@ -0,0 +1,356 @@
+import datetime
+import logging
+from decimal import Decimal
+
+import numpy as np
+
+from enums import BuySell
+from submodule.Xu3.utils import getLogger
+from submodule.events import Event
+
+# 無期限的請求
+NEVER_EXPIRE = np.datetime64("9999-12-31T00:00", "m")
+
+
+# region 成交價模型: 可成交的請求(price 為限價)在 K 棒內的成交價
+def limitFill(is_buys, prices, opens, highs, lows):
+    """
+    與 Order.checkOhlcDeal(Request.dealOhlc) 相同: 購買以限價成交但不超過最高價，售出以限價成交但不低於最低價
+    """
+    return np.where(is_buys, np.minimum(prices, highs), np.maximum(prices, lows))
+
+
+def midFill(is_buys, prices, opens, highs, lows):
+    """
+    以 K 棒的中間價 (high + low) / 2 成交，但不比限價差
+    """
+    mids = (highs + lows) / 2.0
+
+    return np.where(is_buys, np.minimum(prices, mids), np.maximum(prices, mids))
+
+
+def gapFill(is_buys, prices, opens, highs, lows):
+    """
+    考慮開盤跳空: 開盤價已優於限價(購買: 開盤價 <= 限價；售出: 開盤價 >= 限價)時以開盤價成交，否則以限價成交
+    """
+    return np.where(is_buys,
+                    np.where(opens <= prices, opens, prices),
+                    np.where(opens >= prices, opens, prices))
+
+
+def worstFill(is_buys, prices, opens, highs, lows):
+    """
+    最差情況: 以對自己最不利的價格成交(購買: 限價與最高價取低者；售出: 限價與最低價取高者)，
+    成交條件另由 FILL_STRICT 要求價格須穿越限價(只碰觸到限價視為未成交)
+    """
+    return limitFill(is_buys, prices, opens, highs, lows)
+
+
+FILL_MODELS = {"limit": limitFill,
+               "mid": midFill,
+               "gap": gapFill,
+               "worst": worstFill}
+
+# 需要價格穿越限價才成交的模型
+FILL_STRICT = {"worst"}
+
+
+# endregion
+
+
+def matchOrders(stocks, sides, prices, volumns, opens, highs, lows, bar_volumns, times=None, fill_model="limit",
+                stop_after_fill=False):
+    """
+    以單次 NumPy 運算撮合所有股票的請求與同一時間的 K 棒。
+
+    可成交條件: 購買限價 >= 最低價；售出限價 <= 最高價；K 棒成交量 > 0。
+    同一檔股票的可成交請求共用 K 棒的成交量，優先順序與 Request.merge 相同:
+    價格偏離中間價越多越優先(購買價越高、售出價越低)，其次為購買、時間越早越優先，最後為輸入順序。
+
+    與 Order.checkOhlcDeal 的差異: Order 在某一請求完全成交後，即使 K 棒仍有剩餘成交量，
+    也不再撮合同一檔股票、同方向的其他請求；此處預設會將剩餘成交量繼續分配給後續的請求。
+    stop_after_fill=True 時重現 Order 的行為，每檔股票的 購買/售出 各只撮合優先順序最高的一筆可成交請求。
+
+    :param stocks: (n_request, ) 股票索引值(對應 K 棒陣列)
+    :param sides: (n_request, ) BuySell.Buy.value 或 BuySell.Sell.value
+    :param prices: (n_request, ) 限價
+    :param volumns: (n_request, ) 剩餘數量
+    :param opens: (n_stock, ) 開盤價
+    :param highs: (n_stock, ) 最高價
+    :param lows: (n_stock, ) 最低價
+    :param bar_volumns: (n_stock, ) 成交量
+    :param times: (n_request, ) 請求時間(datetime64)，None 時只以輸入順序排序
+    :param fill_model: FILL_MODELS 的名稱，或 fill(is_buys, prices, opens, highs, lows) 函式
+    :param stop_after_fill: 是否與 Order.checkOhlcDeal 相同，同一檔股票、同方向只撮合一筆請求
+    :return: 成交數量, 成交價(未成交者為 NaN), 剩餘數量
+    """
+    stocks = np.asarray(stocks, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    volumns = np.asarray(volumns, dtype=np.int64)
+    n_request = len(stocks)
+
+    if n_request == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), volumns
+
+    if times is None:
+        times = np.zeros(n_request, dtype=np.int64)
+    else:
+        times = np.asarray(times).astype("datetime64[m]").astype(np.int64)
+
+    is_buys = np.asarray(sides) == BuySell.Buy.value
+    opens = np.asarray(opens, dtype=np.float64)[stocks]
+    highs = np.asarray(highs, dtype=np.float64)[stocks]
+    lows = np.asarray(lows, dtype=np.float64)[stocks]
+    bar_volumns = np.nan_to_num(np.asarray(bar_volumns, dtype=np.float64)).astype(np.int64)
+
+    if callable(fill_model):
+        fill, is_strict = fill_model, False
+    else:
+        fill, is_strict = FILL_MODELS[fill_model], fill_model in FILL_STRICT
+
+    with np.errstate(invalid="ignore"):
+        if is_strict:
+            is_crossed = np.where(is_buys, prices > lows, prices < highs)
+        else:
+            is_crossed = np.where(is_buys, prices >= lows, prices <= highs)
+
+    # 沒有數據的 K 棒(NaN)比較結果皆為 False
+    is_crossed &= (bar_volumns[stocks] > 0) & (volumns > 0)
+
+    # 價格偏離中間價的程度(越小越優先)
+    mids = (highs + lows) / 2.0
+    offsets = np.where(is_buys, mids - prices, prices - mids)
+
+    # 依 股票 -> 偏離程度 -> 買賣 -> 時間 -> 輸入順序 排序(np.lexsort 以最後一列為主要鍵值)
+    order = np.lexsort((np.arange(n_request), times, ~is_buys, offsets, stocks))
+    ordered_stocks = stocks[order]
+    wants = np.where(is_crossed, volumns, 0)[order]
+
+    if stop_after_fill:
+        # 每個 (股票, 買賣) 只保留優先順序最高的可成交請求
+        positions = np.flatnonzero(wants > 0)
+        groups = ordered_stocks[positions] * 2 + is_buys[order][positions]
+        _, firsts = np.unique(groups, return_index=True)
+        is_first = np.zeros(n_request, dtype=np.bool_)
+        is_first[positions[firsts]] = True
+        wants = np.where(is_first, wants, 0)
+
+    # 同一檔股票內，排在前面的請求累計需求量
+    cumsum = np.cumsum(wants)
+    group_starts = np.r_[0, np.flatnonzero(ordered_stocks[1:] != ordered_stocks[:-1]) + 1]
+    group_offsets = np.repeat(cumsum[group_starts] - wants[group_starts], np.diff(np.r_[group_starts, n_request]))
+    before = cumsum - wants - group_offsets
+
+    # K 棒成交量依優先順序分配
+    dealt = np.zeros(n_request, dtype=np.int64)
+    dealt[order] = np.clip(bar_volumns[ordered_stocks] - before, 0, wants)
+
+    deal_prices = np.where(dealt > 0, fill(is_buys, prices, opens, highs, lows), np.nan)
+
+    return dealt, deal_prices, volumns - dealt
+
+
+class BatchOrder:
+    """ 批次交易系統
+    以陣列保存所有股票的掛單，每根 K 棒以 matchOrders 一次撮合所有股票，取代 Order.checkOhlcDeal 逐檔、逐筆請求的迴圈。
+    成交後觸發與 Order 相同的事件: onBought / onSold(user, stock_id, guid, time, price, volumn)
+    """
+
+    def __init__(self, stock_ids: list, fill_model="limit", stop_after_fill=False,
+                 logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        :param stock_ids: 股票代碼，順序對應 match 時 K 棒陣列的索引值(例如 MarketCube.stock_ids)
+        :param fill_model: FILL_MODELS 的名稱，或 fill(is_buys, prices, opens, highs, lows) 函式
+        :param stop_after_fill: 是否與 Order.checkOhlcDeal 相同，同一檔股票、同方向只撮合一筆請求(參考 matchOrders)
+        """
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        self.stock_ids = list(stock_ids)
+        self.stock_index = {stock_id: index for index, stock_id in enumerate(self.stock_ids)}
+        self.fill_model = fill_model
+        self.stop_after_fill = stop_after_fill
+
+        # region 掛單(陣列)
+        self.stocks = np.zeros(0, dtype=np.int64)
+        self.sides = np.zeros(0, dtype=np.int8)
+        self.prices = np.zeros(0, dtype=np.float64)
+        self.volumns = np.zeros(0, dtype=np.int64)
+        self.times = np.zeros(0, dtype="datetime64[m]")
+        self.expirys = np.zeros(0, dtype="datetime64[m]")
+
+        # 觸發事件所需的原始資訊
+        self.users = np.zeros(0, dtype=object)
+        self.guids = np.zeros(0, dtype=object)
+        self.request_times = np.zeros(0, dtype=object)
+        # endregion
+
+        # 尚未併入陣列的新請求
+        self.new_requests = []
+
+        # region 事件
+        self.event = Event()
+
+        # 成功買入事件
+        # onBought(user, stock_id, guid, time, price, volumn)
+        self.onBought = self.event.onBought
+
+        # 成功賣出事件
+        # onSold(user, stock_id, guid, time, price, volumn)
+        self.onSold = self.event.onSold
+        # endregion
+
+    def __len__(self):
+        return len(self.stocks) + len(self.new_requests)
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level=level)
+
+    def addRequest(self, user: int, stock_id: str, guid: str, time: datetime.datetime, price: Decimal, volumn: int,
+                   buy_sell: BuySell, expiry: datetime.datetime = None):
+        self.new_requests.append((self.stock_index[stock_id], buy_sell.value, float(price), volumn, time,
+                                  NEVER_EXPIRE if expiry is None else expiry, user, guid))
+
+    # 收到'購買'請求後的處理
+    def buy(self, user: int, stock_id: str, guid: str, time: datetime.datetime, price: Decimal, volumn: int = 1,
+            expiry: datetime.datetime = None):
+        self.addRequest(user=user, stock_id=stock_id, guid=guid, time=time, price=price, volumn=volumn,
+                        buy_sell=BuySell.Buy, expiry=expiry)
+
+    def sell(self, user: int, stock_id: str, guid: str, time: datetime.datetime, price: Decimal, volumn: int = 1,
+             expiry: datetime.datetime = None):
+        self.addRequest(user=user, stock_id=stock_id, guid=guid, time=time, price=price, volumn=volumn,
+                        buy_sell=BuySell.Sell, expiry=expiry)
+
+    def flush(self):
+        # 將新請求併入陣列
+        if len(self.new_requests) == 0:
+            return
+
+        stocks, sides, prices, volumns, times, expirys, users, guids = zip(*self.new_requests)
+        self.new_requests = []
+
+        request_times = np.empty(len(times), dtype=object)
+        request_times[:] = times
+
+        self.stocks = np.concatenate([self.stocks, np.array(stocks, dtype=np.int64)])
+        self.sides = np.concatenate([self.sides, np.array(sides, dtype=np.int8)])
+        self.prices = np.concatenate([self.prices, np.array(prices, dtype=np.float64)])
+        self.volumns = np.concatenate([self.volumns, np.array(volumns, dtype=np.int64)])
+        self.times = np.concatenate([self.times, np.array(times, dtype="datetime64[m]")])
+        self.expirys = np.concatenate([self.expirys, np.array(expirys, dtype="datetime64[m]")])
+        self.users = np.concatenate([self.users, np.array(users, dtype=object)])
+        self.guids = np.concatenate([self.guids, np.array(guids, dtype=object)])
+        self.request_times = np.concatenate([self.request_times, request_times])
+
+    def keep(self, mask):
+        # 只保留 mask 為 True 的掛單
+        for name in ("stocks", "sides", "prices", "volumns", "times", "expirys", "users", "guids", "request_times"):
+            setattr(self, name, getattr(self, name)[mask])
+
+    def match(self, date_time: datetime.datetime, opens, highs, lows, volumns):
+        """
+        以所有股票同一時間的 K 棒撮合掛單，觸發成交事件，並移除完成交易與過期的請求
+
+        :param date_time: K 棒時間
+        :param opens: (n_stock, ) 開盤價(索引值對應 self.stock_ids，沒有數據者為 NaN)
+        :param highs: (n_stock, ) 最高價
+        :param lows: (n_stock, ) 最低價
+        :param volumns: (n_stock, ) 成交量
+        :return: 成交的請求 guid, 成交數量, 成交價
+        """
+        self.flush()
+
+        # 移除過期的請求
+        n_expired = int((self.expirys < np.datetime64(date_time, "m")).sum())
+
+        if n_expired > 0:
+            self.keep(self.expirys >= np.datetime64(date_time, "m"))
+
+        dealt, deal_prices, remains = matchOrders(stocks=self.stocks,
+                                                  sides=self.sides,
+                                                  prices=self.prices,
+                                                  volumns=self.volumns,
+                                                  opens=opens,
+                                                  highs=highs,
+                                                  lows=lows,
+                                                  bar_volumns=volumns,
+                                                  times=self.times,
+                                                  fill_model=self.fill_model,
+                                                  stop_after_fill=self.stop_after_fill)
+        indexs = np.flatnonzero(dealt > 0)
+
+        # 成交價轉為 Decimal(以"分"為單位)
+        decimal_prices = np.char.mod("%.2f", deal_prices[indexs]).tolist()
+
+        for index, deal_price in zip(indexs.tolist(), decimal_prices):
+            # 與 Order 相同，事件中的時間為請求時間
+            kwargs = dict(user=self.users[index],
+                          stock_id=self.stock_ids[self.stocks[index]],
+                          guid=self.guids[index],
+                          time=self.request_times[index],
+                          price=Decimal(deal_price),
+                          volumn=int(dealt[index]))
+
+            if self.sides[index] == BuySell.Buy.value:
+                self.onBought(**kwargs)
+            else:
+                self.onSold(**kwargs)
+
+        self.logger.info(f"time: {date_time}, #request: {len(self.stocks)}, #deal: {len(indexs)}, "
+                         f"#expired: {n_expired}", extra=self.extra)
+
+        # 過期與完成交易的請求會被移除，陣列索引值不具意義，因此以 guid 回傳
+        results = (self.guids[indexs], dealt[indexs], deal_prices[indexs])
+        self.volumns = remains
+        self.keep(remains > 0)
+
+        return results
+
+    def matchCube(self, cube, day_index: int):
+        """
+        :param cube: data.loader.market_cube.MarketCube，股票順序須與 self.stock_ids 相同
+        :param day_index: 時間軸的索引值
+        :return:
+        """
+        date_time = cube.times[day_index].astype(datetime.datetime)
+
+        return self.match(date_time=date_time,
+                          opens=cube.open[:, day_index],
+                          highs=cube.high[:, day_index],
+                          lows=cube.low[:, day_index],
+                          volumns=cube.volumn[:, day_index])
+
+
+if __name__ == "__main__":
+    def onBoughtListener(user, stock_id, guid, time, price, volumn):
+        print(f"onBoughtListener | user: {user}, stock_id: {stock_id}, guid: {guid}, time: {time}, price: {price}, "
+              f"volumn: {volumn}")
+
+
+    def onSoldListener(user, stock_id, guid, time, price, volumn):
+        print(f"onSoldListener | user: {user}, stock_id: {stock_id}, guid: {guid}, time: {time}, price: {price}, "
+              f"volumn: {volumn}")
+
+
+    batch_order = BatchOrder(stock_ids=["9527", "2812"], fill_model="gap")
+    batch_order.onBought += onBoughtListener
+    batch_order.onSold += onSoldListener
+
+    request_time = datetime.datetime(2021, 8, 20, 9, 0)
+    batch_order.buy(0, "9527", "0", request_time, Decimal("11.20"), 2)
+    batch_order.buy(1, "9527", "1", request_time, Decimal("11.30"), 1)
+    batch_order.sell(2, "2812", "2", request_time, Decimal("13.05"), 1, expiry=datetime.datetime(2021, 8, 20))
+
+    batch_order.match(date_time=datetime.datetime(2021, 8, 20),
+                      opens=np.array([11.25, 13.0]),
+                      highs=np.array([11.30, 13.0]),
+                      lows=np.array([11.15, 12.9]),
+                      volumns=np.array([2, 10]))
+    print(f"#request: {len(batch_order)}")
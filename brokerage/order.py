@@ -8,6 +8,7 @@ from data import parseOhlcData
 from enums import BuySell
 from submodule.Xu3.utils import getLogger
 from submodule.events import Event
+from utils.checkpoint import getState, setState
 
 
 @total_ordering
@@ -329,6 +330,16 @@ class Order:
     def onTickNotifyListener(self):
         pass
 
+    # region 狀態快照
+    def getState(self) -> dict:
+        # 尚未成交的請求(委託簿)
+        return getState(self, exclude=("onBought", "onSold"))
+
+    def setState(self, state: dict):
+        setState(self, state)
+
+    # endregion
+
     # 處理 buy_requests 和 sell_requests 之間的搓合
     def checkRequestDeal(self, stock_id):
         # 會在 buy() 或 sell() 的內部呼叫，而在呼叫前就會被排序，因此可以直接取用，無須再次排序
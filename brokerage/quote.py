@@ -1,10 +1,14 @@
 import datetime
 import logging
-import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 from data.loader.multi_database_loader import MultiDatabaseLoader
 from enums import OhlcType
 from submodule.Xu3.utils import getLogger
 from submodule.events import Event
+from utils.checkpoint import setState
+from utils.jikan import TradingCalendar
 
 
 class Quote:
@@ -12,8 +16,24 @@ class Quote:
     接受報價訂閱，並廣播價格(有訂閱的策略才會接收到)
     """
 
-    def __init__(self, logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+    # 每根 K 棒(OhlcData 物件及其字串)約略佔用的記憶體大小(bytes)
+    OHLC_BYTES = 1024
+
+    # 每檔股票每天的分線數量(09:00 ~ 13:30)
+    N_MINUTE_PER_DAY = 270
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, calendar: TradingCalendar = None,
+                 logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+
+        :param memory_budget: 讀取數據可使用的記憶體上限(bytes)，由"播放中"與"預先讀取中"的兩段數據共用
+        :param calendar: 交易日曆，提供時只讀取交易日的數據，每段數據以交易日計算天數；None 則逐日曆日讀取
+        :param logger_dir:
+        :param logger_name:
+        """
         super().__init__()
+        self.memory_budget = memory_budget
+        self.calendar = calendar
         self.logger_dir = logger_dir
         self.logger_name = logger_name
         self.extra = {"className": self.__class__.__name__}
@@ -44,6 +64,17 @@ class Quote:
         self.onDayStart = self.event.onDayStart
         self.onDayEnd = self.event.onDayEnd
 
+        # 主題訂閱: 監聽器只會收到所訂閱股票的數據 ohlc_type -> stock_id -> [listener, ...]
+        self.topics = {OhlcType.Day: defaultdict(list),
+                       OhlcType.Minute: defaultdict(list)}
+
+        # 預先建立的派送表 ohlc_type -> stock_id -> (listener, ...)，廣播時直接查表，不需逐一呼叫所有監聽器
+        self.dispatch_tables = {OhlcType.Day: dict(),
+                                OhlcType.Minute: dict()}
+
+        # 重播進度: 最後一個已播放完的日期，由快照還原後，可透過 resume 從下一天繼續播放
+        self.last_day = None
+
     def setLoggerLevel(self, level):
         self.logger.setLevel(level=level)
         self.multi_database_loader.setLoggerLevel(level=level)
@@ -51,6 +82,35 @@ class Quote:
     def subscribe(self, ohlc_type: OhlcType, request_ohlcs: list):
         self.multi_database_loader.subscribe(ohlc_type=ohlc_type, request_ohlcs=request_ohlcs)
 
+    def subscribeTopic(self, ohlc_type: OhlcType, stock_id: str, listener):
+        """
+        訂閱特定股票的數據，在 onOrderDayOhlcNotify / onOrderMinuteOhlcNotify 之後，
+        依派送表通知該股票的訂閱者，呼叫形式與 onOrderXXXOhlcNotify 相同: listener(stock_id, ohlc_data)
+
+        :param ohlc_type: OhlcType.Day or OhlcType.Minute
+        :param stock_id: 股票代碼
+        :param listener: 監聽器
+        :return:
+        """
+        listeners = self.topics[ohlc_type][stock_id]
+
+        if listener not in listeners:
+            listeners.append(listener)
+
+        self.dispatch_tables[ohlc_type][stock_id] = tuple(listeners)
+
+    def unsubscribeTopic(self, ohlc_type: OhlcType, stock_id: str, listener):
+        listeners = self.topics[ohlc_type][stock_id]
+
+        if listener in listeners:
+            listeners.remove(listener)
+
+        if len(listeners) == 0:
+            del self.topics[ohlc_type][stock_id]
+            self.dispatch_tables[ohlc_type].pop(stock_id, None)
+        else:
+            self.dispatch_tables[ohlc_type][stock_id] = tuple(listeners)
+
     def dayStart(self, day: datetime.date):
         self.logger.info(f"Day {day} start.", extra=self.extra)
         # self.pause()
@@ -60,61 +120,150 @@ class Quote:
         self.logger.info(f"Day {day} end.", extra=self.extra)
         # self.pause()
         self.onDayEnd(day)
+        self.last_day = day
 
-    def run(self, start_time: datetime.datetime, end_time: datetime.datetime):
-        n_day = (end_time - start_time).days
-        self.logger.debug(f"#time: {n_day}", extra=self.extra)
+    def getChunkDays(self) -> int:
+        """
+        根據記憶體上限，計算一次讀取幾天(有交易日曆時為幾個交易日)的數據。同時會有兩段數據存在(播放中 + 預先讀取中)，因此各分得一半的記憶體。
 
+        :return: 一段數據包含的天數(至少 1 天)
+        """
         n_day_request = self.multi_database_loader.getRequestStockNumber(OhlcType.Day)
         n_minute_request = self.multi_database_loader.getRequestStockNumber(OhlcType.Minute)
-        self.logger.debug(f"#day: {n_day_request}, #minute: {n_minute_request}", extra=self.extra)
 
-        # n_request = (n_day_request + n_minute_request * 270) * n_day
-        n_request = (n_day_request + n_minute_request * 500) * n_day
-        self.logger.debug(f"#request: {n_request}, patch_days: {math.ceil(50000.0 / n_request)}", extra=self.extra)
+        # 每天的 K 棒數量
+        n_ohlc_per_day = n_day_request + n_minute_request * self.N_MINUTE_PER_DAY
+        self.logger.debug(f"#day: {n_day_request}, #minute: {n_minute_request}, #ohlc/day: {n_ohlc_per_day}",
+                          extra=self.extra)
 
-        current_time = start_time
+        if n_ohlc_per_day == 0:
+            return 1
 
-        # n_request = 25000 -> 一次取得 2 天的數據；n_request = 15000 -> 一次取得 3.33 天(無條件進位為 4 天)的數據
-        # n_request ≧ 50000 -> 一次取得 1 天的數據
-        time_delta = datetime.timedelta(days=math.floor(50000.0 / n_request))
-        self.logger.debug(f"time_delta: {time_delta}", extra=self.extra)
+        n_ohlc = self.memory_budget // (2 * self.OHLC_BYTES)
 
-        next_current = time_delta + datetime.timedelta(days=1)
+        return max(1, n_ohlc // n_ohlc_per_day)
+
+    def setCalendar(self, calendar: TradingCalendar):
+        self.calendar = calendar
+
+    def splitChunks(self, start_time: datetime.datetime, end_time: datetime.datetime):
+        chunk_days = self.getChunkDays()
+        self.logger.debug(f"chunk_days: {chunk_days}", extra=self.extra)
+
+        if self.calendar is not None:
+            return self.splitTradingChunks(start_time=start_time, end_time=end_time, chunk_days=chunk_days)
+
+        chunks = []
+        current_time = start_time
 
         while current_time <= end_time:
-            pause_time = min(current_time + time_delta, end_time)
-            self.logger.info(f"start_time: {current_time}, end_time: {pause_time}", extra=self.extra)
+            pause_time = min(current_time + datetime.timedelta(days=chunk_days - 1), end_time)
+            chunks.append((current_time, pause_time))
+            current_time = pause_time + datetime.timedelta(days=1)
+
+        return chunks
+
+    def splitTradingChunks(self, start_time: datetime.datetime, end_time: datetime.datetime, chunk_days: int):
+        """
+        以交易日切分，每段包含 chunk_days 個交易日，非交易日(週末、國定假日)不佔用記憶體預算，也不會產生空的讀取
+
+        :param start_time: 開始時間
+        :param end_time: 結束時間
+        :param chunk_days: 一段數據包含的交易日數量
+        :return: [(開始時間, 結束時間), ...]
+        """
+        start_index = self.calendar.ceilIndex(start_time.date())
+        stop_index = self.calendar.floorIndex(end_time.date()) + 1
+        chunks = []
+
+        for index in range(start_index, stop_index, chunk_days):
+            first_day = self.calendar.getDay(index)
+            last_day = self.calendar.getDay(min(index + chunk_days, stop_index) - 1)
+
+            chunk_start = max(start_time, datetime.datetime.combine(first_day, datetime.time.min))
+            chunk_end = min(end_time, datetime.datetime.combine(last_day, datetime.time(23, 59)))
+            chunks.append((chunk_start, chunk_end))
+
+        return chunks
+
+    def run(self, start_time: datetime.datetime, end_time: datetime.datetime):
+        n_day = (end_time - start_time).days
+        self.logger.debug(f"#time: {n_day}", extra=self.extra)
+
+        chunks = self.splitChunks(start_time=start_time, end_time=end_time)
+        n_chunk = len(chunks)
+
+        if n_chunk == 0:
+            return
+
+        # 雙緩衝: 播放當前這段數據的同時，由背景執行緒讀取下一段數據(SQLite 讀取時會釋放 GIL)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.multi_database_loader.loadDayOhlcs, *chunks[0])
+
+            for c in range(n_chunk):
+                day_ohlcs = future.result()
+
+                if c + 1 < n_chunk:
+                    future = executor.submit(self.multi_database_loader.loadDayOhlcs, *chunks[c + 1])
+
+                self.logger.info(f"start_time: {chunks[c][0]}, end_time: {chunks[c][1]}", extra=self.extra)
+                self.replay(day_ohlcs=day_ohlcs)
+
+    def resume(self, end_time: datetime.datetime):
+        """
+        從重播進度(last_day)的下一天繼續播放至 end_time，尚未播放過任何一天時拋出 ValueError
+
+        :param end_time: 結束時間
+        :return:
+        """
+        if self.last_day is None:
+            raise ValueError("Quote has not replayed any day yet, use run(start_time, end_time) instead")
+
+        start_time = datetime.datetime.combine(self.last_day + datetime.timedelta(days=1), datetime.time())
+        self.run(start_time=start_time, end_time=end_time)
+
+    def replay(self, day_ohlcs: list):
+        day_dispatch = self.dispatch_tables[OhlcType.Day]
+        minute_dispatch = self.dispatch_tables[OhlcType.Minute]
+
+        # TODO: 1989/06/04 start or end 都只會觸發一次，不因多支股票而重複被呼叫
+        for day, day_datas in day_ohlcs:
+            self.dayStart(day=day.date())
+
+            for day_data in day_datas:
+                stock_id, ohlc_data = day_data.formData()
 
-            # 一次讀取部分數據
-            # TODO: buildByDatas 數據產生器，提供 start_time 到 end_time 之間的數據
-            self.multi_database_loader.buildByDatas(start_time=current_time, end_time=pause_time)
+                if day_data.ohlc_type == OhlcType.Minute:
+                    self.onMinuteOhlcNotify(stock_id, ohlc_data)
 
-            # TODO: 1989/06/04 start or end 都只會觸發一次，不因多支股票而重複被呼叫
+                    # 請求皆已送出，將 Ohlc 傳給"交易系統"
+                    self.onOrderMinuteOhlcNotify(stock_id, ohlc_data)
 
-            for day, day_datas in self.multi_database_loader:
-                self.dayStart(day=day.date())
+                    for listener in minute_dispatch.get(stock_id, ()):
+                        listener(stock_id, ohlc_data)
 
-                for day_data in day_datas:
-                    stock_id, ohlc_data = day_data.formData()
+                elif day_data.ohlc_type == OhlcType.Day:
+                    self.onDayOhlcNotify(stock_id, ohlc_data)
 
-                    if day_data.ohlc_type == OhlcType.Minute:
-                        self.onMinuteOhlcNotify(stock_id, ohlc_data)
+                    # 請求皆已送出，將 Ohlc 傳給"交易系統"
+                    self.onOrderDayOhlcNotify(stock_id, ohlc_data)
 
-                        # 請求皆已送出，將 Ohlc 傳給"交易系統"
-                        self.onOrderMinuteOhlcNotify(stock_id, ohlc_data)
+                    for listener in day_dispatch.get(stock_id, ()):
+                        listener(stock_id, ohlc_data)
 
-                    elif day_data.ohlc_type == OhlcType.Day:
-                        self.onDayOhlcNotify(stock_id, ohlc_data)
+                self.logger.debug(f"stock_id: {stock_id}, ohlc_data: {ohlc_data}", extra=self.extra)
 
-                        # 請求皆已送出，將 Ohlc 傳給"交易系統"
-                        self.onOrderDayOhlcNotify(stock_id, ohlc_data)
+            self.dayEnd(day=day.date())
 
-                    self.logger.debug(f"stock_id: {stock_id}, ohlc_data: {ohlc_data}", extra=self.extra)
+    # region 狀態快照
+    def getState(self) -> dict:
+        # 訂閱與監聽器屬於執行環境，由建立 Quote 的一方重新設定，快照只保存重播進度
+        return {"last_day": self.last_day}
 
-                self.dayEnd(day=day.date())
+    def setState(self, state: dict):
+        setState(self, state)
 
-            current_time += next_current
+    # endregion
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+import datetime
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+
+from enums import ScheduleKind
+from submodule.Xu3.utils import getLogger
+
+
+class Scheduler:
+    """ 事件排程器
+    以 (時間, 事件類型, 股票代碼) 為鍵的優先佇列，將多檔股票的 逐筆/分線/日線/開收盤/除權息 事件依序交錯處理。
+    每個數據來源(已依時間排序的可迭代物件)在佇列中只會存在一筆事件，處理後才讀取下一筆，
+    因此合併 K 個數據來源的成本為 O(N log K)，且不需事先將所有數據載入記憶體。
+    相同 (時間, 事件類型) 的事件會被打包成一批，一次交給監聽器。
+    """
+
+    # 台股開收盤時間
+    SESSION_OPEN = datetime.time(9, 0)
+    SESSION_CLOSE = datetime.time(13, 30)
+
+    def __init__(self, logger_dir="brokerage", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        # (time, kind.value, stock_id, seq, kind, data, source)
+        self.queue = []
+
+        # 相同鍵值的事件，依加入順序處理
+        self.counter = itertools.count()
+
+        # 監聽器: kind -> [listener, ...]，listener(time, events)，events 為 [(stock_id, data), ...]
+        self.listeners = defaultdict(list)
+
+        # 預先建立的派送表 kind -> (listener, ...)
+        self.dispatch_table = dict()
+
+        # 已排程的交易日(避免重複排程開收盤事件)
+        self.sessions = set()
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    def addListener(self, kind: ScheduleKind, listener):
+        listeners = self.listeners[kind]
+
+        if listener not in listeners:
+            listeners.append(listener)
+
+        self.dispatch_table[kind] = tuple(listeners)
+
+    def removeListener(self, kind: ScheduleKind, listener):
+        listeners = self.listeners[kind]
+
+        if listener in listeners:
+            listeners.remove(listener)
+
+        self.dispatch_table[kind] = tuple(listeners)
+
+    def push(self, time: datetime.datetime, kind: ScheduleKind, stock_id: str = "", data=None, source=None):
+        heapq.heappush(self.queue, (time, kind.value, stock_id, next(self.counter), kind, data, source))
+
+    # region 排程
+    def schedule(self, time: datetime.datetime, kind: ScheduleKind, stock_id: str = "", data=None):
+        """
+        排程單一事件
+
+        :param time: 事件發生時間
+        :param kind: 事件類型
+        :param stock_id: 股票代碼，與股票無關的事件(如開收盤)為空字串
+        :param data: 事件內容
+        :return:
+        """
+        self.push(time=time, kind=kind, stock_id=stock_id, data=data)
+
+    def addSource(self, kind: ScheduleKind, stock_id: str, source):
+        """
+        加入一個數據來源，source 需依時間由早到晚產生 (time, data)
+
+        :param kind: 事件類型
+        :param stock_id: 股票代碼
+        :param source: 可迭代物件，產生 (time: datetime.datetime, data)
+        :return:
+        """
+        source = iter(source)
+        self.pullSource(kind=kind, stock_id=stock_id, source=source)
+
+    def pullSource(self, kind: ScheduleKind, stock_id: str, source):
+        for time, data in source:
+            self.push(time=time, kind=kind, stock_id=stock_id, data=data, source=source)
+            break
+
+    def scheduleSession(self, day: datetime.date):
+        """
+        排程 day 的開盤與收盤事件，日線數據的時間為收盤時間，收盤事件會在所有日線數據之後處理
+
+        :param day: 交易日
+        :return:
+        """
+        if day in self.sessions:
+            return
+
+        self.sessions.add(day)
+        self.push(time=datetime.datetime.combine(day, self.SESSION_OPEN), kind=ScheduleKind.SessionOpen, data=day)
+        self.push(time=datetime.datetime.combine(day, self.SESSION_CLOSE), kind=ScheduleKind.SessionClose, data=day)
+
+    def scheduleCorporateAction(self, day: datetime.date, stock_id: str, data):
+        self.push(time=datetime.datetime.combine(day, self.SESSION_OPEN),
+                  kind=ScheduleKind.CorporateAction,
+                  stock_id=stock_id,
+                  data=data)
+
+    def getDayTime(self, day: datetime.date) -> datetime.datetime:
+        # 日線數據以收盤時間作為事件時間
+        return datetime.datetime.combine(day, self.SESSION_CLOSE)
+
+    # endregion
+
+    def __len__(self):
+        return len(self.queue)
+
+    def popBatch(self):
+        """
+        取出下一批 (時間, 事件類型) 相同的事件，並從各事件的數據來源補上下一筆事件
+
+        :return: time, kind, [(stock_id, data), ...]
+        """
+        time, kind_value, _, _, kind, _, _ = self.queue[0]
+        events = []
+
+        while len(self.queue) > 0 and self.queue[0][0] == time and self.queue[0][1] == kind_value:
+            _, _, stock_id, _, _, data, source = heapq.heappop(self.queue)
+            events.append((stock_id, data))
+
+            if source is not None:
+                self.pullSource(kind=kind, stock_id=stock_id, source=source)
+
+        return time, kind, events
+
+    def run(self, end_time: datetime.datetime = None):
+        """
+        依序處理所有事件，直到佇列清空或超過 end_time
+
+        :param end_time: 處理到哪個時間點(含)為止
+        :return: 處理的批次數量
+        """
+        n_batch = 0
+        dispatch_table = self.dispatch_table
+
+        while len(self.queue) > 0:
+            if end_time is not None and self.queue[0][0] > end_time:
+                break
+
+            time, kind, events = self.popBatch()
+
+            for listener in dispatch_table.get(kind, ()):
+                listener(time, events)
+
+            n_batch += 1
+
+        self.logger.debug(f"#batch: {n_batch}, #remain: {len(self.queue)}", extra=self.extra)
+
+        return n_batch
+
+    def reset(self):
+        self.queue = []
+        self.counter = itertools.count()
+        self.sessions.clear()
+
+
+if __name__ == "__main__":
+    def onSessionListener(time, events):
+        print(f"[Session] {time} {events}")
+
+
+    def onOhlcListener(time, events):
+        print(f"[Ohlc] {time} {events}")
+
+
+    scheduler = Scheduler()
+    scheduler.addListener(ScheduleKind.SessionOpen, onSessionListener)
+    scheduler.addListener(ScheduleKind.SessionClose, onSessionListener)
+    scheduler.addListener(ScheduleKind.Minute, onOhlcListener)
+    scheduler.addListener(ScheduleKind.Day, onOhlcListener)
+
+    days = [datetime.date(2021, 7, 1), datetime.date(2021, 7, 2)]
+
+    for d in days:
+        scheduler.scheduleSession(d)
+
+    scheduler.addSource(ScheduleKind.Day, "2330",
+                        [(scheduler.getDayTime(d), f"{d}, 590, 595, 588, 593, 20000") for d in days])
+    scheduler.addSource(ScheduleKind.Minute, "2812",
+                        [(datetime.datetime.combine(d, datetime.time(9, 30)), f"{d} 09:30, 12.5, 12.6, 12.4, 12.5, 30")
+                         for d in days])
+    scheduler.run()
@@ -1,9 +1,11 @@
-import datetime
 import json
 from decimal import Decimal
 
+import numpy as np
+
 from data.resource.stock_list import StockList
 from enums import Category
+from utils.time_codec import parseDate, parseDateTime, parseMinute
 
 
 class StockCategory:
@@ -139,9 +141,9 @@ def parseOhlcData(ohlc_data: str, is_minute_data=False, is_str_datetime=False):
         date_time = split_data[0]
     else:
         if is_minute_data:
-            date_time = datetime.datetime.strptime(split_data[0], "%Y/%m/%d %H:%M")
+            date_time = parseMinute(split_data[0])
         else:
-            date_time = datetime.datetime.strptime(split_data[0], "%Y/%m/%d")
+            date_time = parseDate(split_data[0])
 
     open_value = Decimal(split_data[1])
     high_value = Decimal(split_data[2])
@@ -152,6 +154,54 @@ def parseOhlcData(ohlc_data: str, is_minute_data=False, is_str_datetime=False):
     return date_time, open_value, high_value, low_value, close_value, volumn
 
 
+# 批次解析後的 Ohlc 數據格式，時間以分鐘為單位(日線數據為當天 00:00)
+OHLC_DTYPE = np.dtype([("time", "datetime64[m]"),
+                       ("open", np.float64),
+                       ("high", np.float64),
+                       ("low", np.float64),
+                       ("close", np.float64),
+                       ("volumn", np.int64)])
+
+
+def parseOhlcBatch(lines: list):
+    """
+    一次解析大量 Ohlc 字串數據，各欄位皆以 numpy 向量化轉型，不產生逐筆的 datetime 與 Decimal 物件
+
+    :param lines: Ohlc 字串數據，例： ["2020/06/04, 28.670000, 28.750000, 28.549999, 28.670000, 22398",
+                                      "2020/07/06 13:06, 335.500000, 336.000000, 335.500000, 335.500000, 77"]
+    :return: 結構化陣列(dtype 為 OHLC_DTYPE)
+    """
+    n_line = len(lines)
+    bars = np.empty(n_line, dtype=OHLC_DTYPE)
+
+    if n_line == 0:
+        return bars
+
+    # (n_line, 6) 的字串矩陣
+    fields = np.array([line.split(", ") for line in lines])
+
+    # 2020/07/06 13:06 -> 2020-07-06 13:06，numpy 可直接轉為 datetime64
+    times = np.char.replace(fields[:, 0], "/", "-")
+
+    # 未補零的時間(例: 2021/6/4)numpy 無法轉型，改以 parseDateTime 逐筆解析
+    is_padded = np.isin(np.char.str_len(times), (10, 16))
+
+    if is_padded.all():
+        bars["time"] = times.astype("datetime64[m]")
+    else:
+        bars["time"][is_padded] = times[is_padded].astype("datetime64[m]")
+        bars["time"][~is_padded] = np.array([parseDateTime(date_time) for date_time in fields[~is_padded, 0]],
+                                            dtype="datetime64[m]")
+
+    bars["open"] = fields[:, 1].astype(np.float64)
+    bars["high"] = fields[:, 2].astype(np.float64)
+    bars["low"] = fields[:, 3].astype(np.float64)
+    bars["close"] = fields[:, 4].astype(np.float64)
+    bars["volumn"] = fields[:, 5].astype(np.int64)
+
+    return bars
+
+
 if __name__ == "__main__":
     # foreign_etf: (00712)
     StockCategory.loadStockCategory()
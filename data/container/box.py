@@ -11,7 +11,8 @@ import numpy as np
 from data.container.ohlc import Ohlc, OhlcContainer
 from submodule.Xu3.utils import getLogger
 from submodule.events import Event
-from utils.math import geometricMean, sigmoid
+from utils.checkpoint import getState, setState
+from utils.math import SparseBayes, geometricMean, sigmoid
 
 
 class Box:
@@ -141,6 +142,9 @@ class Box:
 
 
 class BoxExplorer:
+    # 貝氏估計所使用的分數離散化邊界(各分項分數 / 門檻值)，將分數分為 len(BAYES_BINS) + 1 個區間
+    BAYES_BINS = (0.5, 1.0, 1.5)
+
     def __init__(self, stock_id: str, n_ohlc: int, oc: OhlcContainer, threshold: float = 2.0,
                  logger_dir="box_explorer", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
         """
@@ -212,6 +216,17 @@ class BoxExplorer:
         # 價差紀錄會包含未形成箱型的情況，因此數據維度與分數類的不同
         self.spreads = []
 
+        # 以已離開的箱型(突破或跌破)，估計在各分項分數下，箱型的離開方向的機率
+        n_bin = len(self.BAYES_BINS) + 1
+        features = {key: list(range(n_bin)) for key in self.score_keys}
+        self.bayes = SparseBayes(label=[Box.Status.Breakthrough, Box.Status.FallBelow], alpha=1.0, **features)
+
+        # 尚未離開(尚未加入 self.bayes)的箱型
+        self.pending_boxes = []
+
+        # 當前箱型分數下，箱型向上突破的機率
+        self.breakthrough_probability = None
+
     def __str__(self):
         info = f"BoxExplorer(stock_id: {self.stock_id}, n_ohlc: {self.n_ohlc}, " \
                f"price_lim: {self.price_lim}, threshold: {self.threshold})"
@@ -233,7 +248,12 @@ class BoxExplorer:
             # 計算箱型分數
             score = self.computeBox()
 
-            self.logger.debug(f"({self.stock_id}) Found box, score: {score}\n{self.ohlc}", extra=self.extra)
+            # 當前分數下，箱型向上突破的機率
+            self.checkBayesProbability()
+
+            self.logger.debug(f"({self.stock_id}) Found box, score: {score}, "
+                              f"breakthrough_probability: {self.breakthrough_probability}\n{self.ohlc}",
+                              extra=self.extra)
 
             # 若分數超過門檻值，表示箱型形成，觸發事件以通知策略
             if score >= self.threshold:
@@ -244,6 +264,7 @@ class BoxExplorer:
 
                 # 紀錄形成的箱型
                 self.boxes.append(box)
+                self.pending_boxes.append(box)
 
                 # 觸發箱型形成事件，通知策略
                 self.onBoxFormed(box=box)
@@ -500,10 +521,57 @@ class BoxExplorer:
         self.history_vol = self.history_vol * origin_weight + vol * new_value_weight
         self.n_volumn += 1
 
-    def checkBayesProbability(self):
-        # TODO: 根據所記錄的 boxes 來計算各參數下的 box 的獲利機率，再利用機率去決定是否送出購買請求，
-        #  降低門檻值的影響(可以不用糾結於要設多少)
-        pass
+    def discretizeScores(self, scores: dict) -> list:
+        """
+        將各分項分數除以門檻值後，依 BAYES_BINS 轉換為區間索引值
+
+        :param scores: 各分項分數
+        :return: 各分項分數的區間索引值(順序與 self.score_keys 相同)
+        """
+        ratios = np.array([scores[key] for key in self.score_keys], dtype=np.float64) / self.threshold
+
+        return np.digitize(ratios, self.BAYES_BINS).tolist()
+
+    def learnBoxes(self):
+        """
+        將已離開箱型(狀態不再是 Box.Status.In)且尚未學習過的箱型，加入貝氏估計的計數
+
+        :return: 新加入的箱型個數
+        """
+        datas = []
+        labels = []
+        pending_boxes = []
+
+        for box in self.pending_boxes:
+            if box.status == Box.Status.In:
+                pending_boxes.append(box)
+            else:
+                datas.append(self.discretizeScores(box.scores))
+                labels.append(box.status)
+
+        self.pending_boxes = pending_boxes
+        self.bayes.fit(datas, labels)
+
+        return len(labels)
+
+    def checkBayesProbability(self, scores: dict = None):
+        """
+        根據所記錄的 boxes 估計在各分項分數下，箱型向上突破的機率，可用於決定是否送出購買請求，
+        降低門檻值的影響(可以不用糾結於要設多少)。
+        計數以整數索引存放，每根 K 棒呼叫的成本只和尚未離開的箱型個數有關，與歷史箱型總數無關。
+
+        :param scores: 各分項分數，預設為最新一次計算的分數(self.component_scores)
+        :return: 向上突破的機率
+        """
+        self.learnBoxes()
+
+        if scores is None:
+            scores = self.component_scores
+
+        probability = self.bayes.predictProbablility(self.discretizeScores(scores))
+        self.breakthrough_probability = float(probability[0])
+
+        return self.breakthrough_probability
 
     # 超參數調整
     def modifySuperParams(self):
@@ -543,6 +611,7 @@ class BoxExplorer:
         """
         * 超參數(n_ohlc, price_lim)將在訓練模式後被修改，因此這裡不修改
         * OhlcContainer, history_high, history_low 訓練模式後仍繼續儲存數據，亦不修改
+        * 貝氏估計的計數(self.bayes)為訓練的成果，亦不修改
 
         :return:
         """
@@ -550,6 +619,16 @@ class BoxExplorer:
         self.n_ohlcs = []
         self.spreads = []
 
+    # region 狀態快照
+    def getState(self) -> dict:
+        # OhlcContainer 由持有它的策略保存
+        return getState(self, exclude=("onBoxFormed", "oc"))
+
+    def setState(self, state: dict):
+        setState(self, state)
+
+    # endregion
+
 
 if __name__ == "__main__":
     from data.container import ohlcGenerator
@@ -0,0 +1,391 @@
+import math
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+import numpy as np
+from scipy.signal import lfilter
+
+"""
+掛載於 OhlcContainer 的技術指標，每當一根 K 棒完成時以 O(1) 更新，
+並提供 warmUp 以向量化的方式，一次由歷史數據計算出指標的狀態。
+價格在容器中以 Decimal 儲存，指標內部一律以 float 計算。
+"""
+
+
+class Indicator(metaclass=ABCMeta):
+    def __init__(self, n_period: int):
+        self.n_period = n_period
+        self.value = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n_period={self.n_period}, value={self.value})"
+
+    __str__ = __repr__
+
+    @abstractmethod
+    def update(self, open_value: float, high_value: float, low_value: float, close_value: float, volumn: float):
+        pass
+
+    @abstractmethod
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        """
+        以歷史數據(numpy 陣列，由舊到新)初始化指標狀態，之後可繼續以 update 更新
+
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        pass
+
+    @staticmethod
+    def selectKind(kind, opens, highs, lows, closes, volumns):
+        if kind == "open":
+            return opens
+        elif kind == "high":
+            return highs
+        elif kind == "low":
+            return lows
+        elif kind == "volumn":
+            return volumns
+        else:
+            return closes
+
+
+class RollingWindow:
+    """
+    固定長度的滑動視窗，以 Welford 法維護平均與離均差平方和，加入新數值時 O(1) 更新。
+    相較於維護總和與平方和(E[x²] - mean²)，數值較大(例如成交量)時不會因相減而失去精度；
+    每加入 n_period 筆數值，再以視窗內的數值重新計算一次，避免長時間執行累積浮點數誤差(均攤仍為 O(1))。
+    """
+
+    def __init__(self, n_period: int):
+        self.n_period = n_period
+        self.values = deque(maxlen=n_period)
+        self.mean_value = 0.0
+
+        # 離均差平方和 sum((x - mean)²)
+        self.m2 = 0.0
+
+        # 距離上次重新計算後，加入的數值筆數
+        self.n_push = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value: float):
+        if len(self.values) == self.n_period:
+            # 以 value 取代最舊的數值，視窗長度不變
+            removed = self.values[0]
+            self.values.append(value)
+
+            last_mean = self.mean_value
+            self.mean_value += (value - removed) / self.n_period
+            self.m2 += (value - removed) * (value - self.mean_value + removed - last_mean)
+        else:
+            self.values.append(value)
+
+            delta = value - self.mean_value
+            self.mean_value += delta / len(self.values)
+            self.m2 += delta * (value - self.mean_value)
+
+        self.n_push += 1
+
+        if self.n_push >= self.n_period:
+            self.reseed()
+
+    def reseed(self):
+        values = np.array(self.values, dtype=np.float64)
+        self.mean_value = float(values.mean()) if len(values) > 0 else 0.0
+        self.m2 = float(np.square(values - self.mean_value).sum())
+        self.n_push = 0
+
+    def load(self, values):
+        values = np.asarray(values, dtype=np.float64)[-self.n_period:]
+        self.values = deque(values.tolist(), maxlen=self.n_period)
+        self.reseed()
+
+    def mean(self):
+        if len(self.values) == 0:
+            return None
+
+        return self.mean_value
+
+    def std(self):
+        n_value = len(self.values)
+
+        if n_value == 0:
+            return None
+
+        # 浮點數誤差可能造成些微負值
+        return math.sqrt(max(self.m2 / n_value, 0.0))
+
+    def clear(self):
+        self.values.clear()
+        self.mean_value = 0.0
+        self.m2 = 0.0
+        self.n_push = 0
+
+
+# 簡單移動平均(Simple Moving Average)
+class Sma(Indicator):
+    def __init__(self, n_period: int, kind="close"):
+        super().__init__(n_period=n_period)
+        self.kind = kind
+        self.window = RollingWindow(n_period=n_period)
+
+    def update(self, open_value, high_value, low_value, close_value, volumn):
+        value = Indicator.selectKind(self.kind, open_value, high_value, low_value, close_value, volumn)
+        self.window.push(float(value))
+        self.value = self.window.mean()
+
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        self.window.load(Indicator.selectKind(self.kind, opens, highs, lows, closes, volumns))
+        self.value = self.window.mean()
+
+    def reset(self):
+        self.window.clear()
+        self.value = None
+
+    @staticmethod
+    def compute(values, n_period: int):
+        """
+        向量化計算完整的 SMA 序列，前 n_period - 1 筆以已有的數據計算平均
+
+        :param values: 數值陣列
+        :param n_period: 週期
+        :return:
+        """
+        values = np.asarray(values, dtype=np.float64)
+        cumsum = np.concatenate([[0.0], np.cumsum(values)])
+        index = np.arange(1, len(values) + 1)
+        start = np.maximum(index - n_period, 0)
+
+        return (cumsum[index] - cumsum[start]) / (index - start)
+
+
+# 成交量移動平均
+class VolumnMean(Sma):
+    def __init__(self, n_period: int):
+        super().__init__(n_period=n_period, kind="volumn")
+
+
+# 指數移動平均(Exponential Moving Average)，以第一筆數值作為初始值
+class Ema(Indicator):
+    def __init__(self, n_period: int, kind="close"):
+        super().__init__(n_period=n_period)
+        self.kind = kind
+        self.alpha = 2.0 / (n_period + 1.0)
+
+    def update(self, open_value, high_value, low_value, close_value, volumn):
+        value = float(Indicator.selectKind(self.kind, open_value, high_value, low_value, close_value, volumn))
+
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        values = Indicator.selectKind(self.kind, opens, highs, lows, closes, volumns)
+
+        if len(values) > 0:
+            self.value = float(Ema.compute(values, n_period=self.n_period)[-1])
+
+    def reset(self):
+        self.value = None
+
+    @staticmethod
+    def compute(values, n_period: int):
+        # ema[t] = alpha * x[t] + (1 - alpha) * ema[t - 1]，ema[0] = x[0]
+        values = np.asarray(values, dtype=np.float64)
+        alpha = 2.0 / (n_period + 1.0)
+        ema, _ = lfilter([alpha], [1.0, alpha - 1.0], values[1:], zi=[(1.0 - alpha) * values[0]])
+
+        return np.concatenate([values[:1], ema])
+
+
+# 布林通道(中線為 SMA，上下軌為 SMA ± n_std 倍標準差)
+class Bollinger(Indicator):
+    def __init__(self, n_period: int = 20, n_std: float = 2.0, kind="close"):
+        super().__init__(n_period=n_period)
+        self.kind = kind
+        self.n_std = n_std
+        self.window = RollingWindow(n_period=n_period)
+        self.std = None
+        self.upper = None
+        self.lower = None
+
+    def __repr__(self):
+        return f"Bollinger(n_period={self.n_period}, lower={self.lower}, value={self.value}, upper={self.upper})"
+
+    __str__ = __repr__
+
+    def compute(self):
+        self.value = self.window.mean()
+        self.std = self.window.std()
+
+        if self.value is not None:
+            self.upper = self.value + self.n_std * self.std
+            self.lower = self.value - self.n_std * self.std
+
+    def update(self, open_value, high_value, low_value, close_value, volumn):
+        value = Indicator.selectKind(self.kind, open_value, high_value, low_value, close_value, volumn)
+        self.window.push(float(value))
+        self.compute()
+
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        self.window.load(Indicator.selectKind(self.kind, opens, highs, lows, closes, volumns))
+        self.compute()
+
+    def reset(self):
+        self.window.clear()
+        self.value = None
+        self.std = None
+        self.upper = None
+        self.lower = None
+
+
+# 平均真實區間(Average True Range)，以 Wilder 平滑法計算
+class Atr(Indicator):
+    def __init__(self, n_period: int = 14):
+        super().__init__(n_period=n_period)
+        self.last_close = None
+
+        # 尚未滿 n_period 根 K 棒前，以簡單平均計算
+        self.n_data = 0
+
+    def update(self, open_value, high_value, low_value, close_value, volumn):
+        high_value = float(high_value)
+        low_value = float(low_value)
+
+        if self.last_close is None:
+            true_range = high_value - low_value
+        else:
+            true_range = max(high_value - low_value,
+                             abs(high_value - self.last_close),
+                             abs(low_value - self.last_close))
+
+        self.last_close = float(close_value)
+
+        if self.n_data < self.n_period:
+            self.n_data += 1
+
+            if self.value is None:
+                self.value = true_range
+            else:
+                self.value += (true_range - self.value) / self.n_data
+        else:
+            self.value = (self.value * (self.n_period - 1) + true_range) / self.n_period
+
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        n_data = len(closes)
+
+        if n_data == 0:
+            return
+
+        highs = np.asarray(highs, dtype=np.float64)
+        lows = np.asarray(lows, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+
+        last_closes = np.concatenate([closes[:1], closes[:-1]])
+        true_ranges = np.maximum.reduce([highs - lows, np.abs(highs - last_closes), np.abs(lows - last_closes)])
+        true_ranges[0] = highs[0] - lows[0]
+
+        n_init = min(n_data, self.n_period)
+        atr = true_ranges[:n_init].mean()
+
+        if n_data > n_init:
+            # atr[t] = ((n - 1) * atr[t - 1] + tr[t]) / n
+            beta = (self.n_period - 1.0) / self.n_period
+            atrs, _ = lfilter([1.0 - beta], [1.0, -beta], true_ranges[n_init:], zi=[beta * atr])
+            atr = atrs[-1]
+
+        self.value = float(atr)
+        self.n_data = n_init
+        self.last_close = float(closes[-1])
+
+    def reset(self):
+        self.value = None
+        self.last_close = None
+        self.n_data = 0
+
+
+# 滑動視窗內的最高價與最低價，以單調佇列維護(均攤 O(1))
+class HighLow(Indicator):
+    def __init__(self, n_period: int):
+        super().__init__(n_period=n_period)
+
+        # (序號, 數值)
+        self.highs = deque()
+        self.lows = deque()
+        self.n_data = 0
+        self.high = None
+        self.low = None
+
+    def __repr__(self):
+        return f"HighLow(n_period={self.n_period}, high={self.high}, low={self.low})"
+
+    __str__ = __repr__
+
+    def update(self, open_value, high_value, low_value, close_value, volumn):
+        high_value = float(high_value)
+        low_value = float(low_value)
+
+        while len(self.highs) > 0 and self.highs[-1][1] <= high_value:
+            self.highs.pop()
+
+        while len(self.lows) > 0 and self.lows[-1][1] >= low_value:
+            self.lows.pop()
+
+        self.highs.append((self.n_data, high_value))
+        self.lows.append((self.n_data, low_value))
+
+        # 移除超出視窗的數值
+        expired = self.n_data - self.n_period
+
+        while self.highs[0][0] <= expired:
+            self.highs.popleft()
+
+        while self.lows[0][0] <= expired:
+            self.lows.popleft()
+
+        self.n_data += 1
+        self.high = self.highs[0][1]
+        self.low = self.lows[0][1]
+        self.value = (self.high, self.low)
+
+    def warmUp(self, opens, highs, lows, closes, volumns):
+        self.reset()
+
+        # 只有最後 n_period 筆數據會影響之後的結果
+        highs = np.asarray(highs, dtype=np.float64)[-self.n_period:]
+        lows = np.asarray(lows, dtype=np.float64)[-self.n_period:]
+
+        for high_value, low_value in zip(highs.tolist(), lows.tolist()):
+            self.update(None, high_value, low_value, None, None)
+
+    def reset(self):
+        self.highs.clear()
+        self.lows.clear()
+        self.n_data = 0
+        self.high = None
+        self.low = None
+        self.value = None
+
+
+if __name__ == "__main__":
+    closes = np.array([10.0, 10.5, 10.2, 10.8, 11.0, 10.7, 10.9, 11.3])
+    highs = closes + 0.2
+    lows = closes - 0.3
+
+    indicators = [Sma(3), Ema(3), Bollinger(3), Atr(3), HighLow(3)]
+    warm_ups = [Sma(3), Ema(3), Bollinger(3), Atr(3), HighLow(3)]
+
+    for o, h, l, c in zip(closes, highs, lows, closes):
+        for indicator in indicators:
+            indicator.update(o, h, l, c, 1)
+
+    for indicator, warm_up in zip(indicators, warm_ups):
+        warm_up.warmUp(closes, highs, lows, closes, np.ones_like(closes))
+        print(indicator, warm_up)
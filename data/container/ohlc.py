@@ -5,6 +5,7 @@ from decimal import Decimal, ROUND_HALF_UP
 import numpy as np
 
 from submodule.events import Event
+from utils.checkpoint import getState, setState
 
 
 class OhlcContainer:
@@ -42,6 +43,9 @@ class OhlcContainer:
         self.volumn = []
         # endregion
 
+        # 技術指標: name -> Indicator，每當一根 K 棒完成時更新
+        self.indicators = dict()
+
         self.event = Event()
         self.onOhlcFormed = self.event.onOhlcFormed
 
@@ -80,6 +84,9 @@ class OhlcContainer:
             try:
                 self.newOhlc(date_time, open_value, high_value, low_value, close_value)
 
+                # 前一根 K 棒已完成，更新技術指標
+                self.updateIndicators(index=self.index - 1)
+
                 self.onOhlcFormed(date_time=self.stop_datetime[self.index],
                                   open_value=self.open[self.index],
                                   high_value=self.high[self.index],
@@ -130,6 +137,191 @@ class OhlcContainer:
         self.close[self.index] = close_value
         self.volumn[self.index] += volumn
 
+    # region 批次輸入
+    def loadBars(self, bars, fire_events=False):
+        """
+        一次輸入大量 K 棒數據(例如策略暖機時的歷史數據)，以向量化的方式分組並合併成此容器的時間尺度，
+        完成後容器狀態與逐筆呼叫 addOhlc 相同，之後可繼續以 addOhlc 輸入即時數據。
+
+        :param bars: 結構化陣列，需包含 time, open, high, low, close, volumn 欄位(如 data.parseOhlcBatch 的結果)，
+                     且已依時間排序
+        :param fire_events: 是否在每根 K 棒形成時觸發 onOhlcFormed(與 addOhlc 相同的時機與數值)
+        :return:
+        """
+        self.addArrays(times=bars["time"],
+                       opens=bars["open"],
+                       highs=bars["high"],
+                       lows=bars["low"],
+                       closes=bars["close"],
+                       volumns=bars["volumn"],
+                       fire_events=fire_events)
+
+    def addTicks(self, times, prices, volumns):
+        """
+        一次輸入多筆逐筆成交(例如 generateTicks 的結果，或即時報價累積的一小批)，
+        以 K 棒為單位做向量化的合併，結果與逐筆呼叫 addTick 相同，並依序觸發每根 K 棒的 onOhlcFormed。
+
+        :param times: 成交時間(datetime64 陣列或 datetime.datetime 列表，已依時間排序)
+        :param prices: 成交價
+        :param volumns: 成交量
+        :return:
+        """
+        self.addArrays(times=times,
+                       opens=prices,
+                       highs=prices,
+                       lows=prices,
+                       closes=prices,
+                       volumns=volumns,
+                       fire_events=True)
+
+    def splitBuckets(self, seconds):
+        """
+        與 addOhlc 相同的分組規則: K 棒開始時間為第一筆數據所在的分鐘，時間大於等於結束時間的數據則開始新的 K 棒。
+        以二分搜尋直接跳到下一根 K 棒的第一筆數據，迴圈次數為 K 棒數量而非數據筆數。
+
+        :param seconds: 各筆數據的時間(自 1970/01/01 起算的秒數，已排序)
+        :return: 各 K 棒第一筆數據的索引值, 各 K 棒的開始時間(秒)
+        """
+        delta_seconds = int(self.delta_time.total_seconds())
+        n_data = len(seconds)
+        indexs = []
+        starts = []
+        i = 0
+
+        while i < n_data:
+            start = int(seconds[i]) - int(seconds[i]) % 60
+            indexs.append(i)
+            starts.append(start)
+            i = int(np.searchsorted(seconds, start + delta_seconds, side="left"))
+
+        return np.array(indexs, dtype=np.int64), np.array(starts, dtype=np.int64)
+
+    @staticmethod
+    def toDecimals(values):
+        # 與資料庫中的價格字串格式(例: 28.670000)一致
+        return [Decimal(value) for value in np.char.mod("%.6f", values).tolist()]
+
+    def addArrays(self, times, opens, highs, lows, closes, volumns, fire_events=False):
+        times = np.asarray(times)
+
+        if times.dtype.kind != "M":
+            times = times.astype("datetime64[us]")
+
+        seconds = times.astype("datetime64[s]").astype(np.int64)
+        opens = np.asarray(opens, dtype=np.float64)
+        highs = np.asarray(highs, dtype=np.float64)
+        lows = np.asarray(lows, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+        volumns = np.asarray(volumns, dtype=np.int64)
+        n_data = len(seconds)
+
+        if n_data == 0:
+            return
+
+        head = 0
+
+        # 時間早於目前 K 棒結束時間的數據，併入目前尚未完成的 K 棒
+        if self.stop is not None:
+            stop_second = int((self.stop - datetime.datetime(1970, 1, 1)).total_seconds())
+            head = int(np.searchsorted(seconds, stop_second, side="left"))
+
+            if head > 0:
+                high_value, low_value, close_value = self.toDecimals([highs[:head].max(),
+                                                                      lows[:head].min(),
+                                                                      closes[head - 1]])
+                self.update(high_value, low_value, close_value, int(volumns[:head].sum()))
+
+        if head == n_data:
+            return
+
+        indexs, starts = self.splitBuckets(seconds[head:])
+        offsets = indexs
+        indexs = indexs + head
+        ends = np.append(indexs[1:], n_data) - 1
+
+        bucket_highs = self.toDecimals(np.maximum.reduceat(highs[head:], offsets))
+        bucket_lows = self.toDecimals(np.minimum.reduceat(lows[head:], offsets))
+        bucket_closes = self.toDecimals(closes[ends])
+        bucket_volumns = np.add.reduceat(volumns[head:], offsets).tolist()
+        start_datetimes = starts.astype("datetime64[s]").astype(datetime.datetime).tolist()
+
+        if fire_events:
+            # 每根 K 棒都以第一筆數據建立(與 addOhlc 相同)，觸發 onOhlcFormed 後，再以整組數據更新
+            first_opens = self.toDecimals(opens[indexs])
+            first_highs = self.toDecimals(highs[indexs])
+            first_lows = self.toDecimals(lows[indexs])
+            first_closes = self.toDecimals(closes[indexs])
+
+            for b, start in enumerate(start_datetimes):
+                is_first = self.stop is None
+                self.newOhlc(start, first_opens[b], first_highs[b], first_lows[b], first_closes[b])
+
+                if not is_first:
+                    self.updateIndicators(index=self.index - 1)
+                    self.onOhlcFormed(date_time=self.stop_datetime[self.index],
+                                      open_value=self.open[self.index],
+                                      high_value=self.high[self.index],
+                                      low_value=self.low[self.index],
+                                      close_value=self.close[self.index],
+                                      volumn=self.volumn[self.index])
+
+                self.update(bucket_highs[b], bucket_lows[b], bucket_closes[b], bucket_volumns[b])
+
+        else:
+            n_before = self.__len__()
+            n_bucket = len(start_datetimes)
+
+            self.start_datetime.extend(start_datetimes)
+            self.stop_datetime.extend([start + self.delta_time for start in start_datetimes])
+            self.open.extend(self.toDecimals(opens[indexs]))
+            self.high.extend(bucket_highs)
+            self.low.extend(bucket_lows)
+            self.close.extend(bucket_closes)
+            self.volumn.extend(bucket_volumns)
+
+            self.index += n_bucket
+            self.stop = self.stop_datetime[self.index]
+
+            # 除了最後一根以外，新加入的 K 棒與原本的最後一根皆已完成
+            for index in range(max(n_before - 1, 0), self.index):
+                self.updateIndicators(index=index)
+
+    # endregion
+
+    # region 技術指標
+    def addIndicator(self, name: str, indicator):
+        """
+        掛載技術指標(data.container.indicator)，若容器內已有完成的 K 棒，則以這些數據初始化指標
+
+        :param name: 指標名稱
+        :param indicator: 技術指標
+        :return:
+        """
+        self.indicators[name] = indicator
+
+        # 最後一根 K 棒尚未完成，不納入計算
+        n_finished = max(self.__len__() - 1, 0)
+
+        if n_finished > 0:
+            indicator.warmUp(opens=np.array(self.open[:n_finished], dtype=np.float64),
+                             highs=np.array(self.high[:n_finished], dtype=np.float64),
+                             lows=np.array(self.low[:n_finished], dtype=np.float64),
+                             closes=np.array(self.close[:n_finished], dtype=np.float64),
+                             volumns=np.array(self.volumn[:n_finished], dtype=np.float64))
+
+    def getIndicator(self, name: str):
+        return self.indicators[name]
+
+    def updateIndicators(self, index: int):
+        if index < 0:
+            return
+
+        for indicator in self.indicators.values():
+            indicator.update(self.open[index], self.high[index], self.low[index], self.close[index],
+                             self.volumn[index])
+
+    # endregion
+
     def getOhlc(self, n_ohlc=5, remove_raw_data=True):
         """
         將 n_ohlc 個 Ohlc 數據合併成新的 Ohlc 數據
@@ -237,6 +429,252 @@ class OhlcContainer:
         # 交易量
         self.volumn = []
 
+        for indicator in self.indicators.values():
+            indicator.reset()
+
+    # region 狀態快照
+    def getState(self) -> dict:
+        return getState(self, exclude=("onOhlcFormed",))
+
+    def setState(self, state: dict):
+        setState(self, state)
+
+    # endregion
+
+
+class OhlcColumn:
+    """
+    共用欄位中屬於同一時間尺度的數值(唯讀)，支援 len、索引與切片，可取代 OhlcContainer 中以 list 儲存的欄位
+    """
+
+    def __init__(self, values: list, indexs: list):
+        self.values = values
+        self.indexs = indexs
+
+    def __len__(self):
+        return len(self.indexs)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.values[index] for index in self.indexs[key]]
+
+        return self.values[self.indexs[key]]
+
+    def __iter__(self):
+        for index in self.indexs:
+            yield self.values[index]
+
+    def __repr__(self):
+        return str(list(self))
+
+    __str__ = __repr__
+
+
+class OhlcLevel(OhlcContainer):
+    """
+    MultiOhlcContainer 中的一個時間尺度，K 棒存放於 MultiOhlcContainer 共用的欄位中，只記錄屬於這一層的 K 棒位置。
+    查詢方式(getOhlc, getLastValue, getSpread, 技術指標)與 OhlcContainer 相同，數據則只能透過 MultiOhlcContainer 輸入。
+    """
+
+    def __init__(self, multi_container, minutes=1, hours=0, days=0):
+        super().__init__(minutes=minutes, hours=hours, days=days)
+
+        # 屬於這一層的 K 棒，在共用欄位中的位置
+        self.indexs = []
+
+        self.start_datetime = OhlcColumn(multi_container.start_datetime, self.indexs)
+        self.stop_datetime = OhlcColumn(multi_container.stop_datetime, self.indexs)
+        self.open = OhlcColumn(multi_container.open, self.indexs)
+        self.high = OhlcColumn(multi_container.high, self.indexs)
+        self.low = OhlcColumn(multi_container.low, self.indexs)
+        self.close = OhlcColumn(multi_container.close, self.indexs)
+        self.volumn = OhlcColumn(multi_container.volumn, self.indexs)
+
+    def addOhlc(self, date_time: datetime.datetime, open_value: Decimal, high_value: Decimal, low_value: Decimal,
+                close_value: Decimal, volumn: int):
+        raise NotImplementedError("OhlcLevel 的數據由 MultiOhlcContainer.addOhlc 輸入")
+
+    def addArrays(self, times, opens, highs, lows, closes, volumns, fire_events=False):
+        raise NotImplementedError("OhlcLevel 的數據由 MultiOhlcContainer.addOhlc 輸入")
+
+    def reset(self):
+        # 共用欄位由 MultiOhlcContainer 清空
+        self.index = -1
+        self.stop = None
+        self.indexs.clear()
+
+        for indicator in self.indicators.values():
+            indicator.reset()
+
+
+class MultiOhlcContainer:
+    """
+    多時間尺度的 Ohlc 容器: 只需輸入最小時間尺度的數據，同一次 addOhlc 即更新所有時間尺度。
+    各層皆在輸入數據的時間達到該層的結束時間時形成新的 K 棒(與 OhlcContainer 相同，數據中斷時也不會延遲)，
+    K 棒的數值則由下一層"尚未完成"的 K 棒逐層更新，不會重複組合原始數據；
+    只有在數據中斷後，下一層的 K 棒跨越本層結束時間的期間，本層才直接以輸入數據更新。
+    所有時間尺度的 K 棒以 SoA 的形式存放於同一組欄位中(level 欄位為所屬的時間尺度)，各層(OhlcLevel)各自觸發自己的 onOhlcFormed。
+    多個策略可共用同一個 MultiOhlcContainer，不需各自以相同數據餵入多個容器。
+    """
+
+    def __init__(self, timeframes: list):
+        """
+
+        :param timeframes: 各層的時間尺度 [(minutes, hours, days), ...]，由小到大排序，且較大者須為較小者的整數倍
+        """
+        # region Structure of arrays (SoA) 所有時間尺度共用，每個陣列長度都相同
+        # 所屬時間尺度
+        self.level = []
+
+        # Ohlc 物件開始時間
+        self.start_datetime = []
+
+        # Ohlc 物件結束時間
+        self.stop_datetime = []
+
+        # 開盤價
+        self.open = []
+
+        # 最高價
+        self.high = []
+
+        # 最低價
+        self.low = []
+
+        # 收盤價
+        self.close = []
+
+        # 交易量
+        self.volumn = []
+        # endregion
+
+        self.containers = []
+        last_delta = None
+
+        for minutes, hours, days in timeframes:
+            delta_time = datetime.timedelta(days=days, hours=hours, minutes=minutes)
+
+            if last_delta is not None and (delta_time <= last_delta or delta_time % last_delta != datetime.timedelta(0)):
+                raise ValueError(f"時間尺度 {delta_time} 須大於且為 {last_delta} 的整數倍")
+
+            self.containers.append(OhlcLevel(self, minutes=minutes, hours=hours, days=days))
+            last_delta = delta_time
+
+        self.n_level = len(self.containers)
+
+        # 各層尚未完成的 K 棒中，下一層已完成的 K 棒的交易量總和
+        self.finished_volumns = [0] * self.n_level
+
+    def __repr__(self):
+        info = "MultiOhlcContainer("
+        info += ", ".join([f"(days={oc.days}, hours={oc.hours}, minutes={oc.minutes}): {len(oc)}"
+                           for oc in self.containers])
+        info += ")"
+
+        return info
+
+    __str__ = __repr__
+
+    def __getitem__(self, level: int) -> OhlcLevel:
+        return self.containers[level]
+
+    def __len__(self):
+        return self.n_level
+
+    def addOhlc(self, date_time: datetime.datetime, open_value: Decimal, high_value: Decimal, low_value: Decimal,
+                close_value: Decimal, volumn: int):
+        # 最小時間尺度: 與 OhlcContainer.addOhlc 相同的規則組合輸入的數據
+        container = self.containers[0]
+        is_new = container.stop is None or date_time >= container.stop
+
+        if is_new:
+            self.newOhlc(0, date_time, open_value, high_value, low_value, close_value)
+
+        position = container.indexs[-1]
+        self.high[position] = max(self.high[position], high_value)
+        self.low[position] = min(self.low[position], low_value)
+        self.close[position] = close_value
+        self.volumn[position] += volumn
+
+        # 較大時間尺度: 與最小時間尺度相同，輸入數據的時間達到本層的結束時間時形成新的 K 棒，再由下一層尚未完成的 K 棒更新
+        for level in range(1, self.n_level):
+            child = self.containers[level - 1]
+            container = self.containers[level]
+            child_position = child.indexs[-1]
+            is_child_new = is_new
+            is_new = container.stop is None or date_time >= container.stop
+
+            if is_new:
+                self.newOhlc(level, date_time, open_value, high_value, low_value, close_value)
+                self.finished_volumns[level] = 0
+
+            position = container.indexs[-1]
+
+            if is_child_new and not is_new:
+                # 下一層的前一根 K 棒已完成，本層目前為止的交易量皆已確定
+                self.finished_volumns[level] = self.volumn[position]
+
+            if self.start_datetime[child_position] >= self.start_datetime[position]:
+                # 下一層尚未完成的 K 棒完全屬於本層的 K 棒，直接以其數值更新
+                self.high[position] = max(self.high[position], self.high[child_position])
+                self.low[position] = min(self.low[position], self.low[child_position])
+                self.close[position] = self.close[child_position]
+                self.volumn[position] = self.finished_volumns[level] + self.volumn[child_position]
+
+            else:
+                # 數據中斷後，下一層的 K 棒可能跨越本層的結束時間，其較早的數據屬於本層的前一根 K 棒，改以輸入數據更新
+                self.high[position] = max(self.high[position], high_value)
+                self.low[position] = min(self.low[position], low_value)
+                self.close[position] = close_value
+                self.volumn[position] += volumn
+
+    def addTick(self, date_time: datetime.datetime, price: Decimal, volumn: int):
+        self.addOhlc(date_time, price, price, price, price, volumn)
+
+    def newOhlc(self, level: int, date_time: datetime.datetime, open_value: Decimal, high_value: Decimal,
+                low_value: Decimal, close_value: Decimal):
+        # 與 OhlcContainer.newOhlc 相同，K 棒加入共用欄位，並在前一根 K 棒完成時觸發該層的 onOhlcFormed
+        container = self.containers[level]
+        is_first = container.stop is None
+
+        start = datetime.datetime(year=date_time.year, month=date_time.month, day=date_time.day,
+                                  hour=date_time.hour, minute=date_time.minute)
+        container.stop = start + container.delta_time
+
+        container.indexs.append(len(self.level))
+        container.index += 1
+
+        self.level.append(level)
+        self.start_datetime.append(start)
+        self.stop_datetime.append(container.stop)
+        self.open.append(open_value)
+        self.high.append(high_value)
+        self.low.append(low_value)
+        self.close.append(close_value)
+        self.volumn.append(0)
+
+        if not is_first:
+            # 前一根 K 棒已完成，更新技術指標
+            container.updateIndicators(index=container.index - 1)
+
+            container.onOhlcFormed(date_time=container.stop_datetime[container.index],
+                                   open_value=container.open[container.index],
+                                   high_value=container.high[container.index],
+                                   low_value=container.low[container.index],
+                                   close_value=container.close[container.index],
+                                   volumn=container.volumn[container.index])
+
+    def reset(self):
+        # 各層的 OhlcColumn 參照這些欄位，因此就地清空
+        for values in (self.level, self.start_datetime, self.stop_datetime,
+                       self.open, self.high, self.low, self.close, self.volumn):
+            values.clear()
+
+        for container in self.containers:
+            container.reset()
+
+        self.finished_volumns = [0] * self.n_level
+
 
 class Ohlc:
     """
@@ -576,4 +1014,50 @@ if __name__ == "__main__":
             print(ohlc.volumns)
 
 
+        @staticmethod
+        def testMultiOhlcContainer():
+            # 各層形成的 K 棒與觸發時間，須與單獨使用的 OhlcContainer 相同(連續的分線數據，以及有中斷的數據)
+            timeframes = [(1, 0, 0), (5, 0, 0), (0, 1, 0)]
+            og = ohlcGenerator(init_value=28, ohlc_time=datetime.datetime(year=2021, month=6, day=4, hour=9))
+            continuous_datas = [next(og) for _ in range(150)]
+
+            # 相鄰數據間隔 30 ~ 400 秒，較大時間尺度的結束時間常落在下一層 K 棒的中間
+            gapped_datas = []
+            date_time = datetime.datetime(year=2021, month=6, day=4, hour=9)
+
+            for _, open_value, high_value, low_value, close_value, volumn in continuous_datas:
+                date_time += datetime.timedelta(seconds=int(np.random.randint(30, 400)))
+                gapped_datas.append((date_time, open_value, high_value, low_value, close_value, volumn))
+
+            for datas in (continuous_datas, gapped_datas):
+                moc = MultiOhlcContainer(timeframes=timeframes)
+                singles = [OhlcContainer(minutes=minutes, hours=hours, days=days)
+                           for minutes, hours, days in timeframes]
+                multi_events = [[] for _ in timeframes]
+                single_events = [[] for _ in timeframes]
+
+                for level, single in enumerate(singles):
+                    moc[level].onOhlcFormed += lambda events=multi_events[level], **kwargs: events.append(kwargs)
+                    single.onOhlcFormed += lambda events=single_events[level], **kwargs: events.append(kwargs)
+
+                for data in datas:
+                    moc.addOhlc(*data)
+
+                    for single in singles:
+                        single.addOhlc(*data)
+
+                for level, single in enumerate(singles):
+                    for kind in ("start_datetime", "stop_datetime", "open", "high", "low", "close", "volumn"):
+                        assert list(getattr(moc[level], kind)) == getattr(single, kind), f"level {level}, {kind}"
+
+                    assert moc[level].index == single.index and moc[level].stop == single.stop, f"level {level}"
+                    assert multi_events[level] == single_events[level], f"level {level}"
+
+                # 所有時間尺度的 K 棒只存放一份
+                assert len(moc.level) == sum(len(single) for single in singles)
+
+                print(moc)
+
+
     OhlcTester.testOhlcContainer()
+    OhlcTester.testMultiOhlcContainer()
@@ -117,6 +117,62 @@ class Inventory:
 
         return self.remove_orders
 
+    def reconcile(self, snapshot: list, time: datetime.datetime = None):
+        """
+        以券商回報的完整庫存清單，一次比對出新增、更新與售出的庫存，並只寫檔一次。
+        取代逐筆呼叫 add() 後再呼叫 remove() 的流程(每筆都需篩選整份庫存)。
+
+        :param snapshot: 完整庫存清單 [[guid, stock_id, volumn, price], ...]
+        :param time: 新增庫存的時間，預設為當下
+        :return: (新增的庫存, 售出的庫存)，售出的股數為 原股數 - 回報股數
+        """
+        if time is None:
+            time = datetime.datetime.now()
+
+        columns = ["guid", "date_time", "stock_id", "volumn", "price"]
+        snapshot_df = pd.DataFrame(snapshot, columns=["guid", "stock_id", "volumn", "price"])
+        snapshot_df.drop_duplicates(subset="stock_id", keep="last", inplace=True)
+
+        # 以 stock_id 為鍵合併，_merge 欄位標示該庫存僅存在於原庫存(left_only)、回報(right_only)或兩者(both)
+        merged = self.df.merge(snapshot_df, on="stock_id", how="outer", suffixes=("", "_new"), indicator=True)
+
+        # 回報中沒有的庫存，代表已完全售出
+        sold_out = merged.loc[merged["_merge"] == "left_only", columns]
+
+        # 回報中才有的庫存，為新的庫存
+        added = merged.loc[merged["_merge"] == "right_only", ["guid_new", "stock_id", "volumn_new", "price_new"]]
+        added = pd.DataFrame({"guid": added["guid_new"].values,
+                              "date_time": str(time.date()),
+                              "stock_id": added["stock_id"].values,
+                              "volumn": added["volumn_new"].astype(int).values,
+                              "price": added["price_new"].values},
+                             columns=columns)
+
+        # 兩者皆有的庫存，股數與價格可能被更新；股數減少的部分視為部分售出
+        kept = merged.loc[merged["_merge"] == "both"].copy()
+        kept["sold_volumn"] = kept["volumn"].astype(int) - kept["volumn_new"].astype(int)
+        partial = kept.loc[kept["sold_volumn"] != 0, columns + ["sold_volumn"]].copy()
+        partial["volumn"] = partial["sold_volumn"]
+
+        kept["volumn"] = kept["volumn_new"].astype(int)
+        kept["price"] = kept["price_new"]
+
+        sold = pd.concat([sold_out, partial[columns]], ignore_index=True)
+        sold["volumn"] = sold["volumn"].astype(int)
+
+        self.df = pd.concat([kept[columns], added], ignore_index=True)
+        self.df["volumn"] = self.df["volumn"].astype(int)
+
+        for value in added.values:
+            self.logger.info(f"Add {list(value)}", extra=self.extra)
+
+        for value in sold.values:
+            self.logger.info(f"sold: {list(value)}", extra=self.extra)
+
+        self.save()
+
+        return added.values, sold.values
+
     def resetCheck(self):
         self.check = None
 
@@ -36,16 +36,23 @@ class DataLoader(metaclass=ABCMeta):
 
 
 def getAverage(df, column_name, n_data=30):
-    data = df[column_name].values
-    average_array = []
-
-    for i in range(len(data)):
-        if i < n_data:
-            average_array.append(np.mean(data[:i + 1]))
-        else:
-            average_array.append(np.mean(data[i - n_data: i]))
-
-    return np.array(average_array)
+    """
+    前 n_data 筆: 包含當筆在內，已有數據的平均；之後: 不包含當筆，前 n_data 筆數據的平均
+    以累加和一次計算，不需對每一筆數據重新切片計算平均
+
+    :param df: 數據
+    :param column_name: 欄位名稱
+    :param n_data: 平均的數據個數
+    :return:
+    """
+    data = df[column_name].values.astype(np.float64)
+    cumsum = np.concatenate([[0.0], np.cumsum(data)])
+    index = np.arange(len(data))
+
+    stop = np.where(index < n_data, index + 1, index)
+    start = np.where(index < n_data, 0, index - n_data)
+
+    return (cumsum[stop] - cumsum[start]) / (stop - start)
 
 
 if __name__ == "__main__":
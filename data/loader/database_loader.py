@@ -9,6 +9,7 @@ from data import StockCategory, parseOhlcData
 from data.loader import DataLoader
 from data.resource.ohlc_data import DayOhlcData, MinuteOhlcData
 from utils import truncatedNormal, getValidPrices
+from utils.time_codec import parseMinute, toDateKey, secondsToHmsKey
 
 
 class DatabaseLoader(DataLoader, metaclass=ABCMeta):
@@ -80,8 +81,10 @@ class DatabaseLoader(DataLoader, metaclass=ABCMeta):
         """
         # 1 分 K 為過去 1 分鐘內 tick 的總和，因此 tick 會比 1 分 K 早一分鐘
         tick_time = tick_time - datetime.timedelta(minutes=1) + datetime.timedelta(seconds=1)
-        tick_date = int(tick_time.strftime('%Y%m%d'))
-        one_second = datetime.timedelta(seconds=1)
+        tick_date = toDateKey(tick_time)
+
+        # 以當天第幾秒計算時間，不需每個 tick 都呼叫 strftime
+        tick_second = tick_time.hour * 3600 + tick_time.minute * 60 + tick_time.second
 
         prices, volumns = self.createTickValues(size=size,
                                                 open_value=int(100 * open_value),
@@ -97,8 +100,8 @@ class DatabaseLoader(DataLoader, metaclass=ABCMeta):
 
         for i in range(size - 1):
             # 更新目前時間
-            tick_hms = int(tick_time.strftime("%H%M%S"))
-            tick_time += one_second
+            tick_hms = secondsToHmsKey(tick_second)
+            tick_second += 1
 
             # vol: volumn of tick
             vol = int(volumns[i])
@@ -107,7 +110,7 @@ class DatabaseLoader(DataLoader, metaclass=ABCMeta):
             yield 0, int(stock_id), 0, tick_date, tick_hms, 0, price, price, price, vol, 1
 
         # 更新目前時間
-        tick_hms = int(tick_time.strftime("%H%M%S"))
+        tick_hms = secondsToHmsKey(tick_second)
         price = prices[size - 1]
         vol = int(volumns[size - 1])
 
@@ -380,7 +383,7 @@ class TickDatabaseLoader(DatabaseLoader):
             # if volumn == 0:
             #     continue
 
-            tick_time = datetime.datetime.strptime(date_time, "%Y/%m/%d %H:%M")
+            tick_time = parseMinute(date_time)
             # self.logger.debug(f"tick_time: {tick_time}")
             tick_generator = self.generateTicks(stock_id=self.stock_id,
                                                 tick_time=tick_time,
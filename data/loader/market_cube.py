@@ -0,0 +1,242 @@
+import datetime
+import logging
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from data.resource import DataBase
+from enums import OhlcType
+from submodule.Xu3.utils import getLogger
+
+
+class MarketCube:
+    """
+    全市場的 K 棒數據，以 (股票, 時間) 的稠密陣列存放於 multiprocessing.shared_memory，
+    主程序由 SQLite 讀取一次後，各子程序只需以 spec(名稱、形狀與座標軸，皆為小型資料)附加(attach)，
+    即可零複製地取得相同的數據，不需各自重新讀取資料庫，記憶體用量也不會隨程序數量增加。
+
+    欄位: open, high, low, close(float64，無數據為 NaN), volumn(int64，無數據為 0), valid(bool，該時間是否有數據)
+    """
+
+    FIELDS = (("open", np.float64),
+              ("high", np.float64),
+              ("low", np.float64),
+              ("close", np.float64),
+              ("volumn", np.int64),
+              ("valid", np.bool_))
+
+    def __init__(self, spec: dict, shm: shared_memory.SharedMemory, is_owner: bool,
+                 logger_dir="market_cube", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        請使用 MarketCube.build(建立) 或 MarketCube.attach(附加) 取得物件
+
+        :param spec: 共享記憶體的名稱、形狀、股票代碼與時間軸
+        :param shm: 共享記憶體
+        :param is_owner: 是否為建立者(負責釋放共享記憶體)
+        """
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        self.spec = spec
+        self.shm = shm
+        self.is_owner = is_owner
+
+        self.stock_ids = list(spec["stock_ids"])
+        self.stock_index = {stock_id: index for index, stock_id in enumerate(self.stock_ids)}
+
+        # 時間軸(datetime64[m])
+        self.times = np.asarray(spec["times"], dtype=np.int64).astype("datetime64[m]")
+        self.shape = (len(self.stock_ids), len(self.times))
+
+        # 各欄位為共享記憶體上的視圖
+        for name, dtype in self.FIELDS:
+            array = np.ndarray(self.shape, dtype=dtype, buffer=self.shm.buf, offset=spec["offsets"][name])
+            setattr(self, name, array)
+
+    def __repr__(self):
+        return f"MarketCube(name: {self.spec['name']}, #stock: {self.shape[0]}, #time: {self.shape[1]}, " \
+               f"is_owner: {self.is_owner})"
+
+    __str__ = __repr__
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    @staticmethod
+    def getLayout(n_stock: int, n_time: int):
+        """
+        計算各欄位在共享記憶體中的位移(以 8 bytes 對齊)
+
+        :return: 各欄位的位移, 總大小
+        """
+        offsets = dict()
+        size = 0
+
+        for name, dtype in MarketCube.FIELDS:
+            offsets[name] = size
+            n_byte = n_stock * n_time * np.dtype(dtype).itemsize
+            size += (n_byte + 7) // 8 * 8
+
+        return offsets, max(size, 1)
+
+    @staticmethod
+    def toTimes(time_strs):
+        # 2020/07/06 13:06 or 2020/07/06 -> datetime64[m]
+        return np.char.replace(np.asarray(time_strs, dtype=str), "/", "-").astype("datetime64[m]")
+
+    @classmethod
+    def build(cls, stock_ids: list, ohlc_type: OhlcType = OhlcType.Day, start_time: datetime.datetime = None,
+              end_time: datetime.datetime = None, db_name="stock_data",
+              logger_dir="market_cube", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        由資料庫讀取各股票的 K 棒，建立共享記憶體。時間軸為所有股票出現過的時間的聯集。
+
+        :param stock_ids: 股票代碼
+        :param ohlc_type: OhlcType.Day(DAY_XXXX) or OhlcType.Minute(MINUTE_XXXX)
+        :param start_time: 開始時間(含)
+        :param end_time: 結束時間(含)
+        :param db_name: 資料庫名稱
+        :return:
+        """
+        prefix = "MINUTE" if ohlc_type == OhlcType.Minute else "DAY"
+        db = DataBase(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+
+        # 每檔股票: (時間, 開高低收, 成交量)
+        stock_datas = []
+
+        for stock_id in stock_ids:
+            table_name = f"{prefix}_{stock_id}"
+
+            if not db.isTableExists(table_name=table_name):
+                stock_datas.append(None)
+                continue
+
+            where = DataBase.sqlTimeRange(table_name=table_name, start_time=start_time, end_time=end_time)
+            rows = db.select(table_name=table_name, where=where, sort_by="TIME").fetchall()
+
+            if len(rows) == 0:
+                stock_datas.append(None)
+                continue
+
+            fields = np.array(rows, dtype=object)
+            stock_datas.append((cls.toTimes(fields[:, 0]),
+                                fields[:, 1:5].astype(str).astype(np.float64),
+                                fields[:, 5].astype(np.int64)))
+
+        db.close(auto_commit=False)
+
+        times = [data[0] for data in stock_datas if data is not None]
+        times = np.unique(np.concatenate(times)) if len(times) > 0 else np.zeros(0, dtype="datetime64[m]")
+
+        n_stock = len(stock_ids)
+        n_time = len(times)
+        offsets, size = cls.getLayout(n_stock=n_stock, n_time=n_time)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        spec = dict(name=shm.name,
+                    stock_ids=list(stock_ids),
+                    times=times.astype(np.int64).tolist(),
+                    offsets=offsets)
+
+        cube = cls(spec=spec, shm=shm, is_owner=True, logger_dir=logger_dir, logger_name=logger_name)
+        cube.open.fill(np.nan)
+        cube.high.fill(np.nan)
+        cube.low.fill(np.nan)
+        cube.close.fill(np.nan)
+        cube.volumn.fill(0)
+        cube.valid.fill(False)
+
+        for index, data in enumerate(stock_datas):
+            if data is None:
+                continue
+
+            stock_times, prices, volumns = data
+            columns = np.searchsorted(times, stock_times)
+            cube.open[index, columns] = prices[:, 0]
+            cube.high[index, columns] = prices[:, 1]
+            cube.low[index, columns] = prices[:, 2]
+            cube.close[index, columns] = prices[:, 3]
+            cube.volumn[index, columns] = volumns
+            cube.valid[index, columns] = True
+
+        cube.logger.info(f"Build {cube}, size: {size / 1024 / 1024:.2f} MB", extra=cube.extra)
+
+        return cube
+
+    @classmethod
+    def attach(cls, spec: dict,
+               logger_dir="market_cube", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        子程序以建立者提供的 spec 附加至同一塊共享記憶體
+
+        :param spec: MarketCube.spec
+        :return:
+        """
+        shm = shared_memory.SharedMemory(name=spec["name"])
+
+        return cls(spec=spec, shm=shm, is_owner=False, logger_dir=logger_dir, logger_name=logger_name)
+
+    def getStock(self, stock_id: str):
+        """
+        :param stock_id: 股票代碼
+        :return: 該股票有數據的 時間, 開, 高, 低, 收, 量(皆為複製)
+        """
+        index = self.stock_index[stock_id]
+        valid = self.valid[index]
+
+        return (self.times[valid],
+                self.open[index, valid],
+                self.high[index, valid],
+                self.low[index, valid],
+                self.close[index, valid],
+                self.volumn[index, valid])
+
+    def getTimeIndex(self, time: datetime.datetime) -> int:
+        # time 之前(含)最後一個時間的索引值
+        return int(np.searchsorted(self.times, np.datetime64(time, "m"), side="right")) - 1
+
+    def detach(self):
+        # 只解除此程序的映射(numpy 視圖須先釋放)
+        for name, _ in self.FIELDS:
+            setattr(self, name, None)
+
+        self.shm.close()
+
+    def release(self):
+        """
+        解除映射，建立者另外釋放共享記憶體(所有子程序都結束後再呼叫)
+
+        :return:
+        """
+        self.detach()
+
+        if self.is_owner:
+            self.shm.unlink()
+
+
+if __name__ == "__main__":
+    from multiprocessing import Pool
+
+
+    def countValid(spec):
+        cube = MarketCube.attach(spec=spec)
+        n_valid = int(cube.valid.sum())
+        cube.detach()
+
+        return n_valid
+
+
+    market_cube = MarketCube.build(stock_ids=["2330", "2812", "0056"],
+                                   start_time=datetime.datetime(2021, 1, 1),
+                                   end_time=datetime.datetime(2021, 7, 1))
+    print(market_cube)
+
+    with Pool(2) as pool:
+        print(pool.map(countValid, [market_cube.spec] * 2))
+
+    market_cube.release()
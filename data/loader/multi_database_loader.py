@@ -6,6 +6,7 @@ from brokerage.ohlc_data import OhlcData
 from data.loader import DataLoader
 from data.resource.ohlc_data import DayOhlcData
 from enums import OhlcType
+from utils.time_codec import parseDate
 
 
 class MultiDatabaseLoader(DataLoader):
@@ -31,7 +32,9 @@ class MultiDatabaseLoader(DataLoader):
         if ohlc_type == OhlcType.Day:
             for request_ohlc in request_ohlcs:
                 if not self.day_ohlc.__contains__(request_ohlc):
+                    # 允許 Quote 在背景執行緒預先讀取下一段數據
                     self.day_ohlc[request_ohlc] = DayOhlcData(stock_id=request_ohlc,
+                                                              check_same_thread=False,
                                                               logger_dir=self.logger_dir,
                                                               logger_name=self.logger_name)
 
@@ -42,6 +45,7 @@ class MultiDatabaseLoader(DataLoader):
                     #                                                 logger_dir=self.logger_dir,
                     #                                                 logger_name=self.logger_name)
                     self.minute_ohlc[request_ohlc] = DayOhlcData(stock_id=request_ohlc,
+                                                                 check_same_thread=False,
                                                                  logger_dir=self.logger_dir,
                                                                  logger_name=self.logger_name)
 
@@ -80,7 +84,16 @@ class MultiDatabaseLoader(DataLoader):
 
     # TODO: 或許可在這裡額外添加 08:30/(13:25/13:30)/14:00 等時間戳，用以協助推動時間
     def loadData(self, start_time: datetime.datetime = None, end_time: datetime.datetime = None):
-        self.day_ohlcs = []
+        self.day_ohlcs = self.loadDayOhlcs(start_time=start_time, end_time=end_time)
+
+    def loadDayOhlcs(self, start_time: datetime.datetime = None, end_time: datetime.datetime = None):
+        """
+        讀取 start_time ~ end_time 之間的數據，不修改 self.day_ohlcs，因此可在背景執行緒讀取下一段數據，
+        同時主執行緒仍在使用當前這段數據。同一時間只能有一個執行緒呼叫。
+
+        :return: [(day: datetime, day_datas: [OhlcData, ...]), ...]
+        """
+        day_ohlcs = []
 
         temp_minute_times = ["09:30", "10:30", "11:30", "12:30", "13:25"]
 
@@ -144,7 +157,9 @@ class MultiDatabaseLoader(DataLoader):
             #     ohlc_data = f"{date_time}, {ohlc[1]}, {ohlc[2]}, {ohlc[3]}, {ohlc[4]}, {ohlc[5]}"
             #     day_ohlc.append((stock_id, ohlc_data))
 
-            self.day_ohlcs.append((datetime.datetime.strptime(day, "%Y/%m/%d"), day_datas))
+            day_ohlcs.append((parseDate(day), day_datas))
+
+        return day_ohlcs
 
     def getHistoryData(self, start_time: datetime.datetime = None, end_time: datetime.datetime = None):
         if start_time is None:
@@ -7,11 +7,12 @@ from enum import Enum
 import numpy as np
 
 from submodule.Xu3.utils import getLogger
+from utils.time_codec import parseDateTime
 
 
 # TODO: 純化 DataBase 類別，或許可以提升至 Xu3 當中，提供其他專案的資料庫使用
 class DataBase:
-    def __init__(self, db_name,
+    def __init__(self, db_name, check_same_thread=True,
                  logger_dir="database", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
         """
         NULL	值是一個 NULL 值。
@@ -26,8 +27,10 @@ class DataBase:
         TEXT	格式為 "YYYY-MM-DD HH:MM:SS.SSS" 的日期。
         REAL	從公元前 4714 年 11 月 24 日格林尼治時間的正午開始算起的天數。
         INTEGER	從 1970-01-01 00:00:00 UTC 算起的秒數。
+
+        check_same_thread: 若為 False，則允許在建立連線以外的執行緒存取(例如背景預先讀取)，使用者須自行確保不會同時存取
         """
-        self.db = sqlite3.connect(f"data/{db_name}.db")
+        self.db = sqlite3.connect(f"data/{db_name}.db", check_same_thread=check_same_thread)
         self.cursor = self.db.cursor()
         self.table_name = None
         self.primary_key = []
@@ -73,6 +76,31 @@ class DataBase:
     def sqlLt(key, value):
         return f"{key} < {value}"
 
+    @staticmethod
+    def sqlTimeRange(table_name: str, start_time: datetime.datetime = None, end_time: datetime.datetime = None):
+        """
+        TIME 欄位的時間範圍(含頭尾)。日線表格(DAY_XXXX)的 TIME 為 '2021/01/04'，以日期比較；
+        分線表格(MINUTE_XXXX)的 TIME 為 '2021/01/04 09:30'，以分鐘比較
+
+        :param table_name: 表格名稱
+        :param start_time: 開始時間
+        :param end_time: 結束時間
+        :return: 篩選條件，皆為 None 時返回 None
+        """
+        time_format = "%Y/%m/%d" if table_name.startswith("DAY_") else "%Y/%m/%d %H:%M"
+        conditions = []
+
+        if start_time is not None:
+            conditions.append(f"'{start_time.strftime(time_format)}' <= TIME")
+
+        if end_time is not None:
+            conditions.append(f"TIME <= '{end_time.strftime(time_format)}'")
+
+        if len(conditions) == 0:
+            return None
+
+        return DataBase.sqlAnd(*conditions)
+
     def execute(self, sql, commit=False):
         result = self.cursor.execute(sql)
 
@@ -408,9 +436,10 @@ class ResourceData(DataBase, metaclass=ABCMeta):
         Close = "CLOSE"
         Vol = "VOL"
 
-    def __init__(self, db_name,
+    def __init__(self, db_name, check_same_thread=True,
                  logger_dir="resource_data", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
-        super().__init__(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+        super().__init__(db_name=db_name, check_same_thread=check_same_thread,
+                         logger_dir=logger_dir, logger_name=logger_name)
 
     @abstractmethod
     def setLoggerLevel(self, level):
@@ -488,10 +517,7 @@ class ResourceData(DataBase, metaclass=ABCMeta):
             date_time, open_value, high_value, low_value, close_value, volumn = result
 
             if start_time is None:
-                try:
-                    start_time = datetime.datetime.strptime(date_time, "%Y/%m/%d")
-                except ValueError:
-                    start_time = datetime.datetime.strptime(date_time, "%Y/%m/%d %H:%M")
+                start_time = parseDateTime(date_time)
 
             if history_open is None:
                 history_open = Decimal(open_value).quantize(Decimal('.00'), ROUND_HALF_UP)
@@ -521,6 +547,50 @@ class ResourceData(DataBase, metaclass=ABCMeta):
 
         return history
 
+    def addBarsCore(self, bars, time_unit: str, last_time: datetime.datetime = None, check_sequence=True):
+        """
+        將 parseOhlcBatch 產生的結構化陣列寫入資料庫，以向量化方式排序、篩選並轉為資料庫的字串格式，
+        重複的時間由 INSERT OR IGNORE 忽略，不需逐筆比對 primary key。
+
+        :param bars: 結構化陣列(dtype 為 data.OHLC_DTYPE)
+        :param time_unit: "D"(日線，%Y/%m/%d) or "m"(分線，%Y/%m/%d %H:%M)
+        :param last_time: 資料庫中最新一筆數據的時間
+        :param check_sequence: 是否略過比 last_time 還舊的數據
+        :return: 寫入後最新一筆數據的時間
+        """
+        if len(bars) == 0:
+            return last_time
+
+        bars = np.sort(bars, order="time", kind="stable")
+
+        if check_sequence and last_time is not None:
+            bars = bars[bars["time"] >= np.datetime64(last_time, "m")]
+
+            if len(bars) == 0:
+                self.logger.debug("新加入數據之時間，皆較資料庫中最近一筆來的早，故不加入", extra=self.extra)
+                return last_time
+
+        # 2020-07-06T13:06 -> 2020/07/06 13:06
+        times = np.datetime_as_string(bars["time"], unit=time_unit)
+        times = np.char.replace(np.char.replace(times, "-", "/"), "T", " ")
+
+        values = list(zip(times.tolist(),
+                          np.char.mod("%.6f", bars["open"]).tolist(),
+                          np.char.mod("%.6f", bars["high"]).tolist(),
+                          np.char.mod("%.6f", bars["low"]).tolist(),
+                          np.char.mod("%.6f", bars["close"]).tolist(),
+                          bars["volumn"].tolist()))
+
+        self.add(values=values)
+        self.commit()
+
+        new_last_time = bars["time"][-1].astype(datetime.datetime)
+
+        if last_time is None:
+            return new_last_time
+
+        return max(last_time, new_last_time)
+
     def getLastTimeCore(self, temp_time, latest_time: datetime.datetime, time_column: str, parseTime=None):
         """
         取得資料庫中最新一筆的時間，並判斷與 latest_time 何者時間更新，返回較新的時間點
@@ -585,18 +655,10 @@ class ResourceData(DataBase, metaclass=ABCMeta):
 
         sql = f"""SELECT {columns_name} from {table_name}"""
 
-        if start_time is not None and end_time is not None:
-            start_time -= datetime.timedelta(seconds=1)
-            time_start = start_time.strftime("%Y/%m/%d %H:%M")
-            time_end = end_time.strftime("%Y/%m/%d %H:%M")
-            sql += f" WHERE '{time_start}' <= TIME AND TIME <= '{time_end}'"
-        elif start_time is not None:
-            start_time -= datetime.timedelta(seconds=1)
-            time_start = start_time.strftime("%Y/%m/%d %H:%M")
-            sql += f" WHERE '{time_start}' <= TIME"
-        elif end_time is not None:
-            time_end = end_time.strftime("%Y/%m/%d %H:%M")
-            sql += f" WHERE TIME <= '{time_end}'"
+        where = self.sqlTimeRange(table_name=table_name, start_time=start_time, end_time=end_time)
+
+        if where is not None:
+            sql += f" WHERE {where}"
 
         if sort_by is not None:
             sql += f" ORDER BY {sort_by} {sort_type}"
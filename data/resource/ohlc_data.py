@@ -3,19 +3,22 @@ import functools
 import logging
 
 from data.resource import ResourceData
+from utils.time_codec import parseDate, parseMinute
 
 
 class DayOhlcData(ResourceData):
-    def __init__(self, stock_id, latest_time=None, level: logging = logging.INFO,
+    def __init__(self, stock_id, latest_time=None, level: logging = logging.INFO, check_same_thread=True,
                  logger_dir="resource_data", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
         """
 
         :param stock_id:
         :param latest_time: 數據最久只取到這個時間點之後，那之前的數據則忽略
+        :param check_same_thread: 是否限制只能在建立連線的執行緒存取
         :param logger_dir:
         :param logger_name:
         """
-        super().__init__(db_name="stock_data", logger_dir=logger_dir, logger_name=logger_name)
+        super().__init__(db_name="stock_data", check_same_thread=check_same_thread,
+                         logger_dir=logger_dir, logger_name=logger_name)
         self.setLoggerLevel(level=level)
 
         self.stock_id = stock_id
@@ -72,7 +75,7 @@ class DayOhlcData(ResourceData):
         values.sort(key=lambda value: value[0])
 
         # 輸入時間為字串，為進行時間上的比較，故須轉型為 datetime
-        last_day = datetime.datetime.strptime(values[-1][0], "%Y/%m/%d")
+        last_day = parseDate(values[-1][0])
         self.logger.debug(f"last_day in values: {last_day}", extra=self.extra)
 
         # 若 self.last_day 尚未初始化
@@ -91,6 +94,17 @@ class DayOhlcData(ResourceData):
 
         super().add_(primary_column=primary_column, values=values)
 
+    def addBars(self, bars, check_sequence=True):
+        """
+        批次寫入日線數據
+
+        :param bars: data.parseOhlcBatch 產生的結構化陣列
+        :param check_sequence: 是否略過比資料庫中最近一筆還舊的數據
+        :return:
+        """
+        self.last_day = self.addBarsCore(bars=bars, time_unit="D", last_time=self.last_day,
+                                         check_sequence=check_sequence)
+
     def displayDayData(self, columns: list = None,
                        sort_by: str = "TIME", sort_type="ASC",
                        limit: int = 20, offset: int = 0):
@@ -108,9 +122,10 @@ class DayOhlcData(ResourceData):
 
 # 1分鐘線
 class MinuteOhlcData(ResourceData):
-    def __init__(self, stock_id, latest_time=None,
+    def __init__(self, stock_id, latest_time=None, check_same_thread=True,
                  logger_dir="resource_data", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
-        super().__init__(db_name="stock_data", logger_dir=logger_dir, logger_name=logger_name)
+        super().__init__(db_name="stock_data", check_same_thread=check_same_thread,
+                         logger_dir=logger_dir, logger_name=logger_name)
         self.stock_id = stock_id
         self.getDataTable()
         self.last_minute = None
@@ -153,7 +168,7 @@ class MinuteOhlcData(ResourceData):
         values.sort(key=lambda value: value[0])
 
         # 輸入時間為字串，為進行時間上的比較，故須轉型為 datetime
-        last_minute = datetime.datetime.strptime(values[-1][0], "%Y/%m/%d %H:%M")
+        last_minute = parseMinute(values[-1][0])
         self.logger.debug(f"last_minute in values: {last_minute}", extra=self.extra)
 
         # 若 self.last_minute 尚未初始化
@@ -172,6 +187,17 @@ class MinuteOhlcData(ResourceData):
 
         super().add_(primary_column="TIME", values=values)
 
+    def addBars(self, bars, check_sequence=True):
+        """
+        批次寫入分線數據
+
+        :param bars: data.parseOhlcBatch 產生的結構化陣列
+        :param check_sequence: 是否略過比資料庫中最近一筆還舊的數據
+        :return:
+        """
+        self.last_minute = self.addBarsCore(bars=bars, time_unit="m", last_time=self.last_minute,
+                                            check_sequence=check_sequence)
+
     def displayMinuteData(self, columns: list = None,
                           sort_by: str = "TIME", sort_type="ASC",
                           limit: int = 20, offset: int = 0):
@@ -1,4 +1,7 @@
+import csv
 import datetime
+import os
+from collections import defaultdict
 from decimal import Decimal
 
 import utils.globals_variable as gv
@@ -6,10 +9,123 @@ from data.inventory import Inventory
 from order import OrderList
 from submodule.Xu3.utils import getLogger
 from submodule.events import Event
+from utils.time_codec import parseDate
+
+
+class WorldCalendar:
+    def __init__(self):
+        """
+        以 (日期, 股票代碼) 為鍵的事件日曆，在建構時一次整理好實際成交與除權息事件，
+        每日只需以字典查詢當天的事件，不需再逐筆解析時間與掃描列表。
+        可由多個 TheWorld 共用，一次匯入多檔股票的歷史股利數據。
+        """
+        # (date, stock_id) -> [(guid, time, price, volumn), ...]
+        self.fills = defaultdict(list)
+
+        # (date, stock_id) -> [revise_value, ...]
+        self.revises = defaultdict(list)
+
+        # 已匯入庫存數據的股票，避免多個 TheWorld(或重複回測)共用日曆時重複加入而觸發多次事件
+        self.loaded_stock_ids = set()
+
+    def addFill(self, stock_id: str, guid: str, time: datetime.datetime, price: str, volumn: int = 1):
+        self.fills[(time.date(), stock_id)].append((guid, time, price, volumn))
+
+    def addFills(self, values):
+        """
+        匯入庫存數據
+
+        :param values: [[guid, date_time, stock_id, volumn, price], ...]
+        :return:
+        """
+        for guid, buy_time, stock_id, _, price in values:
+            self.addFill(stock_id=stock_id, guid=guid, time=parseDate(buy_time), price=price)
+
+    def loadStock(self, stock_id: str, values, revises: list = None) -> bool:
+        """
+        匯入單一股票的庫存數據與除權息數據，每檔股票只會匯入一次
+
+        :param stock_id: 股票代碼
+        :param values: [[guid, date_time, stock_id, volumn, price], ...]
+        :param revises: [(revise_date, revise_value), ...]
+        :return: 是否為首次匯入
+        """
+        if stock_id in self.loaded_stock_ids:
+            return False
+
+        self.loaded_stock_ids.add(stock_id)
+        self.addFills(values=values)
+
+        if revises is not None:
+            self.addRevises(revises={stock_id: revises})
+
+        return True
+
+    def addRevise(self, stock_id: str, revise_date: datetime.date, revise_value: Decimal):
+        self.revises[(revise_date, stock_id)].append(revise_value)
+
+    def addRevises(self, revises: dict):
+        """
+        一次匯入多檔股票的除權息數據
+
+        :param revises: {stock_id: [(revise_date, revise_value), ...], ...}
+        :return:
+        """
+        for stock_id, stock_revises in revises.items():
+            for revise_date, revise_value in stock_revises:
+                self.addRevise(stock_id=stock_id, revise_date=revise_date, revise_value=revise_value)
+
+    def loadRevises(self, path: str):
+        """
+        讀取歷史股利數據，欄位為 stock_id, revise_date(%Y-%m-%d), revise_value(每股股利，以負值表示價格下修)
+
+        :param path: csv 路徑
+        :return:
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+
+            # 略過標頭
+            next(reader, None)
+
+            for row in reader:
+                if len(row) == 0:
+                    continue
+
+                stock_id, revise_date, revise_value = row
+                self.addRevise(stock_id=stock_id,
+                               revise_date=parseDate(revise_date).date(),
+                               revise_value=Decimal(revise_value))
+
+    def getFills(self, date_time: datetime.date, stock_id: str) -> list:
+        return self.fills.get((date_time, stock_id), [])
+
+    def getRevises(self, date_time: datetime.date, stock_id: str) -> list:
+        return self.revises.get((date_time, stock_id), [])
+
+
+# 多個 TheWorld 共用的事件日曆，第一次使用時才建立，並匯入歷史股利數據，之後共用
+world_calendar = None
+
+
+def getWorldCalendar(revise_path="data/revise.csv") -> WorldCalendar:
+    """
+    :param revise_path: 歷史股利數據(格式見 WorldCalendar.loadRevises)，檔案不存在時不匯入
+    :return: 共用的事件日曆
+    """
+    global world_calendar
+
+    if world_calendar is None:
+        world_calendar = WorldCalendar()
+
+        if os.path.exists(revise_path):
+            world_calendar.loadRevises(path=revise_path)
+
+    return world_calendar
 
 
 class TheWorld:
-    def __init__(self, stock_id: str, order_list: OrderList,
+    def __init__(self, stock_id: str, order_list: OrderList, calendar: WorldCalendar = None,
                  logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
         self.stock_id = stock_id
 
@@ -20,8 +136,7 @@ class TheWorld:
         self.onTheWorld = self.event.onTheWorld
         self.onRevise = self.event.onRevise
 
-        # TODO: 歷史股利導入回測
-        # 股利發放金額(現金股利)
+        # 股利發放金額(現金股利)，大量的歷史股利數據可透過共用的 WorldCalendar.loadRevises 匯入
         self.temp_revise = {
             # "2812": [(datetime.date(2021, 8, 31), Decimal("-0.45"))],
             # "5880": [(datetime.date(2021, 8, 11), Decimal("-0.85")),
@@ -55,39 +170,29 @@ class TheWorld:
         # 載入實際交易數據的 時間、價格 等資訊，在相對應的時間用相對應的價格買入
         self.values = self.inventory.load(stock_id=self.stock_id)
 
+        # 事件日曆: 可由外部傳入多檔股票共用的日曆，否則建立自己的
+        if calendar is None:
+            calendar = WorldCalendar()
+
+        self.calendar = calendar
+        self.calendar.loadStock(stock_id=self.stock_id, values=self.values, revises=self.temp_revise.get(self.stock_id))
+
         gv.initialize()
         self.discount = gv.e_capital_discount
 
     def onNextDayListener(self, date_time: datetime.date):
-        for value in self.values:
-            guid, buy_time, stock_id, volumn, price = value
-
-            try:
-                time = datetime.datetime.strptime(buy_time, "%Y-%m-%d")
-            except ValueError:
-                time = datetime.datetime.strptime(buy_time, "%Y/%m/%d")
+        # 檢查是否為實際成交的那天
+        for guid, time, price, _ in self.calendar.getFills(date_time=date_time, stock_id=self.stock_id):
+            self.onTheWorld(guid=guid, time=time, price=price, volumn=1)
 
-            # 檢查是否為實際成交的那天
-            if time.date() == date_time:
-                self.onTheWorld(guid=guid, time=time, price=price, volumn=1)
-
-            if self.temp_revise.__contains__(stock_id):
-                revises = self.temp_revise[stock_id]
-
-                for revise in revises:
-                    revise_date, revise_value = revise
-
-                    if date_time == revise_date:
-                        self.onRevise(revise_date=revise_date, revise_value=revise_value)
+        # 除權息與是否有實際庫存無關，日曆中的歷史股利數據也適用於回測中的部位
+        for revise_value in self.calendar.getRevises(date_time=date_time, stock_id=self.stock_id):
+            self.onRevise(revise_date=date_time, revise_value=revise_value)
 
     def getData(self):
         # guid, date_time, stock_id, volumn, price
         _, buy_time, _, _, price = self.values[0]
-
-        try:
-            time = datetime.datetime.strptime(buy_time, "%Y-%m-%d")
-        except ValueError:
-            time = datetime.datetime.strptime(buy_time, "%Y/%m/%d")
+        time = parseDate(buy_time)
 
         # time, price
         return time, Decimal(price)
@@ -85,6 +85,24 @@ class Category(Enum):
     Foreign = "Foreign"
 
 
+class ScheduleKind(Enum):
+    """
+    事件排程器中的事件類型，同一時間點的事件依數值由小到大處理
+    """
+    # 開盤
+    SessionOpen = 0
+    # 除權息等公司行動，在開盤後、任何報價之前處理
+    CorporateAction = 1
+    # 逐筆數據
+    Tick = 2
+    # 分線數據
+    Minute = 3
+    # 日線數據
+    Day = 4
+    # 收盤
+    SessionClose = 5
+
+
 class CapitalType(Enum):
     NoneTpye = None
     Capital = "capital"
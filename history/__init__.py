@@ -11,6 +11,7 @@ from history.capital import LocalCapital
 from history.statistics import descriptiveStatistics, decilePercentage
 from history.trade_record import LocalTradeRecord
 from submodule.Xu3.utils import getLogger
+from utils.checkpoint import getState, setState
 
 
 # 單筆 Order 的交易紀錄(容許分次買賣)
@@ -22,6 +23,10 @@ class TradeRecord:
         self.record = None
 
     def __getattr__(self, item):
+        # pickle 還原時，會在 __init__ 之前查詢 __setstate__ 等屬性，此時尚未有 self.record，不可再透過 self.record 查詢
+        if item == "record" or (item.startswith("__") and item.endswith("__")):
+            raise AttributeError(item)
+
         if self.record.__contains__(item):
             return self.record[item]
         else:
@@ -311,6 +316,17 @@ class History:
 
         self.report.report_(*args)
 
+    # region 狀態快照
+    def getState(self) -> dict:
+        # 報告由交易紀錄產生，還原後再重新建立
+        return getState(self, exclude=("report",))
+
+    def setState(self, state: dict):
+        setState(self, state)
+        self.report = None
+
+    # endregion
+
 
 # TODO: 各指標皆須考慮無數值的問題(可能執行期間不足以產生特定數據)
 class Report:
@@ -1,80 +1,212 @@
+import bisect
+import csv
 import datetime
+import os
+from collections import defaultdict
 from decimal import Decimal, ROUND_HALF_UP
 from dateutil.parser import parse as time_parser
-import pandas as pd
 
+from data.resource import DataBase
 from enums import CapitalType
 
 
+class CapitalLedger(DataBase):
+    def __init__(self, db_name="capital", csv_path="data/funds.csv",
+                 logger_dir="capital", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        資金流水帳，以 SQLite 僅附加(append-only)的方式寫入，不再每次儲存都重寫整份 csv。
+        載入時建立各用戶的累計投入資金，以及依 (日期, 編號) 排序的資金存量時間軸，
+        查詢"某日為止的資金存量"只需二分搜尋，不需每次重新篩選整份帳本。
+
+        :param db_name: 資料庫名稱
+        :param csv_path: 舊版 csv 帳本，資料表為空時會匯入一次
+        """
+        super().__init__(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+        self.csv_path = csv_path
+
+        # NUMBER,TIME,USER,TYPE,FLOW,STOCK,REMARK
+        self.getTable(table_name="FUNDS",
+                      table_definition="""NUMBER INTEGER PRIMARY KEY,
+                      TIME TEXT NOT NULL,
+                      USER TEXT NOT NULL,
+                      TYPE TEXT NOT NULL,
+                      FLOW TEXT NOT NULL,
+                      STOCK TEXT NOT NULL,
+                      REMARK TEXT""")
+        self.execute("CREATE INDEX IF NOT EXISTS FUNDS_USER_TIME ON FUNDS (USER, TIME, NUMBER);", commit=True)
+
+        # 最後一筆數據的編號
+        self.number = 0
+
+        # 各用戶累計投入資金(僅計算 CapitalType.Capital)
+        self.capitals = defaultdict(lambda: Decimal("0"))
+
+        # 各用戶資金存量時間軸: keys 為 (yyyymmdd, NUMBER)，與 values 一一對應，且皆已排序
+        self.stock_keys = defaultdict(list)
+        self.stock_values = defaultdict(list)
+
+        if self.isTableEmpty(table_name=self.table_name) and os.path.exists(self.csv_path):
+            self.importCsv(path=self.csv_path)
+
+        self.load()
+
+    @staticmethod
+    def dateKey(time: datetime.date) -> int:
+        return time.year * 10000 + time.month * 100 + time.day
+
+    def importCsv(self, path: str):
+        """
+        將舊版 csv 帳本匯入資料庫，日期只在此解析一次，並統一為 %Y/%m/%d 格式(字串排序即時間排序)
+
+        :param path: csv 路徑
+        :return:
+        """
+        values = []
+
+        with open(path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+
+            # 略過標頭 NUMBER,TIME,USER,TYPE,FLOW,STOCK,REMARK
+            next(reader, None)
+
+            for row in reader:
+                if len(row) == 0:
+                    continue
+
+                number, time, user, capital_type, flow, stock, remark = row
+                time = time_parser(time).strftime("%Y/%m/%d")
+                values.append((int(number), time, user, capital_type, flow, stock, remark))
+
+        self.add(values=values)
+        self.commit()
+        self.logger.info(f"Import {len(values)} records from {path}", extra=self.extra)
+
+    def exportCsv(self, path: str = None):
+        """
+        將帳本輸出為 csv，作為備份或人工檢視之用，平時儲存不需呼叫
+
+        :param path: csv 路徑
+        :return:
+        """
+        if path is None:
+            path = self.csv_path
+
+        result = self.select(sort_by="NUMBER")
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["NUMBER", "TIME", "USER", "TYPE", "FLOW", "STOCK", "REMARK"])
+            writer.writerows(result.fetchall())
+
+    def load(self):
+        self.number = 0
+        self.capitals.clear()
+        self.stock_keys.clear()
+        self.stock_values.clear()
+
+        result = self.select(sort_by="NUMBER")
+
+        for number, time, user, capital_type, flow, stock, _ in result.fetchall():
+            self.cache(number=number,
+                       date_key=self.dateKey(datetime.datetime.strptime(time, "%Y/%m/%d")),
+                       user=user,
+                       capital_type=capital_type,
+                       flow=Decimal(flow),
+                       stock=Decimal(stock))
+
+    def cache(self, number: int, date_key: int, user: str, capital_type: str, flow: Decimal, stock: Decimal):
+        self.number = max(self.number, number)
+
+        if capital_type == CapitalType.Capital.value:
+            self.capitals[user] += flow
+
+        keys = self.stock_keys[user]
+        key = (date_key, number)
+
+        # 絕大多數情況下是依時間順序附加，直接 append；補登過去日期時才需要插入
+        if len(keys) == 0 or keys[-1] < key:
+            keys.append(key)
+            self.stock_values[user].append(stock)
+        else:
+            index = bisect.bisect_right(keys, key)
+            keys.insert(index, key)
+            self.stock_values[user].insert(index, stock)
+
+    def append(self, time: datetime.datetime, user: str, capital_type: CapitalType, flow: Decimal, stock: Decimal,
+               remark: str) -> int:
+        """
+        附加一筆資金流水，寫入資料庫(尚未 commit)並同步更新快取
+
+        :return: 該筆數據的編號
+        """
+        self.number += 1
+        self.add(values=[(self.number, time.strftime("%Y/%m/%d"), user, capital_type.value,
+                          str(flow), str(stock), remark)])
+        self.cache(number=self.number,
+                   date_key=self.dateKey(time),
+                   user=user,
+                   capital_type=capital_type.value,
+                   flow=flow,
+                   stock=stock)
+
+        return self.number
+
+    def getCapital(self, user: str) -> Decimal:
+        return self.capitals[user]
+
+    def getStock(self, user: str, time: datetime.date) -> Decimal:
+        """
+        取得 user 在 time(含)之前，最後一筆資金存量
+
+        :param user: 用戶名稱
+        :param time: 查詢日期
+        :return:
+        """
+        keys = self.stock_keys[user]
+        index = bisect.bisect_right(keys, (self.dateKey(time), float("inf")))
+
+        if index == 0:
+            return Decimal("0")
+
+        return self.stock_values[user][index - 1]
+
+
 class LocalCapital:
     def __init__(self):
         self.path = "data/funds.csv"
+
         # NUMBER,TIME,USER,TYPE,FLOW,STOCK,REMARK
-        self.df = pd.read_csv(self.path, dtype={0: int, 1: str, 2: str, 3: str, 4: str, 5: str, 6: str})
+        self.ledger = CapitalLedger(csv_path=self.path)
         self.administrator = "j32u4ukh"
         self.users = ["ahuayeh"]
         self.number = self.getLastNumber()
 
     def getLastNumber(self):
-        # [146, '2021/9/30', 'j32u4ukh', 'revenue', '2833', '421635', '79']
-        data = list(self.df.iloc[-1])
-
-        return data[0]
+        return self.ledger.number
 
     def getUsersCapital(self):
-        df = self.df[self.df["TYPE"] == CapitalType.Capital.value]
-        admin_capital = self.getUserCapital(df=df, user=self.administrator, preprocess=True)
+        admin_capital = self.getUserCapital(user=self.administrator)
         users_capital = {self.administrator: admin_capital}
 
         for user in self.users:
-            users_capital[user] = self.getUserCapital(df=df, user=user, preprocess=True)
+            users_capital[user] = self.getUserCapital(user=user)
 
         return users_capital
 
-    @staticmethod
-    def getUserCapital(df, user, preprocess=False):
-        capital = Decimal("0")
-
-        if preprocess:
-            user_df = df[df["USER"] == user]
-        else:
-            user_df = df[(df["USER"] == user) & (df["TYPE"] == CapitalType.Capital.value)]
-
-        n_data = len(user_df)
-
-        for i in range(n_data):
-            # NUMBER,TIME,USER,TYPE,FLOW,STOCK,REMARK
-            data = user_df.iloc[i]
-            capital += Decimal(data["FLOW"])
-
-        return capital
+    def getUserCapital(self, user):
+        return self.ledger.getCapital(user=user)
 
     def getUsersStock(self, time: datetime.datetime = datetime.datetime.today()):
-        self.df["TIME"] = pd.to_datetime(self.df["TIME"])
-        df = self.df[self.df["TIME"] <= time]
-        admin_stock = self.getUserStock(df=df, user=self.administrator, preprocess=True)
+        admin_stock = self.getUserStock(user=self.administrator, time=time)
         users_stock = {self.administrator: admin_stock}
 
         for user in self.users:
-            users_stock[user] = self.getUserStock(df=df, user=user, preprocess=True)
+            users_stock[user] = self.getUserStock(user=user, time=time)
 
         return users_stock
 
-    @staticmethod
-    def getUserStock(df, user, time: datetime.datetime = datetime.datetime.today(), preprocess=False):
-        if preprocess:
-            user_df = df[df["USER"] == user]
-        else:
-            df["TIME"] = pd.to_datetime(df["TIME"])
-            user_df = df[(df["USER"] == user) & (df["TIME"] <= time)]
-
-        if len(user_df) == 0:
-            return Decimal("0")
-
-        data = user_df.iloc[-1]
-        stock = Decimal(data["STOCK"])
-
-        return stock
+    def getUserStock(self, user, time: datetime.datetime = datetime.datetime.today()):
+        return self.ledger.getStock(user=user, time=time)
 
     def getCapitalSummary(self, time: datetime.datetime = datetime.datetime.today()):
         summary = dict()
@@ -157,23 +289,16 @@ class LocalCapital:
     def add(self, time: datetime.datetime, user: str, capital_type: CapitalType, flow: Decimal, stock: Decimal,
             remark: str):
         # NUMBER,TIME(2020/06/17),USER,TYPE,FLOW,STOCK,REMARK
-        self.number += 1
-        self.df = self.df.append({"NUMBER": self.number,
-                                  "TIME": time.strftime("%Y/%m/%d"),
-                                  "USER": user,
-                                  "TYPE": capital_type.value,
-                                  "FLOW": str(flow),
-                                  "STOCK": str(stock),
-                                  "REMARK": remark
-                                  }, ignore_index=True)
+        self.number = self.ledger.append(time=time,
+                                         user=user,
+                                         capital_type=capital_type,
+                                         flow=flow,
+                                         stock=stock,
+                                         remark=remark)
 
     def save(self):
-        self.df.sort_values(by=["NUMBER"], inplace=True)
-
-        self.df["TIME"] = pd.to_datetime(self.df["TIME"])
-
-        # 資金數據更新
-        self.df.to_csv(self.path, index=False)
+        # 資金數據更新(僅寫入新增的數據)
+        self.ledger.commit()
 
 
 if __name__ == "__main__":
@@ -1,31 +1,183 @@
+import csv
 import datetime
 import functools
+import os
 from decimal import Decimal
 
 import pandas as pd
 from dateutil.parser import parse as time_parser
 
+from data.resource import DataBase
 from enums import BuySell
 
 
+class TradeJournal(DataBase):
+    # number, stock_id, buy_time, sell_time, buy_price, sell_price, volumn, buy_cost, sell_cost, revenue
+    columns = ["number", "stock_id", "buy_time", "sell_time", "buy_price", "sell_price", "volumn",
+               "buy_cost", "sell_cost", "revenue"]
+
+    def __init__(self, db_name="trade_record", csv_path="data/trade_record.csv", batch_size=1,
+                 logger_dir="trade_record", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        交易紀錄日誌，以 SQLite 僅附加(append-only)的方式寫入，並對 (STOCK_ID, NUMBER) 建立索引，
+        記錄交易時不再需要重寫整份 csv，查詢最後買入時間也不需篩選並排序整份紀錄。
+
+        :param db_name: 資料庫名稱
+        :param csv_path: 舊版 csv 交易紀錄，資料表為空時會匯入一次
+        :param batch_size: 累積多少筆數據後才 commit，回測時可調大以減少寫入次數；實單則維持 1
+        """
+        super().__init__(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+        self.csv_path = csv_path
+        self.batch_size = batch_size
+        self.n_pending = 0
+
+        self.getTable(table_name="TRADE_RECORD",
+                      table_definition="""NUMBER INTEGER PRIMARY KEY,
+                      STOCK_ID TEXT NOT NULL,
+                      BUY_TIME TEXT NOT NULL,
+                      SELL_TIME TEXT NOT NULL,
+                      BUY_PRICE TEXT NOT NULL,
+                      SELL_PRICE TEXT NOT NULL,
+                      VOLUMN REAL NOT NULL,
+                      BUY_COST TEXT NOT NULL,
+                      SELL_COST TEXT NOT NULL,
+                      REVENUE TEXT NOT NULL""")
+        # 最後一筆交易紀錄依 NUMBER 決定
+        self.execute("CREATE INDEX IF NOT EXISTS TRADE_RECORD_STOCK_NUMBER ON TRADE_RECORD (STOCK_ID, NUMBER);",
+                     commit=True)
+
+        if self.isTableEmpty(table_name=self.table_name) and os.path.exists(self.csv_path):
+            self.importCsv(path=self.csv_path)
+
+        self.number = self.loadLastNumber()
+
+    def loadLastNumber(self):
+        result = self.execute(f"SELECT MAX(NUMBER) FROM {self.table_name}").fetchone()
+
+        if result is None or result[0] is None:
+            return 0
+
+        return result[0]
+
+    def importCsv(self, path: str):
+        """
+        將 csv 格式的交易紀錄批次匯入資料庫，編號重複的數據會被忽略
+
+        :param path: csv 路徑
+        :return:
+        """
+        values = []
+
+        with open(path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+
+            # 略過標頭
+            next(reader, None)
+
+            for row in reader:
+                if len(row) == 0:
+                    continue
+
+                number, stock_id, buy_time, sell_time, buy_price, sell_price, volumn, buy_cost, sell_cost, \
+                    revenue = row
+
+                # 統一為 %Y-%m-%d，使字串排序即為時間排序
+                buy_time = time_parser(buy_time).strftime("%Y-%m-%d")
+                sell_time = time_parser(sell_time).strftime("%Y-%m-%d")
+                values.append((int(number), stock_id, buy_time, sell_time, buy_price, sell_price, float(volumn),
+                               buy_cost, sell_cost, revenue))
+
+        self.add(values=values)
+        self.commit()
+        self.number = self.loadLastNumber()
+        self.logger.info(f"Import {len(values)} records from {path}", extra=self.extra)
+
+    def exportCsv(self, path: str = None):
+        """
+        將交易紀錄輸出為原有的 csv 格式
+
+        :param path: csv 路徑
+        :return:
+        """
+        if path is None:
+            path = self.csv_path
+
+        self.flush()
+        result = self.select(sort_by="NUMBER")
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            writer.writerows(result.fetchall())
+
+    def append(self, stock_id: str, buy_time: str, sell_time: str, buy_price: str, sell_price: str, volumn,
+               buy_cost: str, sell_cost: str, revenue: str) -> dict:
+        self.number += 1
+        value = (self.number, stock_id, buy_time, sell_time, buy_price, sell_price, volumn,
+                 buy_cost, sell_cost, revenue)
+        self.add(values=[value])
+        self.n_pending += 1
+
+        if self.n_pending >= self.batch_size:
+            self.flush()
+
+        return dict(zip(self.columns, value))
+
+    def flush(self):
+        if self.n_pending > 0:
+            self.commit()
+            self.n_pending = 0
+
+    def getLastBuyTime(self, stock_id: str):
+        """
+        取得 stock_id 最後一筆交易紀錄的買入時間，透過 (STOCK_ID, NUMBER) 索引查詢
+
+        :param stock_id: 股票代碼
+        :return: 買入時間(%Y-%m-%d)，若無該股票的交易紀錄則返回 None
+        """
+        result = self.select(columns=["BUY_TIME"],
+                             where=self.sqlEq("STOCK_ID", f"'{stock_id}'"),
+                             sort_by="NUMBER",
+                             sort_type="DESC",
+                             limit=1).fetchone()
+
+        if result is None:
+            return None
+
+        return result[0]
+
+    def renumber(self):
+        """
+        依原有順序，將編號重新設為 1 ~ N
+
+        :return:
+        """
+        self.flush()
+        rows = self.select(sort_by="NUMBER").fetchall()
+        values = [(number,) + tuple(row[1:]) for number, row in enumerate(rows, start=1)]
+
+        self.execute(f"DELETE FROM {self.table_name};")
+        self.add(values=values)
+        self.commit()
+        self.number = len(values)
+
+
 class LocalTradeRecord:
-    def __init__(self):
+    def __init__(self, batch_size=1):
         self.path = "data/trade_record.csv"
 
         # number, stock_id, buy_time, sell_time, buy_price, sell_price, volumn, buy_cost, sell_cost, revenue
-        self.df = pd.read_csv(self.path,
-                              dtype={0: int, 1: str, 2: str, 3: str, 4: str, 5: str, 6: float, 7: str, 8: str, 9: str})
+        self.journal = TradeJournal(csv_path=self.path, batch_size=batch_size)
 
     # 交易紀錄索引值
     def getLastNumber(self):
-        last_row = list(self.df.iloc[-1])
-
-        return last_row[0]
+        return self.journal.number
 
     def getLastBuyTime(self, stock_id):
-        sub_df = self.df[self.df["stock_id"] == stock_id].copy()
-        sub_df.sort_values(by=["number", "buy_time"], inplace=True)
-        last_buy = list(sub_df.iloc[-1])[2]
+        last_buy = self.journal.getLastBuyTime(stock_id=stock_id)
+
+        if last_buy is None:
+            return None
 
         return time_parser(last_buy)
 
@@ -44,19 +196,15 @@ class LocalTradeRecord:
         :param revenue:
         :return:
         """
-        number = self.getLastNumber() + 1
-        data = {"number": number,
-                "stock_id": stock_id,
-                "buy_time": str(buy_time.date()),
-                "sell_time": str(sell_time.date()),
-                "buy_price": str(buy_price),
-                "sell_price": str(sell_price),
-                "volumn": volumn,
-                "buy_cost": str(buy_cost),
-                "sell_cost": str(sell_cost),
-                "revenue": str(revenue)}
-        self.df = self.df.append(data, ignore_index=True)
-        self.df.to_csv(self.path, index=False)
+        data = self.journal.append(stock_id=stock_id,
+                                   buy_time=str(buy_time.date()),
+                                   sell_time=str(sell_time.date()),
+                                   buy_price=str(buy_price),
+                                   sell_price=str(sell_price),
+                                   volumn=volumn,
+                                   buy_cost=str(buy_cost),
+                                   sell_cost=str(sell_cost),
+                                   revenue=str(revenue))
 
         return data
 
@@ -80,30 +228,34 @@ class LocalTradeRecord:
 
     def recordDividend(self, stock_id: str, revenue: str, pay_time: datetime.datetime = datetime.datetime.today()):
         last_buy = self.getLastBuyTime(stock_id=stock_id)
-        buy_time = last_buy.strftime("%Y-%m-%d")
         sell_time = pay_time.strftime("%Y-%m-%d")
 
-        number = self.getLastNumber() + 1
-        data = {"number": number,
-                "stock_id": stock_id,
-                "buy_time": buy_time,
-                "sell_time": sell_time,
-                "buy_price": "0",
-                "sell_price": "0",
-                "volumn": 0,
-                "buy_cost": "0",
-                "sell_cost": "0",
-                "revenue": revenue}
-        self.df = self.df.append(data, ignore_index=True)
-        self.df.to_csv(self.path, index=False)
+        # 尚無該股票的交易紀錄(例如在開始記錄前買入)，買入時間以發放時間代替
+        if last_buy is None:
+            buy_time = sell_time
+        else:
+            buy_time = last_buy.strftime("%Y-%m-%d")
+
+        data = self.journal.append(stock_id=stock_id,
+                                   buy_time=buy_time,
+                                   sell_time=sell_time,
+                                   buy_price="0",
+                                   sell_price="0",
+                                   volumn=0,
+                                   buy_cost="0",
+                                   sell_cost="0",
+                                   revenue=revenue)
 
         return data
 
     def renumber(self):
-        n_data = len(self.df)
-        numbers = list(range(1, n_data + 1))
-        self.df["number"] = numbers
-        self.df.to_csv(self.path, index=False)
+        self.journal.renumber()
+
+    def save(self):
+        self.journal.flush()
+
+    def exportCsv(self, path: str = None):
+        self.journal.exportCsv(path=path)
 
 
 def sortOperates(operates):
@@ -161,10 +313,18 @@ def sortOperates(operates):
     return sorted(operates, key=functools.cmp_to_key(compareOperates))
 
 
-def evaluateTradingPerformance():
-    path = "data/trade_record.csv"
+def evaluateTradingPerformance(journal: TradeJournal = None):
+    if journal is None:
+        journal = TradeJournal()
+
     # number,stock_id,buy_time,sell_time,buy_price,sell_price,volumn,buy_cost,sell_cost,revenue
-    df = pd.read_csv(path)
+    # 交易紀錄以 TradeJournal 為準，data/trade_record.csv 只有在 exportCsv 時才會更新
+    journal.flush()
+    df = pd.DataFrame(journal.select(sort_by="NUMBER").fetchall(), columns=TradeJournal.columns)
+
+    for column in ("buy_price", "sell_price", "buy_cost", "sell_cost", "revenue"):
+        df[column] = pd.to_numeric(df[column])
+
     df["buy_time"] = pd.to_datetime(df["buy_time"])
     df["sell_time"] = pd.to_datetime(df["sell_time"])
     # print(df)
@@ -224,33 +384,28 @@ def evaluateTradingPerformance():
 
 
 # 交易紀錄索引值
-def getLastNumber():
-    path = "data/trade_record.csv"
+def getLastNumber(journal: TradeJournal = None):
+    if journal is None:
+        journal = TradeJournal()
+
+    return journal.number
 
-    with open(path, "r") as file:
-        for line in file:
-            pass
 
-        content = line.split(",")
-        number = content[0]
-        return int(number)
+def renumber(journal: TradeJournal = None):
+    if journal is None:
+        journal = TradeJournal()
 
+    journal.renumber()
 
-def renumber():
-    path = "data/trade_record.csv"
-    df = pd.read_csv(path,
-                     dtype={0: int, 1: str, 2: str, 3: str, 4: str, 5: str, 6: str, 7: str, 8: str, 9: str})
-    n_data = len(df)
-    numbers = list(range(1, n_data + 1))
-    df["number"] = numbers
 
-    df.to_csv(path, index=False)
+def getLastBuyTime(stock_id, journal: TradeJournal = None):
+    if journal is None:
+        journal = TradeJournal()
 
+    last_buy = journal.getLastBuyTime(stock_id=stock_id)
 
-def getLastBuyTime(df, stock_id):
-    sub_df = df[df["stock_id"] == stock_id].copy()
-    sub_df.sort_values(by=["number", "buy_time"], inplace=True)
-    last_buy = list(sub_df.iloc[-1])[2]
+    if last_buy is None:
+        return None
 
     return time_parser(last_buy)
 
@@ -9,6 +9,7 @@ import utils
 from enums import OrderMode
 from error import StopValueError
 from submodule.Xu3.utils import getLogger
+from utils.checkpoint import getState, setState
 
 
 # total_ordering: 使得我可以只定義 __eq__ 和 __gt__ 就可進行完整的比較
@@ -536,6 +537,15 @@ class OrderList:
                 self.orders = order_list.orders
                 del order_list
 
+    # region 狀態快照
+    def getState(self) -> dict:
+        return getState(self)
+
+    def setState(self, state: dict):
+        setState(self, state)
+
+    # endregion
+
 
 if __name__ == "__main__":
     import utils.globals_variable as gv
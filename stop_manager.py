@@ -0,0 +1,223 @@
+import datetime
+import logging
+from decimal import Decimal
+
+import numpy as np
+
+from enums import OrderMode
+from submodule.Xu3.utils import getLogger
+from submodule.events import Event
+from utils.tick_size import getTickTable
+
+
+class StopManager:
+    """
+    以陣列管理所有持倉的 停損/停利 價格(stop_value)，每根 K 棒以一次向量化運算更新所有持倉，
+    取代 Strategy.checkStopValue -> OrderList.modifyStopValue -> Order.modifyStopValue 逐筆以 Decimal 計算的流程。
+
+    * 移動停損(is_trailing=True): 與 utils.getStopValue(percent) 相同，以 價格 * (1 - percent) 的有效價格作為新的 stop_value，
+      做多只漲不跌，做空只跌不漲(與 Order.modifyStopValue 相同)
+    * 固定停損(is_trailing=False): stop_value 維持建立時的數值
+    * 只有 stop_value 實際改變或觸發的持倉才會觸發事件
+    * stop_value 的變化以 (持倉編號, 時間, 變化量) 紀錄於預先配置的陣列，取代每個 Order 各自增長的 stop_value_moving
+    """
+
+    def __init__(self, capacity: int = 1024,
+                 logger_dir="stop_manager", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        :param capacity: 初始配置的持倉與歷程數量，不足時加倍
+        """
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        # region 持倉(以持倉編號為索引值，編號不會重複使用)
+        self.n_order = 0
+        self.guids = []
+        self.guid_index = dict()
+
+        self.stocks = np.zeros(capacity, dtype=np.int64)
+
+        # 做多: 1, 做空: -1
+        self.directions = np.zeros(capacity, dtype=np.int8)
+        self.stop_values = np.zeros(capacity, dtype=np.float64)
+        self.percents = np.zeros(capacity, dtype=np.float64)
+        self.is_etfs = np.zeros(capacity, dtype=np.bool_)
+        self.is_trailings = np.zeros(capacity, dtype=np.bool_)
+
+        # 尚未售出且未觸發的持倉
+        self.actives = np.zeros(capacity, dtype=np.bool_)
+        # endregion
+
+        # region stop_value 歷程
+        self.n_history = 0
+        self.history_orders = np.zeros(capacity, dtype=np.int64)
+        self.history_times = np.zeros(capacity, dtype="datetime64[m]")
+        self.history_deltas = np.zeros(capacity, dtype=np.float64)
+        # endregion
+
+        # region 事件
+        self.event = Event()
+
+        # stop_value 改變事件
+        # onStopValueModified(guid, time, stop_value)
+        self.onStopValueModified = self.event.onStopValueModified
+
+        # 價格觸及 stop_value 事件
+        # onStopValueTriggered(guid, time, stop_value)
+        self.onStopValueTriggered = self.event.onStopValueTriggered
+        # endregion
+
+    def __len__(self):
+        return int(self.actives[:self.n_order].sum())
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    @staticmethod
+    def grow(array: np.ndarray, size: int) -> np.ndarray:
+        # 容量不足時加倍
+        if size <= len(array):
+            return array
+
+        new_array = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+        new_array[:len(array)] = array
+
+        return new_array
+
+    def add(self, guid: str, stock: int, stop_value: Decimal, order_mode: OrderMode = OrderMode.Long,
+            percent: Decimal = Decimal("0.1"), is_etf=False, is_trailing=True) -> int:
+        """
+        加入新的持倉
+
+        :param guid: Order 的 guid
+        :param stock: 股票索引值(對應 update 時價格陣列的索引值)
+        :param stop_value: 初始 stop_value
+        :param order_mode: 做多 或 做空
+        :param percent: 移動停損的可容忍跌幅
+        :param is_etf: 是否為 ETF
+        :param is_trailing: 是否為移動停損
+        :return: 持倉編號
+        """
+        index = self.n_order
+        self.n_order += 1
+
+        for name in ("stocks", "directions", "stop_values", "percents", "is_etfs", "is_trailings", "actives"):
+            setattr(self, name, self.grow(getattr(self, name), self.n_order))
+
+        self.guids.append(guid)
+        self.guid_index[guid] = index
+        self.stocks[index] = stock
+        self.directions[index] = 1 if order_mode == OrderMode.Long else -1
+        self.stop_values[index] = float(stop_value)
+        self.percents[index] = float(percent)
+        self.is_etfs[index] = is_etf
+        self.is_trailings[index] = is_trailing
+        self.actives[index] = True
+
+        return index
+
+    def remove(self, guid: str):
+        # 持倉售出後不再更新，但保留其 stop_value 歷程
+        self.actives[self.guid_index[guid]] = False
+
+    def getStopValue(self, guid: str) -> Decimal:
+        return Decimal(f"{self.stop_values[self.guid_index[guid]]:.2f}")
+
+    def getStopValueMoving(self, guid: str) -> list:
+        """
+        :param guid: Order 的 guid
+        :return: stop_value 變化量(與 Order.stop_value_moving 相同，供 History 紀錄)
+        """
+        deltas = self.history_deltas[:self.n_history][self.history_orders[:self.n_history] == self.guid_index[guid]]
+
+        return [Decimal(delta) for delta in np.char.mod("%.2f", deltas).tolist()]
+
+    def record(self, date_time: datetime.datetime, indexs: np.ndarray, deltas: np.ndarray):
+        n_record = len(indexs)
+        size = self.n_history + n_record
+
+        for name in ("history_orders", "history_times", "history_deltas"):
+            setattr(self, name, self.grow(getattr(self, name), size))
+
+        self.history_orders[self.n_history:size] = indexs
+        self.history_times[self.n_history:size] = np.datetime64(date_time, "m")
+        self.history_deltas[self.n_history:size] = deltas
+        self.n_history = size
+
+    def computeStopValues(self, indexs: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        # 向量化版本的 utils.getStopValue(price, is_etf, percent): 價格 * (1 -/+ percent) 的有效價格
+        raws = prices * (1.0 - self.directions[indexs] * self.percents[indexs])
+
+        return np.where(self.is_etfs[indexs],
+                        getTickTable(is_etf=True).floorPrices(raws),
+                        getTickTable(is_etf=False).floorPrices(raws))
+
+    def update(self, date_time: datetime.datetime, closes, lows=None, highs=None, floors=None):
+        """
+        每根 K 棒更新所有持倉:
+        1. 觸發檢查: 以更新前的 stop_value 判斷價格是否觸及(做多: 最低價 <= stop_value；做空: 最高價 >= stop_value)
+        2. 移動停損: 未觸發的移動停損持倉，以收盤價計算新的 stop_value
+
+        :param date_time: K 棒時間
+        :param closes: (n_stock, ) 收盤價(沒有數據者為 NaN，該股票的持倉不更新)
+        :param lows: (n_stock, ) 最低價，None 時不檢查做多持倉的觸發
+        :param highs: (n_stock, ) 最高價，None 時不檢查做空持倉的觸發
+        :param floors: (n_stock, ) 各股票的 stop_value 下限(做空為上限)，例如箱型下緣再低一個價格單位，NaN 表示沒有
+        :return: stop_value 改變的持倉編號, 觸發的持倉編號
+        """
+        indexs = np.flatnonzero(self.actives[:self.n_order])
+        stocks = self.stocks[indexs]
+        directions = self.directions[indexs]
+        olds = self.stop_values[indexs]
+
+        # 1. 觸發檢查
+        is_triggered = np.zeros(len(indexs), dtype=np.bool_)
+
+        with np.errstate(invalid="ignore"):
+            if lows is not None:
+                is_triggered |= (directions == 1) & (np.asarray(lows, dtype=np.float64)[stocks] <= olds)
+
+            if highs is not None:
+                is_triggered |= (directions == -1) & (np.asarray(highs, dtype=np.float64)[stocks] >= olds)
+
+        triggered = indexs[is_triggered]
+        self.actives[triggered] = False
+
+        # 2. 移動停損
+        prices = np.asarray(closes, dtype=np.float64)[stocks]
+        news = self.computeStopValues(indexs, np.nan_to_num(prices, nan=0.0))
+
+        if floors is not None:
+            floors = np.asarray(floors, dtype=np.float64)[stocks]
+            news = np.where(np.isnan(floors), news,
+                            np.where(directions == 1, np.maximum(news, floors), np.minimum(news, floors)))
+
+        # 做多只漲不跌，做空只跌不漲；價格以"分"比較，避免浮點數誤差造成的微小變化
+        is_modified = (np.round((news - olds) * 100.0) * directions > 0)
+        is_modified &= self.is_trailings[indexs] & ~is_triggered & ~np.isnan(prices)
+
+        modified = indexs[is_modified]
+        # 與 Order.modifyStopValue 相同，以有利方向為正(做空為 舊 - 新)
+        deltas = (news[is_modified] - olds[is_modified]) * directions[is_modified]
+        self.stop_values[modified] = news[is_modified]
+        self.record(date_time=date_time, indexs=modified, deltas=deltas)
+
+        # 只對有變化的持倉觸發事件
+        for index in modified.tolist():
+            guid = self.guids[index]
+            self.onStopValueModified(guid=guid, time=date_time, stop_value=self.getStopValue(guid))
+
+        for index in triggered.tolist():
+            guid = self.guids[index]
+            self.onStopValueTriggered(guid=guid, time=date_time, stop_value=self.getStopValue(guid))
+
+        self.logger.debug(f"time: {date_time}, #active: {len(indexs)}, #modified: {len(modified)}, "
+                          f"#triggered: {len(triggered)}", extra=self.extra)
+
+        return modified, triggered
@@ -8,7 +8,7 @@ from decimal import Decimal, ROUND_HALF_UP
 import utils
 from data import StockCategory
 from data.container import OhlcContainer
-from data.the_world import TheWorld
+from data.the_world import TheWorld, WorldCalendar, getWorldCalendar
 from enums import OrderMode, OhlcType, ReportType, StrategyMode, PerformanceStage
 from history import History
 from order import OrderList, Order
@@ -16,6 +16,7 @@ from strategy.opportunity import Opportunity
 from submodule.Xu3.utils import getLogger
 from submodule.events import Event
 from utils import globals_variable as gv
+from utils.checkpoint import getState
 from utils.order_request import saveRequests, loadRequests
 
 
@@ -262,11 +263,13 @@ class Strategy(metaclass=ABCMeta):
 
     # 測試模式的事前設定
     @abstractmethod
-    def startTesting(self):
+    def startTesting(self, calendar: WorldCalendar = None):
         """
         TODO: 是否成功買到，由現實世界決定，不使用'請求處理系統'來模擬交易。
         TODO: 根據前面兩階段的調整與測試，以及數據所形成的購買時機，更新庫存的 stop_value。
         TODO: init self.oc
+
+        :param calendar: 多個策略共用的事件日曆(實際成交與除權息)，None 時使用 getWorldCalendar()
         :return:
         """
         self.strategy_mode = StrategyMode.Test
@@ -279,7 +282,10 @@ class Strategy(metaclass=ABCMeta):
         self.history.reset()
 
         # TheWorld: 用於將實際交易情形，鑲嵌至回測當中(是否購買到、多少錢買到都是由 TheWorld 告訴策略)
-        self.the_world = TheWorld(stock_id=self.stock_id, order_list=self.order_list,
+        if calendar is None:
+            calendar = getWorldCalendar()
+
+        self.the_world = TheWorld(stock_id=self.stock_id, order_list=self.order_list, calendar=calendar,
                                   logger_dir=self.logger_dir, logger_name=self.logger_name)
         self.the_world.onTheWorld += self.onTheWorldListener
         self.the_world.onRevise += self.onReviseListener
@@ -894,3 +900,38 @@ class Strategy(metaclass=ABCMeta):
     def display(self, *args):
         self.history.display(*args)
     # endregion
+
+    # region 狀態快照
+    def getState(self) -> dict:
+        """
+        策略的完整狀態，提供 utils.checkpoint.Checkpoint 保存。
+        OhlcContainer, OrderList, History, BoxExplorer 等子物件以各自的 getState 保存；
+        TheWorld 由 startTesting 建立，Opportunity 由 getOpportunity 產生，皆不納入快照。
+
+        :return:
+        """
+        state = getState(self, exclude=("the_world", "opportunity", "onBuy", "onSell", "onAchieveOrderNumberLimit",
+                                        "onNewSellRequests"))
+
+        for key, value in state.items():
+            if hasattr(value, "getState"):
+                state[key] = value.getState()
+
+        return state
+
+    def setState(self, state: dict):
+        """
+        將快照中的狀態寫回此策略，子物件就地還原，原有的事件監聽與物件參照(例如 TheWorld 持有的 OrderList)皆維持不變
+
+        :param state: getState 的結果
+        :return:
+        """
+        for key, value in state.items():
+            current = getattr(self, key, None)
+
+            if hasattr(current, "setState"):
+                current.setState(value)
+            else:
+                setattr(self, key, value)
+
+    # endregion
@@ -4,6 +4,7 @@ import uuid
 import numpy as np
 
 from data.container.box import BoxExplorer
+from data.the_world import WorldCalendar
 from enums import OrderMode, OhlcType
 from strategy import Strategy
 from utils import getValidPrice, getLastValidPrice, getNextValidPrice
@@ -188,8 +189,8 @@ class BoxStrategy(Strategy):
         self.box_explorer.reset()
 
     # 測試模式的事前設定
-    def startTesting(self):
-        super().startTesting()
+    def startTesting(self, calendar: WorldCalendar = None):
+        super().startTesting(calendar=calendar)
 
     # 測試模式結束時固定執行事項
     def endTesting(self):
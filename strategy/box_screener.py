@@ -0,0 +1,275 @@
+import datetime
+import logging
+from decimal import Decimal
+
+import numpy as np
+
+from strategy.day_box import DayBoxStrategy
+from submodule.Xu3.utils import getLogger
+from utils.tick_size import getTickTable
+
+
+class BoxScreener:
+    # 候選箱型表格
+    CANDIDATE_DTYPE = np.dtype([("stock_id", "U16"),
+                                ("n_ohlc", np.int64),
+                                ("spread", np.float64),
+                                ("price_lim", np.float64),
+                                ("x_score", np.float64),
+                                ("y_score", np.float64),
+                                ("transform_score", np.float64),
+                                ("delta_score", np.float64),
+                                ("score", np.float64),
+                                ("vol_ratio", np.float64),
+                                ("is_formed", np.bool_)])
+
+    def __init__(self, n_ohlc: int = 5, threshold: float = 2.0, allowable_percent: Decimal = Decimal("0.1"),
+                 logger_dir="box_screener", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        全市場的箱型篩選: 輸入 (股票, 日) 的 開高低收量 矩陣，一次計算所有股票在某一天的箱型(findBox)與箱型分數(computeBox)，
+        不需為每檔股票建立 DayBoxStrategy 與 BoxExplorer 並逐根 K 棒重播，只有排名在前的股票才建立策略物件。
+
+        計算結果與 DayBoxStrategy(days=1) 收到該日 K 棒時 BoxExplorer.update() 的結果相同:
+        1. 箱型的範圍包含當日 K 棒，但當日的成交量尚未加入(OhlcContainer.newOhlc 時為 0)
+        2. 箱型認定的價格區間(price_lim)由前一日的收盤價決定(updateExplorerData 在 update 之後才執行)
+        3. 歷史平均交易量不含當日
+
+        :param n_ohlc: 箱型形成至少包含多少個 K 棒
+        :param threshold: 箱型分數的閾值
+        :param allowable_percent: 價格可容忍波動幅度
+        """
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        self.n_ohlc = n_ohlc
+        self.threshold = threshold
+        self.allowable_percent = allowable_percent
+
+        # findBox 由 n_ohlc, n_ohlc - 1, ..., 1 依序嘗試增加 K 棒個數，箱型最多包含 n_ohlc * (n_ohlc + 1) / 2 個 K 棒
+        self.max_ohlc = n_ohlc * (n_ohlc + 1) // 2
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    @staticmethod
+    def toCents(values):
+        # 價格轉為以"分"為單位的整數值(以 float64 存放，無數據為 NaN)，比較價差時不受浮點數誤差影響
+        return np.round(np.asarray(values, dtype=np.float64) * 100.0)
+
+    def getPriceLimits(self, closes, is_etfs):
+        """
+        向量化版本的 DayBoxStrategy.updateExplorerData 中的 price_lim:
+        以每一跳金額的 2 倍為單位，將 收盤價 * allowable_percent 無條件進位
+
+        :param closes: 收盤價(元)
+        :param is_etfs: 是否為 ETF
+        :return: 價格區間(分)
+        """
+        closes = np.nan_to_num(closes, nan=0.0)
+        units = np.where(is_etfs,
+                         getTickTable(is_etf=True).unitPrices(closes),
+                         getTickTable(is_etf=False).unitPrices(closes))
+        steps = np.round(units * 200.0)
+
+        # 減去極小值，避免如 20 * 0.1 / 0.1 = 20.000000000000004 被進位成 21
+        ticks = np.ceil(self.toCents(closes) * float(self.allowable_percent) / steps - 1e-9)
+
+        return ticks * steps
+
+    @staticmethod
+    def compact(valid, *arrays):
+        """
+        將各股票有數據的 K 棒依序移至最右側(停牌等無數據的日期不屬於該股票的 K 棒序列)
+
+        :param valid: (n_stock, n_day) 是否有數據
+        :param arrays: (n_stock, n_day) 各項數據
+        :return: 各股票的 K 棒個數, 移動後的各項數據
+        """
+        order = np.argsort(valid, axis=1, kind="stable")
+        n_valids = valid.sum(axis=1)
+
+        return n_valids, [np.take_along_axis(array, order, axis=1) for array in arrays]
+
+    def scan(self, stock_ids: list, opens, highs, lows, closes, volumns, valid=None, is_etfs=None,
+             day_index: int = None) -> np.ndarray:
+        """
+        計算所有股票在 day_index 當天的箱型與分數
+
+        :param stock_ids: 股票代碼
+        :param opens: (n_stock, n_day) 開盤價
+        :param highs: (n_stock, n_day) 最高價
+        :param lows: (n_stock, n_day) 最低價
+        :param closes: (n_stock, n_day) 收盤價
+        :param volumns: (n_stock, n_day) 成交量
+        :param valid: (n_stock, n_day) 是否有數據，None 時以收盤價是否為 NaN 判斷
+        :param is_etfs: (n_stock, ) 是否為 ETF，None 時皆為股票
+        :param day_index: 評估哪一天(時間軸的索引值)，None 為最後一天
+        :return: 找到箱型的股票(CANDIDATE_DTYPE)，依分數由高到低排序
+        """
+        n_stock = len(stock_ids)
+        stop = None if day_index is None or day_index == -1 else day_index + 1
+        opens, highs, lows, closes, volumns = [np.asarray(array)[:, :stop]
+                                               for array in (opens, highs, lows, closes, volumns)]
+
+        if valid is None:
+            valid = ~np.isnan(closes)
+        else:
+            valid = np.asarray(valid, dtype=np.bool_)[:, :stop]
+
+        if is_etfs is None:
+            is_etfs = np.zeros(n_stock, dtype=np.bool_)
+
+        volumns = np.where(valid, volumns, 0).astype(np.float64)
+        n_valids, (opens, highs, lows, closes, volumns) = self.compact(valid, opens, highs, lows, closes, volumns)
+
+        # 由當日往前取 max_ohlc 個 K 棒(反轉後索引值 0 為當日)，不足者補值
+        n_window = self.max_ohlc
+        n_pad = max(0, n_window + 1 - closes.shape[1])
+
+        def window(array, fill):
+            array = np.pad(array, ((0, 0), (n_pad, 0)), constant_values=fill)[:, ::-1][:, :n_window + 1]
+            return np.where(in_stock, array, fill)
+
+        in_stock = np.arange(n_window + 1)[np.newaxis, :] < n_valids[:, np.newaxis]
+        high_cents = window(self.toCents(highs), -np.inf)
+        low_cents = window(self.toCents(lows), np.inf)
+        close_cents = window(self.toCents(closes), 0.0)
+        open_cents = window(self.toCents(opens), 0.0)
+        vols = window(volumns, 0.0)
+
+        # 最近 k 個 K 棒的價差(分)，k 超過 K 棒總數時等同於全部 K 棒的價差(與 OhlcContainer.getSpread 相同)
+        spreads = (np.maximum.accumulate(high_cents[:, :n_window], axis=1) -
+                   np.minimum.accumulate(low_cents[:, :n_window], axis=1))
+
+        # 價格區間由前一日收盤價決定
+        price_lims = self.getPriceLimits(close_cents[:, 1] / 100.0, is_etfs=is_etfs)
+        rows = np.arange(n_stock)
+
+        # findBox: 依序嘗試增加 n_ohlc, n_ohlc - 1, ..., 1 個 K 棒，價差在價格區間內則保留
+        n_ohlcs = np.zeros(n_stock, dtype=np.int64)
+
+        with np.errstate(invalid="ignore"):
+            for offset in range(self.n_ohlc, 0, -1):
+                candidates = n_ohlcs + offset
+                n_ohlcs = np.where(spreads[rows, candidates - 1] <= price_lims, candidates, n_ohlcs)
+
+        # 至少需要 2 個 K 棒才會觸發 onOhlcFormed，K 棒總數也需達到 n_ohlc
+        is_box = (n_valids >= max(2, self.n_ohlc)) & (n_ohlcs >= self.n_ohlc)
+        indexs = np.flatnonzero(is_box)
+        n_box = len(indexs)
+
+        # 箱型實際包含的 K 棒個數(OhlcContainer.getOhlc 取出的個數不超過 K 棒總數)
+        n_ohlcs = np.minimum(n_ohlcs[indexs], n_valids[indexs])
+        in_box = np.arange(n_window)[np.newaxis, :] < n_ohlcs[:, np.newaxis]
+        box_rows = np.arange(n_box)
+        box_spreads = spreads[indexs, n_ohlcs - 1]
+        price_lims = price_lims[indexs]
+        threshold = self.threshold
+
+        # 1. x_score: 持續時間越長越好
+        x_scores = threshold + np.log(n_ohlcs / self.n_ohlc)
+
+        # 2. y_score: 價格波動區間越小越好
+        y_scores = threshold + (box_spreads + price_lims) / price_lims - 1.0
+
+        # 3. transform_score: 收盤價相對於平均數的狀態值轉換次數(以整數計算，與 Decimal 的比較結果相同)
+        box_closes = close_cents[indexs, :n_window]
+        sums = np.where(in_box, box_closes, 0.0).sum(axis=1)
+        signs = np.where(in_box, np.sign(box_closes * n_ohlcs[:, np.newaxis] - sums[:, np.newaxis]), 0.0)
+        n_transforms = ((signs[:, 1:] != signs[:, :-1]) & in_box[:, 1:]).sum(axis=1)
+
+        # 箱型內價格皆相同時，轉換次數以數值個數計算
+        n_transforms = np.where((n_transforms == 0) & (signs[:, 0] == 0), n_ohlcs, n_transforms)
+        transform_scores = threshold * (n_transforms - 1) + 1e-8
+
+        # 4. delta_score: 箱型期間的價格變化率(以整數計算 ROUND_HALF_UP 至小數點後 4 位，與 Ohlc.getDirection 相同)
+        first_opens = open_cents[indexs, n_ohlcs - 1]
+        numerators = np.abs(box_closes[:, 0] - first_opens) * 1e4
+        quotients = np.floor(numerators / first_opens)
+        quotients += 2 * (numerators - quotients * first_opens) >= first_opens
+        deltas = np.sign(box_closes[:, 0] - first_opens) * quotients / 1e4
+        delta_scores = threshold * 2.0 / (1.0 + np.exp(-deltas))
+
+        components = np.stack([x_scores, y_scores, transform_scores, delta_scores], axis=1)
+        scores = np.exp(np.mean(np.log(components), axis=1))
+
+        # 箱型平均交易量 與 歷史平均交易量 的比值(當日成交量尚未加入)
+        box_vols = np.where(in_box[:, 1:], vols[indexs, 1:n_window], 0.0).sum(axis=1)
+        history_vols = (volumns[indexs].sum(axis=1) - vols[indexs, 0]) / (n_valids[indexs] - 1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vol_ratios = box_vols / n_ohlcs / history_vols + 1.0
+
+        table = np.zeros(n_box, dtype=self.CANDIDATE_DTYPE)
+        table["stock_id"] = np.asarray(stock_ids)[indexs]
+        table["n_ohlc"] = n_ohlcs
+        table["spread"] = box_spreads / 100.0
+        table["price_lim"] = price_lims / 100.0
+        table["x_score"] = x_scores
+        table["y_score"] = y_scores
+        table["transform_score"] = transform_scores
+        table["delta_score"] = delta_scores
+        table["score"] = scores
+        table["vol_ratio"] = vol_ratios
+        table["is_formed"] = scores >= threshold
+
+        # 依分數由高到低，分數相同時維持原本的順序
+        table = table[np.lexsort((box_rows, -scores))]
+        self.logger.info(f"#stock: {n_stock}, #box: {n_box}, #formed: {int(table['is_formed'].sum())}",
+                         extra=self.extra)
+
+        return table
+
+    def scanCube(self, cube, is_etfs=None, day_index: int = None) -> np.ndarray:
+        """
+        :param cube: data.loader.market_cube.MarketCube(日 K)
+        :param is_etfs: (n_stock, ) 是否為 ETF
+        :param day_index: 評估哪一天(時間軸的索引值)，None 為最後一天
+        :return:
+        """
+        return self.scan(stock_ids=cube.stock_ids,
+                         opens=cube.open,
+                         highs=cube.high,
+                         lows=cube.low,
+                         closes=cube.close,
+                         volumns=cube.volumn,
+                         valid=cube.valid,
+                         is_etfs=is_etfs,
+                         day_index=day_index)
+
+    def buildStrategys(self, candidates: np.ndarray, n_top: int = None, only_formed: bool = True, volumn: int = 1,
+                       n_order_lim=1, short_term: Decimal = 100,
+                       logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        只為排名在前的股票建立 DayBoxStrategy
+
+        :param candidates: scan 的結果
+        :param n_top: 取前幾名，None 為全部
+        :param only_formed: 是否只取分數超過門檻值(箱型形成)的股票
+        :return: 策略物件
+        """
+        if only_formed:
+            candidates = candidates[candidates["is_formed"]]
+
+        strategys = []
+
+        for stock_id in candidates["stock_id"][:n_top].tolist():
+            strategy = DayBoxStrategy(stock_id=stock_id,
+                                      volumn=volumn,
+                                      allowable_percent=self.allowable_percent,
+                                      n_order_lim=n_order_lim,
+                                      short_term=short_term,
+                                      n_ohlc=self.n_ohlc,
+                                      days=1,
+                                      threshold=self.threshold,
+                                      logger_dir=logger_dir,
+                                      logger_name=logger_name)
+            strategys.append(strategy)
+
+        return strategys
@@ -5,6 +5,7 @@ import numpy as np
 
 from data import StockCategory
 from data.container.box import Box, BoxExplorer
+from data.the_world import WorldCalendar
 from enums import OrderMode, OhlcType, StrategyMode, PerformanceStage
 from strategy import Strategy
 from strategy.opportunity import Opportunity
@@ -231,8 +232,8 @@ class DayBoxStrategy(Strategy):
             self.logger.info(f"({self.stock_id}) 暫無購買時機", extra=self.extra)
 
     # 測試模式的事前設定
-    def startTesting(self):
-        super().startTesting()
+    def startTesting(self, calendar: WorldCalendar = None):
+        super().startTesting(calendar=calendar)
 
     # 測試模式結束時固定執行事項
     def endTesting(self):
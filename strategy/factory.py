@@ -1,108 +1,118 @@
 import datetime
-import json
 from decimal import Decimal
 
-from enums import PerformanceStage
-from strategy.day_box import DayBoxStrategy
+from data.resource.ohlc_data import DayOhlcData, MinuteOhlcData
+from enums import OhlcType
+from strategy.registry import StrategyRegistry
+from strategy.warm_start import WarmStart
+
+# 已訓練策略的註冊表，第一次使用時才建立，之後共用
+registry = None
+
+
+def getRegistry() -> StrategyRegistry:
+    global registry
+
+    if registry is None:
+        registry = StrategyRegistry()
+
+    return registry
 
 
 # TODO: 輸入要建置的策略名稱，避免當一支股票有多支策略時被一起載入，一次一支策略即可
 def buildStrategys(stock_ids, performance_filter=Decimal("1.04"),
                    logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
-    path = "data/trained_strategy.txt"
+    strategy_registry = getRegistry()
     strategys = []
-    trained_stock_ids = []
-    build_funcs = {"DayBoxStrategy": buildDayBoxStrategy}
 
-    with open(path, "r") as f:
-        trained = json.load(f)
+    for stock_id in stock_ids:
+        strategy_names = strategy_registry.getStrategyNames(stock_id=stock_id)
 
-        for stock_id in stock_ids:
-            if not trained.__contains__(stock_id):
-                print(f"({stock_id}) 沒有預訓練的策略")
-                continue
+        if len(strategy_names) == 0:
+            print(f"({stock_id}) 沒有預訓練的策略")
+            continue
 
-            trained_stock_ids.append(stock_id)
-            cls_dict = trained[stock_id]
+        # 一個股票若同時有多支策略，會同時被引入
+        for strategy_name in strategy_names:
+            strategy = strategy_registry.build(strategy_name=strategy_name,
+                                               stock_id=stock_id,
+                                               performance_filter=performance_filter,
+                                               logger_dir=logger_dir,
+                                               logger_name=logger_name)
 
-            # 一個股票若同時有多支策略，會同時被引入
-            for cls, params in cls_dict.items():
-                ignore = False
+            if strategy is not None:
+                strategys.append(strategy)
 
-                # 策略表現過濾器
-                for p in params["performance"]:
-                    if Decimal(p) < performance_filter:
-                        ignore = True
+    return strategys
 
-                if not ignore:
-                    buildFunc = build_funcs[cls]
-                    strategy = buildFunc(stock_id=stock_id,
-                                         params=params,
-                                         logger_dir=logger_dir,
-                                         logger_name=logger_name)
-                    strategys.append(strategy)
 
-    return strategys
+def warmUpStrategys(stock_ids, end_time: datetime.datetime = None, time_budget: float = 60.0,
+                    performance_filter=Decimal("1.04"), warm_start: WarmStart = None,
+                    logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+    """
+    開盤前建立策略，並以前一天收盤後的快照還原狀態，只處理新增的 K 棒；
+    快照不存在或數據、參數改變時完整重建，整體在 time_budget 秒內完成，超出預算的策略當天不交易。
+    處理完成後隨即保存快照，隔天只需處理之後新增的 K 棒。
 
+    :param stock_ids: 股票代碼
+    :param end_time: 讀取到哪個時間點(含)為止的數據，None 為所有數據
+    :param time_budget: 時間預算(秒)，None 表示不限制
+    :param performance_filter: 策略表現過濾器
+    :param warm_start: 可傳入共用的 WarmStart，None 時建立預設的
+    :return: 已就緒的策略, 超出時間預算而未處理的策略
+    """
+    if warm_start is None:
+        warm_start = WarmStart(logger_dir=logger_dir, logger_name=logger_name)
 
-def buildDayBoxStrategy(stock_id: str, params: dict, logger_dir: str, logger_name: str):
-    strategy = DayBoxStrategy(stock_id=stock_id,
-                              volumn=params["volumn"],
-                              allowable_percent=Decimal(params["allowable_percent"]),
-                              n_order_lim=params["n_order_lim"],
-                              short_term=params["short_term"],
-                              n_ohlc=params["n_ohlc"],
-                              days=params["days"],
-                              threshold=params["threshold"],
-                              logger_dir=logger_dir,
-                              logger_name=logger_name)
+    strategys = buildStrategys(stock_ids,
+                               performance_filter=performance_filter,
+                               logger_dir=logger_dir,
+                               logger_name=logger_name)
 
-    performance = [Decimal(p) for p in params["performance"]]
-    strategy.performance[PerformanceStage.Train] = performance
+    # 策略 -> 處理的 K 棒(保存快照時使用，避免重複讀取)
+    bars_dict = dict()
 
-    return strategy
+    def getBars(strategy):
+        if strategy.ohlc_type == OhlcType.Minute:
+            ohlc_data = MinuteOhlcData(stock_id=strategy.stock_id, logger_dir=logger_dir, logger_name=logger_name)
+        else:
+            ohlc_data = DayOhlcData(stock_id=strategy.stock_id, logger_dir=logger_dir, logger_name=logger_name)
 
+        bars_dict[strategy] = WarmStart.loadBars(ohlc_data, end_time=end_time)
 
-def hasTrainedStrategy(strategy_name):
-    path = "data/trained_strategy.txt"
-    trained_stock_ids = []
+        return bars_dict[strategy]
 
-    with open(path, "r") as f:
-        trained = json.load(f)
+    ready, skipped = warm_start.warmUpAll(strategys, getBars=getBars, time_budget=time_budget)
 
-        for stock_id in trained.keys():
-            cls_dict = trained[stock_id]
+    for strategy in ready:
+        warm_start.save(strategy, bars_dict[strategy])
 
-            for cls in cls_dict.keys():
-                if cls == strategy_name:
-                    trained_stock_ids.append(stock_id)
+    return ready, skipped
 
-                    # 每次 break 只會跳出當前迴圈而已
-                    break
 
-    return trained_stock_ids
+def hasTrainedStrategy(strategy_name):
+    return getRegistry().getStockIds(strategy_name=strategy_name)
 
 
 if __name__ == "__main__":
     def checkPerformance(stock_ids):
-        path = "data/trained_strategy.txt"
+        strategy_registry = getRegistry()
+        performances = dict()
 
-        with open(path, "r") as f:
-            trained = json.load(f)
-            performances = dict()
+        for stock_id in stock_ids:
+            strategy_names = strategy_registry.getStrategyNames(stock_id=stock_id)
 
-            for stock_id in stock_ids:
-                if not trained.__contains__(stock_id):
-                    print(f"({stock_id}) 沒有預訓練的策略")
-                    continue
+            if len(strategy_names) == 0:
+                print(f"({stock_id}) 沒有預訓練的策略")
+                continue
 
-                cls_dict = trained[stock_id]
+            # 一個股票若同時有多支策略，會同時被引入
+            for strategy_name in strategy_names:
+                params = strategy_registry.get(strategy_name=strategy_name, stock_id=stock_id)
 
-                # 一個股票若同時有多支策略，會同時被引入
-                for cls, params in cls_dict.items():
-                    # 策略表現過濾器
-                    for p in params["performance"]:
-                        performances[stock_id] = Decimal(p)
+                # 策略表現過濾器
+                for p in params["performance"]:
+                    performances[stock_id] = Decimal(p)
 
         return performances
 
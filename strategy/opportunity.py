@@ -1,5 +1,5 @@
 import datetime
-import functools
+import math
 from collections import OrderedDict
 from decimal import Decimal
 from decimal import ROUND_HALF_UP
@@ -54,50 +54,25 @@ class Opportunity:
 
         self.additional_description = []
 
-    def __eq__(self, other):
-        is_main_performance_equal = self.main_performance == other.main_performance
-
-        # 不同策略間比較，只比較收益表現
-        if self.strategy_name != other.strategy_name:
-            return is_main_performance_equal
-
-        # 相同策略間，可進一步比較子項目的表現，數值高低由各策略定義
-        else:
-            if is_main_performance_equal:
+        # 以 float 快取的排序分數(performances 或 sub_performance 改變時清除)，排序時不需重複以 Decimal 計算幾何平均
+        # stage -> score，None 為所有階段
+        self.stage_scores = dict()
+        self.combined_score = None
 
-                if self.sub_performance is not None:
-                    for key in self.sub_performance.keys():
-                        value = self.sub_performance[key]
-                        other_value = other.sub_performance[key]
-
-                        if value != other_value:
-                            return False
+    def __eq__(self, other):
+        # 與 __gt__ 相同的比較依據(快取的分數)，確保 total_ordering 推導出的 >=、<= 與 __gt__ 一致
+        if self.strategy_name == other.strategy_name and len(self.sub_performance) > 0:
+            return self.getCombinedScore() == other.getCombinedScore()
 
-                return True
-            else:
-                return False
+        return self.getScore() == other.getScore()
 
     def __gt__(self, other):
         # __gt__: 回傳 True 會被放在後面
-        performance = self.main_performance
-        other_performance = other.main_performance
+        # 策略相同，且有子項目表現，比較 主要表現 與 子項目表現 的幾何平均
+        if self.strategy_name == other.strategy_name and len(self.sub_performance) > 0:
+            return self.getCombinedScore() > other.getCombinedScore()
 
-        # 策略相同
-        if self.strategy_name == other.strategy_name:
-
-            # 有 子項目表現
-            if len(self.sub_performance) > 0:
-                n_performance = Decimal("1.0")
-
-                for key in self.sub_performance.keys():
-                    performance *= self.sub_performance[key]
-                    other_performance *= other.sub_performance[key]
-                    n_performance += Decimal("1.0")
-
-                performance = np.power(performance, Decimal("1.0") / n_performance)
-                other_performance = np.power(other_performance, Decimal("1.0") / n_performance)
-
-        return performance > other_performance
+        return self.getScore() > other.getScore()
 
     # TODO: 設計簡易版和完整版的資訊呈現
     def __repr__(self):
@@ -124,11 +99,26 @@ class Opportunity:
         :param filter_value:
         :return:
         """
-        opportunities = sorted(opportunities, reverse=reverse)
-
         opportunities = [opportunity for opportunity in opportunities if opportunity.overall_performance > filter_value]
+        indexs = rankOpportunities(opportunities, keys=Opportunity.getSortKeys(opportunities), reverse=reverse)
+
+        return [opportunities[index] for index in indexs]
+
+    @staticmethod
+    def getSortKeys(opportunities: list) -> list:
+        """
+        與 __gt__ 相同的排序依據: 全部為相同策略時，比較 主要表現 與 子項目表現 的幾何平均；
+        不同策略間只比較主要表現(相同時再以幾何平均區分)
 
-        return opportunities
+        :param opportunities: 購買時機
+        :return: 排序鍵值(優先順序由高到低)
+        """
+        strategy_names = set(opportunity.strategy_name for opportunity in opportunities)
+
+        if len(strategy_names) <= 1:
+            return [Opportunity.getCombinedScore]
+        else:
+            return [Opportunity.getScore, Opportunity.getCombinedScore]
 
     def toString(self, full_version=True):
         if full_version:
@@ -193,6 +183,50 @@ class Opportunity:
 
         return geo_performance, performances
 
+    @staticmethod
+    def geometricScore(values) -> float:
+        """
+        以 float 計算幾何平均(對數平均)，數值中有小於等於 0 者，分數為 0
+
+        :param values: Decimal 或 float 數值
+        :return:
+        """
+        values = [float(value) for value in values]
+
+        if len(values) == 0:
+            return -1.0
+
+        if min(values) <= 0.0:
+            return 0.0
+
+        return math.exp(sum(math.log(value) for value in values) / len(values))
+
+    def getScore(self, stage: PerformanceStage = None) -> float:
+        """
+        getPerformance 的 float 版本，計算結果會被快取
+
+        :param stage: 階段，None 為所有階段
+        :return: 幾何平均，不存在該階段時為 -1
+        """
+        if stage not in self.stage_scores:
+            if stage is None:
+                score = Opportunity.geometricScore(self.getMainPerformances())
+            elif self.performances.__contains__(stage):
+                score = Opportunity.geometricScore(self.performances[stage])
+            else:
+                score = -1.0
+
+            self.stage_scores[stage] = score
+
+        return self.stage_scores[stage]
+
+    def getCombinedScore(self) -> float:
+        # 主要表現 與 各子項目表現 的幾何平均
+        if self.combined_score is None:
+            self.combined_score = Opportunity.geometricScore([self.getScore()] + list(self.sub_performance.values()))
+
+        return self.combined_score
+
     def getMainPerformances(self):
         performances = []
 
@@ -210,6 +244,8 @@ class Opportunity:
             self.performances[key] = []
 
         self.performances[key].append(value)
+        self.stage_scores.clear()
+        self.combined_score = None
 
     def addSubPerformance(self, key: str, value: Decimal):
         """
@@ -221,6 +257,7 @@ class Opportunity:
         """
         # 紀錄子項目表現
         self.sub_performance[key] = value
+        self.combined_score = None
 
         # 至少有一項是 main_performance
         n_performance = Decimal("1.0")
@@ -248,61 +285,60 @@ class Opportunity:
         return self.stock_id, str(self.trigger_price), self.volumn
 
 
-def sortOpportunity(opportunities, is_default=False):
+def rankOpportunities(opportunities: list, keys: list, reverse: bool = True, k: int = None) -> np.ndarray:
     """
-    將請求做排序，排序優先順序為: 價格(越高越前) -> 數量(越少越前) -> 時間(越早越前)
-    XXX_requests -> [guid, stock_id, date_time, price, volumn]
+    各購買時機的排序鍵值只計算一次(float)，再以 np.lexsort 排序；只需要前 k 名時，先以 np.argpartition 篩選。
+    鍵值相同時維持原本的順序。
 
-    :param is_default:
     :param opportunities: 購買時機
+    :param keys: 排序鍵值函式(優先順序由高到低)，例: [Opportunity.getScore]
+    :param reverse: True: 由大到小；False: 由小到大
+    :param k: 只取前 k 名，None 為全部
+    :return: 排序後的索引值
+    """
+    n_opportunity = len(opportunities)
+
+    if n_opportunity == 0 or len(keys) == 0:
+        return np.arange(n_opportunity if k is None else min(k, n_opportunity))
+
+    # (n_key, n_opportunity)，由大到小時取負值
+    sign = -1.0 if reverse else 1.0
+    scores = np.array([[sign * key(opportunity) for opportunity in opportunities] for key in keys], dtype=np.float64)
+    indexs = np.arange(n_opportunity)
+
+    if k is not None and k < n_opportunity:
+        if k <= 0:
+            return indexs[:0]
+
+        # 主要鍵值在前 k 名以內(含與第 k 名相同者)的候選，再做完整排序
+        kth = np.partition(scores[0], k - 1)[k - 1]
+        indexs = np.flatnonzero(scores[0] <= kth)
+
+    # np.lexsort 以最後一列為主要鍵值，最後加入索引值以確保穩定
+    order = np.lexsort((indexs,) + tuple(scores[::-1, indexs]))
+
+    return indexs[order][:k]
+
+
+def sortOpportunity(opportunities, is_default=False, k: int = None):
+    """
+    將購買時機做排序，排序優先順序為: 驗證階段表現(越高越前) -> 短期表現(越高越前)，相同時維持原本的順序
+
+    :param is_default: 是否維持原本的順序
+    :param opportunities: 購買時機
+    :param k: 只取前 k 名，None 為全部
     :return:
     """
+    opportunities = list(opportunities)
 
-    def compareOpportunities(op1: Opportunity, op2: Opportunity):
-        """
-        sorted()也是一個高階函式，它可以接收一個比較函式來實現自定義排序，
-        比較函式的定義是，傳入兩個待比較的元素 x, y，
-        如果 x 應該排在 y 的前面，返回 -1，
-        如果 x 應該排在 y 的後面，返回 1。
-        如果 x 和 y 相等，返回 0。
-
-        def customSort(x, y):
-            if x > y:
-                return -1
-            if x < y:
-                return 1
-            return 0
-
-        print(sorted([2,4,5,7,3], key=functools.cmp_to_key(customSort)))
-        -> [7, 5, 4, 3, 2]
-
-        :param op1: 購買時機 1
-        :param op2: 購買時機 2
-        :return:
-        """
-        if is_default:
-            return 0
-        else:
-            v1, _ = op1.getPerformance(stage=PerformanceStage.Validation)
-            v2, _ = op2.getPerformance(stage=PerformanceStage.Validation)
+    if is_default:
+        return opportunities[:k]
 
-            if v1 > v2:
-                return -1
-            elif v1 < v2:
-                return 1
-            else:
-                s1, _ = op1.getPerformance(stage=PerformanceStage.Short)
-                s2, _ = op2.getPerformance(stage=PerformanceStage.Short)
-
-                if s1 > s2:
-                    return -1
-                elif s1 < s2:
-                    return 1
-                else:
-                    return 0
-
-    # 透過自定義規則函式 compareRequests 來對 requests 來進行排序
-    return sorted(opportunities, key=functools.cmp_to_key(compareOpportunities))
+    keys = [lambda opportunity: opportunity.getScore(stage=PerformanceStage.Validation),
+            lambda opportunity: opportunity.getScore(stage=PerformanceStage.Short)]
+    indexs = rankOpportunities(opportunities, keys=keys, reverse=True, k=k)
+
+    return [opportunities[index] for index in indexs]
 
 
 if __name__ == "__main__":
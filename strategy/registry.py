@@ -0,0 +1,356 @@
+import datetime
+import hashlib
+import json
+import os
+from decimal import Decimal
+
+from data.resource import DataBase
+from enums import PerformanceStage
+from strategy.day_box import DayBoxStrategy
+
+
+class StrategyRegistry(DataBase):
+    def __init__(self, db_name="trained_strategy", json_path="data/trained_strategy.txt",
+                 logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        訓練完成的策略參數，以 (策略名稱, 股票代碼, 版本) 為主鍵存放於 SQLite。
+        建立時一次載入所有參數，之後查詢皆為字典查找(O(1))，不需每次重新讀取並解析整份 json。
+        訓練結果以交易(transaction)一次寫入，寫入失敗時資料庫與快取皆維持原狀。
+
+        :param db_name: 資料庫名稱
+        :param json_path: 舊版 json 檔(stock_id -> 策略名稱 -> 參數)，內容與上次匯入時不同(雜湊值改變)時重新匯入，
+                          參數有改變的策略成為新的版本
+        """
+        super().__init__(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+        self.json_path = json_path
+
+        # 各 json 檔最後一次匯入(或匯出)時的雜湊值
+        self.execute("""CREATE TABLE IF NOT EXISTS JSON_SOURCE (PATH TEXT PRIMARY KEY NOT NULL,
+                     HASH TEXT NOT NULL,
+                     UPDATE_TIME TEXT NOT NULL);""", commit=True)
+
+        self.getTable(table_name="TRAINED_STRATEGY",
+                      table_definition="""STRATEGY TEXT NOT NULL,
+                      STOCK_ID TEXT NOT NULL,
+                      VERSION INTEGER NOT NULL,
+                      PARAMS TEXT NOT NULL,
+                      UPDATE_TIME TEXT NOT NULL,
+                      PRIMARY KEY (STRATEGY, STOCK_ID, VERSION)""")
+
+        # (strategy_name, stock_id, version) -> params
+        self.params = dict()
+
+        # (strategy_name, stock_id) -> 最新版本
+        self.versions = dict()
+
+        # strategy_name -> [stock_id, ...](依加入順序)
+        self.stock_ids = dict()
+
+        self.load()
+        self.syncJson(path=self.json_path)
+
+    # region json
+    @staticmethod
+    def hashFile(path: str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def getJsonHash(self, path: str):
+        result = self.execute(f"SELECT HASH FROM JSON_SOURCE WHERE PATH = '{path}'").fetchone()
+
+        return None if result is None else result[0]
+
+    def setJsonHash(self, path: str, json_hash: str):
+        update_time = datetime.datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+        self.cursor.execute("INSERT OR REPLACE INTO JSON_SOURCE VALUES (?, ?, ?);", (path, json_hash, update_time))
+        self.commit()
+
+    def syncJson(self, path: str = None) -> int:
+        """
+        json 檔的內容與上次匯入(或匯出)時不同時，重新匯入
+
+        :param path: json 路徑
+        :return: 新增的版本數量
+        """
+        if path is None:
+            path = self.json_path
+
+        if not os.path.exists(path):
+            return 0
+
+        json_hash = self.hashFile(path)
+
+        if json_hash == self.getJsonHash(path):
+            return 0
+
+        n_record = self.importJson(path=path)
+        self.setJsonHash(path=path, json_hash=json_hash)
+
+        return n_record
+
+    def importJson(self, path: str) -> int:
+        """
+        匯入 json 檔，只有參數與最新版本不同的策略才會寫入新的版本
+
+        :param path: json 路徑
+        :return: 新增的版本數量
+        """
+        with open(path, "r") as f:
+            trained = json.load(f)
+
+        records = []
+
+        for stock_id, cls_dict in trained.items():
+            for strategy_name, params in cls_dict.items():
+                if self.get(strategy_name=strategy_name, stock_id=stock_id) != params:
+                    records.append((strategy_name, stock_id, params))
+
+        self.update(records=records)
+        self.logger.info(f"Import {len(records)} trained strategys from {path}", extra=self.extra)
+
+        return len(records)
+
+    def exportJson(self, path: str = None):
+        """
+        將各策略的最新版本輸出為舊版 json 格式，先寫入暫存檔再取代原檔，避免讀取到寫到一半的檔案
+
+        :param path: json 路徑
+        :return:
+        """
+        if path is None:
+            path = self.json_path
+
+        trained = dict()
+
+        for (strategy_name, stock_id), version in self.versions.items():
+            if stock_id not in trained:
+                trained[stock_id] = dict()
+
+            trained[stock_id][strategy_name] = self.params[(strategy_name, stock_id, version)]
+
+        temp_path = f"{path}.tmp"
+
+        with open(temp_path, "w") as f:
+            json.dump(trained, f)
+
+        os.replace(temp_path, path)
+
+        # 自己匯出的內容與資料庫一致，不需再匯入
+        self.setJsonHash(path=path, json_hash=self.hashFile(path))
+
+    # endregion
+
+    def load(self):
+        self.params.clear()
+        self.versions.clear()
+        self.stock_ids.clear()
+
+        result = self.select(columns=["STRATEGY", "STOCK_ID", "VERSION", "PARAMS"], sort_by="VERSION")
+
+        for strategy_name, stock_id, version, params in result.fetchall():
+            self.cache(strategy_name=strategy_name, stock_id=stock_id, version=version, params=json.loads(params))
+
+    def cache(self, strategy_name: str, stock_id: str, version: int, params: dict):
+        self.params[(strategy_name, stock_id, version)] = params
+        key = (strategy_name, stock_id)
+
+        if key not in self.versions:
+            if strategy_name not in self.stock_ids:
+                self.stock_ids[strategy_name] = []
+
+            self.stock_ids[strategy_name].append(stock_id)
+            self.versions[key] = version
+        else:
+            self.versions[key] = max(self.versions[key], version)
+
+    # region 查詢
+    def getVersion(self, strategy_name: str, stock_id: str):
+        return self.versions.get((strategy_name, stock_id))
+
+    def get(self, strategy_name: str, stock_id: str, version: int = None):
+        """
+        :param strategy_name: 策略名稱
+        :param stock_id: 股票代碼
+        :param version: 版本，None 為最新版本
+        :return: 策略參數，不存在時為 None
+        """
+        if version is None:
+            version = self.getVersion(strategy_name=strategy_name, stock_id=stock_id)
+
+            if version is None:
+                return None
+
+        return self.params.get((strategy_name, stock_id, version))
+
+    def getStrategyNames(self, stock_id: str):
+        return [strategy_name for strategy_name in self.stock_ids.keys() if (strategy_name, stock_id) in self.versions]
+
+    def getStockIds(self, strategy_name: str):
+        return list(self.stock_ids.get(strategy_name, []))
+
+    def contains(self, strategy_name: str, stock_id: str):
+        return (strategy_name, stock_id) in self.versions
+
+    # endregion
+
+    # region 寫入
+    def update(self, records: list) -> list:
+        """
+        以單一交易寫入多筆訓練結果，每筆皆成為該 (策略名稱, 股票代碼) 的新版本。
+        任何一筆寫入失敗時，整批回滾，快取也不會被修改。
+
+        :param records: [(strategy_name, stock_id, params), ...]
+        :return: 各筆數據的版本
+        """
+        update_time = datetime.datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+        next_versions = dict()
+        values = []
+
+        for strategy_name, stock_id, params in records:
+            key = (strategy_name, stock_id)
+
+            if key not in next_versions:
+                next_versions[key] = self.versions.get(key, 0)
+
+            next_versions[key] += 1
+            values.append((strategy_name, stock_id, next_versions[key], json.dumps(params), update_time))
+
+        # sqlite3 連線作為 context manager 時，成功則 commit，發生例外則 rollback
+        with self.db:
+            self.cursor.executemany(f"INSERT INTO {self.table_name} VALUES (?, ?, ?, ?, ?);", values)
+
+        for strategy_name, stock_id, version, params, _ in values:
+            self.cache(strategy_name=strategy_name, stock_id=stock_id, version=version, params=json.loads(params))
+
+        return [value[2] for value in values]
+
+    def register(self, strategys: list) -> list:
+        """
+        寫入訓練完成的策略(參數由各策略的 saveInfo 提供)
+
+        :param strategys: 策略物件
+        :return: 各策略的版本
+        """
+        records = []
+
+        for strategy in strategys:
+            strategy_name, params = strategy.saveInfo()
+            records.append((strategy_name, strategy.stock_id, params))
+
+        return self.update(records=records)
+
+    # endregion
+
+    # region 建構策略
+    def build(self, strategy_name: str, stock_id: str, version: int = None, performance_filter=Decimal("1.04"),
+              logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        以已訓練的參數建構策略
+
+        :return: 策略物件，沒有參數或表現未達 performance_filter 時為 None
+        """
+        params = self.get(strategy_name=strategy_name, stock_id=stock_id, version=version)
+
+        if params is None:
+            return None
+
+        # 策略表現過濾器
+        for p in params["performance"]:
+            if Decimal(p) < performance_filter:
+                return None
+
+        buildFunc = BUILD_FUNCS[strategy_name]
+
+        return buildFunc(stock_id=stock_id, params=params, logger_dir=logger_dir, logger_name=logger_name)
+
+    def lazyStrategys(self, strategy_name: str, performance_filter=Decimal("1.04"),
+                      logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        return LazyStrategys(registry=self,
+                             strategy_name=strategy_name,
+                             performance_filter=performance_filter,
+                             logger_dir=logger_dir,
+                             logger_name=logger_name)
+
+    # endregion
+
+
+class LazyStrategys:
+    def __init__(self, registry: StrategyRegistry, strategy_name: str, performance_filter=Decimal("1.04"),
+                 logger_dir="strategy", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        延遲建構策略: 只有在股票當天有交易(被查詢)時才建構策略物件，建構後保留，之後直接取用
+
+        :param registry: 已訓練策略的註冊表
+        :param strategy_name: 策略名稱
+        :param performance_filter: 策略表現過濾器
+        """
+        self.registry = registry
+        self.strategy_name = strategy_name
+        self.performance_filter = performance_filter
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+
+        # stock_id -> 策略物件(未通過表現過濾器者為 None)
+        self.strategys = dict()
+
+    def __contains__(self, stock_id):
+        return self.registry.contains(strategy_name=self.strategy_name, stock_id=stock_id)
+
+    def __len__(self):
+        return len(self.strategys)
+
+    def get(self, stock_id: str):
+        if stock_id not in self.strategys:
+            self.strategys[stock_id] = self.registry.build(strategy_name=self.strategy_name,
+                                                           stock_id=stock_id,
+                                                           performance_filter=self.performance_filter,
+                                                           logger_dir=self.logger_dir,
+                                                           logger_name=self.logger_name)
+
+        return self.strategys[stock_id]
+
+    def activate(self, stock_ids):
+        """
+        取得當天有交易的股票的策略，尚未建構者此時才建構
+
+        :param stock_ids: 當天有交易的股票
+        :return: 策略物件
+        """
+        strategys = []
+
+        for stock_id in stock_ids:
+            if stock_id not in self:
+                continue
+
+            strategy = self.get(stock_id=stock_id)
+
+            if strategy is not None:
+                strategys.append(strategy)
+
+        return strategys
+
+    def iterStrategys(self):
+        for strategy in self.strategys.values():
+            if strategy is not None:
+                yield strategy
+
+
+def buildDayBoxStrategy(stock_id: str, params: dict, logger_dir: str, logger_name: str):
+    strategy = DayBoxStrategy(stock_id=stock_id,
+                              volumn=params["volumn"],
+                              allowable_percent=Decimal(params["allowable_percent"]),
+                              n_order_lim=params["n_order_lim"],
+                              short_term=params["short_term"],
+                              n_ohlc=params["n_ohlc"],
+                              days=params["days"],
+                              threshold=params["threshold"],
+                              logger_dir=logger_dir,
+                              logger_name=logger_name)
+
+    performance = [Decimal(p) for p in params["performance"]]
+    strategy.performance[PerformanceStage.Train] = performance
+
+    return strategy
+
+
+BUILD_FUNCS = {"DayBoxStrategy": buildDayBoxStrategy}
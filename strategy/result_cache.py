@@ -0,0 +1,207 @@
+import datetime
+import hashlib
+import inspect
+import json
+import os
+import sys
+import types
+
+from data.resource import DataBase
+
+# 快取格式或無法由原始碼察覺的改變(例如外部數據的處理方式)時手動遞增，使所有快取失效
+CACHE_VERSION = 1
+
+# 專案根目錄，只有此目錄下的模組會被視為策略的相依模組
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ResultCache(DataBase):
+    def __init__(self, db_name="result_cache",
+                 logger_dir="result_cache", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        以內容雜湊值為鍵的訓練結果快取。鍵值由以下內容組成:
+        1. 數據範圍: 各數據表(DAY_XXXX / MINUTE_XXXX)在訓練區間內的筆數與最後一筆的時間
+        2. 策略類別與參數
+        3. 程式版本: 策略類別所在模組，以及其直接或間接引用的專案內模組(BoxExplorer、OhlcContainer、utils 等)的原始碼雜湊值，
+           再加上 CACHE_VERSION
+
+        以上皆未改變時，訓練結果必定相同，因此每晚重新訓練、參數搜尋或產生報告時，可直接取用快取中的結果。
+        """
+        super().__init__(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+
+        self.getTable(table_name="RESULT_CACHE",
+                      table_definition="""KEY TEXT PRIMARY KEY NOT NULL,
+                      STRATEGY TEXT NOT NULL,
+                      STOCK_ID TEXT NOT NULL,
+                      RESULT TEXT NOT NULL,
+                      UPDATE_TIME TEXT NOT NULL""")
+
+        # 原始碼檔案 -> 雜湊值(同一次執行中程式碼不會改變)
+        self.source_hashs = dict()
+
+        self.n_hit = 0
+        self.n_miss = 0
+
+    # region 鍵值
+    @staticmethod
+    def getDataSignature(ohlc_datas: list, start_time: datetime.datetime = None,
+                         end_time: datetime.datetime = None) -> list:
+        """
+        :param ohlc_datas: DayOhlcData / MinuteOhlcData
+        :param start_time: 訓練區間開始時間
+        :param end_time: 訓練區間結束時間
+        :return: [(表格名稱, 筆數, 最後一筆的時間), ...]
+        """
+        signature = []
+
+        for ohlc_data in ohlc_datas:
+            # 與 selectTimeFliter 相同的時間範圍
+            where = DataBase.sqlTimeRange(table_name=ohlc_data.table_name, start_time=start_time, end_time=end_time)
+            sql = f"SELECT COUNT(*), MAX(TIME) FROM {ohlc_data.table_name}"
+
+            if where is not None:
+                sql += f" WHERE {where}"
+
+            n_data, last_time = ohlc_data.execute(sql).fetchone()
+            signature.append((ohlc_data.table_name, n_data, last_time))
+
+        return signature
+
+    @staticmethod
+    def getDependencies(cls) -> list:
+        """
+        策略類別(及其父類別)所在的模組，以及這些模組直接或間接引用的專案內模組
+
+        :param cls: 策略類別
+        :return: 原始碼路徑(已排序)
+        """
+        modules = [sys.modules.get(base.__module__) for base in inspect.getmro(cls)]
+        visited = set()
+        paths = set()
+
+        while len(modules) > 0:
+            module = modules.pop()
+
+            if module is None or module.__name__ in visited:
+                continue
+
+            visited.add(module.__name__)
+            path = getattr(module, "__file__", None)
+
+            # 內建模組或專案外(標準函式庫、第三方套件)的模組
+            if path is None or not os.path.abspath(path).startswith(ROOT_DIR + os.sep):
+                continue
+
+            paths.add(os.path.abspath(path))
+
+            # 模組中引用的模組，以及引用的類別、函式所在的模組
+            for key, value in vars(module).items():
+                if isinstance(value, types.ModuleType):
+                    # 套件被 import 的子模組會自動成為套件的屬性，與是否相依無關(且隨 import 順序而不同)，因此略過
+                    if value.__name__ != f"{module.__name__}.{key}":
+                        modules.append(value)
+                elif isinstance(getattr(value, "__module__", None), str):
+                    modules.append(sys.modules.get(value.__module__))
+
+        return sorted(paths)
+
+    def getCodeVersion(self, cls) -> str:
+        """
+        策略所相依的原始碼雜湊值，修改策略邏輯，或其使用的箱型、K 棒容器、價格工具等模組後，快取自動失效
+
+        :param cls: 策略類別
+        :return:
+        """
+        digest = hashlib.sha1(str(CACHE_VERSION).encode("utf-8"))
+
+        for path in self.getDependencies(cls):
+            if path not in self.source_hashs:
+                with open(path, "rb") as f:
+                    self.source_hashs[path] = hashlib.sha1(f.read()).hexdigest()
+
+            digest.update(path[len(ROOT_DIR):].encode("utf-8"))
+            digest.update(self.source_hashs[path].encode("utf-8"))
+
+        return digest.hexdigest()
+
+    def makeKey(self, cls, stock_id: str, params: dict, data_signature: list) -> str:
+        """
+        :param cls: 策略類別
+        :param stock_id: 股票代碼
+        :param params: 訓練前的策略參數
+        :param data_signature: getDataSignature 的結果
+        :return: 快取鍵值
+        """
+        content = json.dumps([cls.__name__, stock_id, params, data_signature, self.getCodeVersion(cls)],
+                             sort_keys=True, default=str)
+
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    # endregion
+
+    def get(self, key: str):
+        result = self.select(columns=["RESULT"], where=self.sqlEq("KEY", f"'{key}'")).fetchone()
+
+        if result is None:
+            self.n_miss += 1
+            return None
+
+        self.n_hit += 1
+
+        return json.loads(result[0])
+
+    def put(self, key: str, strategy_name: str, stock_id: str, result: dict):
+        update_time = datetime.datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+        self.cursor.execute(f"INSERT OR REPLACE INTO {self.table_name} VALUES (?, ?, ?, ?, ?);",
+                            (key, strategy_name, stock_id, json.dumps(result, default=str), update_time))
+        self.commit()
+
+    def getOrCompute(self, key: str, strategy_name: str, stock_id: str, compute):
+        """
+        快取中已有結果時直接返回，否則執行 compute() 並將結果存入快取
+
+        :param key: makeKey 的結果
+        :param strategy_name: 策略名稱
+        :param stock_id: 股票代碼
+        :param compute: 無參數函式，返回可序列化為 json 的結果(例如 Strategy.saveInfo() 的參數與各階段表現)
+        :return: 結果, 是否來自快取
+        """
+        result = self.get(key=key)
+
+        if result is not None:
+            self.logger.debug(f"({stock_id}) Cache hit: {strategy_name}", extra=self.extra)
+            return result, True
+
+        result = compute()
+        self.put(key=key, strategy_name=strategy_name, stock_id=stock_id, result=result)
+
+        return result, False
+
+    def train(self, strategy, params: dict, ohlc_datas: list, trainFunc,
+              start_time: datetime.datetime = None, end_time: datetime.datetime = None):
+        """
+        訓練單一策略，數據、參數與程式碼皆未改變時略過訓練，直接返回上次的結果
+
+        :param strategy: 剛建立的策略
+        :param params: 建立策略所使用的參數(作為鍵值的一部分)
+        :param ohlc_datas: 訓練所使用的數據表
+        :param trainFunc: trainFunc(strategy)，執行訓練/驗證流程
+        :param start_time: 訓練區間開始時間
+        :param end_time: 訓練區間結束時間
+        :return: {"params": 訓練後的參數(saveInfo), "performance": 各階段表現}, 是否來自快取
+        """
+        data_signature = self.getDataSignature(ohlc_datas=ohlc_datas, start_time=start_time, end_time=end_time)
+        key = self.makeKey(cls=strategy.__class__, stock_id=strategy.stock_id, params=params,
+                           data_signature=data_signature)
+
+        def compute():
+            trainFunc(strategy)
+            _, trained_params = strategy.saveInfo()
+            performance = {str(stage): [str(p) for p in values] for stage, values in strategy.performance.items()}
+
+            return {"params": trained_params, "performance": performance}
+
+        return self.getOrCompute(key=key,
+                                 strategy_name=strategy.__class__.__name__,
+                                 stock_id=strategy.stock_id,
+                                 compute=compute)
@@ -0,0 +1,256 @@
+import datetime
+import hashlib
+import json
+import logging
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from data import parseOhlcBatch
+from submodule.Xu3.utils import getLogger
+from utils.checkpoint import CHECKPOINT_VERSION, Checkpoint
+from utils.time_codec import parseDateTime
+
+
+class WarmStart:
+    def __init__(self, name="live", directory="data/checkpoint",
+                 logger_dir="warm_start", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        實盤每日的增量執行: 收盤後保存各股票策略的狀態，以及已處理的 K 棒的內容雜湊值；
+        隔天開盤前只需還原狀態並處理新增的 K 棒，不需從頭重播所有歷史數據。
+        策略參數或已處理過的數據有所改變時(雜湊值不同)，自動退回完整重建。
+
+        :param name: 快照名稱，各股票的策略存放於 {directory}/{name}/{策略名稱}_{股票代碼}
+        :param directory: 快照根目錄
+        """
+        self.name = name
+        self.directory = directory
+
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+        # 策略 key -> Checkpoint
+        self.checkpoints = dict()
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    def getCheckpoint(self, strategy) -> Checkpoint:
+        key = Checkpoint.getStrategyKey(strategy)
+
+        if key not in self.checkpoints:
+            self.checkpoints[key] = Checkpoint(name=f"{self.name}/{key}",
+                                               directory=self.directory,
+                                               logger_dir=self.logger_dir,
+                                               logger_name=self.logger_name)
+
+        return self.checkpoints[key]
+
+    # region 雜湊值
+    @staticmethod
+    def hashParams(strategy) -> str:
+        # 策略參數(含訓練結果)與快照格式版本
+        info = strategy.saveInfo()
+
+        # 未實作 saveInfo 的策略(基底類別返回 None)，只能以策略名稱區分，參數改變時不會自動完整重建
+        if info is None:
+            strategy_name, params = strategy.__class__.__name__, None
+        else:
+            strategy_name, params = info
+
+        content = json.dumps([CHECKPOINT_VERSION, strategy_name, params], sort_keys=True, default=str)
+
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hashBars(bars) -> str:
+        return hashlib.sha1(np.ascontiguousarray(bars).tobytes()).hexdigest()
+
+    # endregion
+
+    @staticmethod
+    def loadBars(ohlc_data, end_time: datetime.datetime = None):
+        """
+        由 DayOhlcData / MinuteOhlcData 讀取 K 棒，並轉為結構化陣列(data.OHLC_DTYPE)
+
+        :param ohlc_data: DayOhlcData 或 MinuteOhlcData
+        :param end_time: 讀取到哪個時間點(含)為止
+        :return:
+        """
+        results = ohlc_data.selectTimeFliter(sort_by="TIME", sort_type="ASC", end_time=end_time)
+        lines = [", ".join(str(value) for value in result) for result in results.fetchall()]
+
+        return parseOhlcBatch(lines)
+
+    @staticmethod
+    def replay(strategy, bars):
+        """
+        將 K 棒依序輸入策略(與回測時由 Quote 推送的數據相同)
+
+        :param strategy: 策略
+        :param bars: 結構化陣列(data.OHLC_DTYPE)
+        :return:
+        """
+        times = np.datetime_as_string(bars["time"], unit="m")
+        values = zip(times.tolist(),
+                     np.char.mod("%.6f", bars["open"]).tolist(),
+                     np.char.mod("%.6f", bars["high"]).tolist(),
+                     np.char.mod("%.6f", bars["low"]).tolist(),
+                     np.char.mod("%.6f", bars["close"]).tolist(),
+                     bars["volumn"].tolist())
+
+        for date_time, open_value, high_value, low_value, close_value, volumn in values:
+            # 2020-07-06T00:00 -> 2020/07/06 00:00
+            date_time = parseDateTime(date_time.replace("-", "/").replace("T", " "))
+            strategy.onOhlcNotifyListener(date_time, Decimal(open_value), Decimal(high_value), Decimal(low_value),
+                                          Decimal(close_value), volumn)
+
+    @staticmethod
+    def getHistoryData(bars) -> dict:
+        """
+        實盤重建策略時，透過 setHistoryData 輸入的歷史數據
+
+        :param bars: 結構化陣列(data.OHLC_DTYPE)
+        :return:
+        """
+        return {"high": Decimal("%.6f" % bars["high"].max()),
+                "low": Decimal("%.6f" % bars["low"].min()),
+                "volumns": bars["volumn"].tolist()}
+
+    @classmethod
+    def isHistoryConsistent(cls, state: dict, bars) -> bool:
+        """
+        快照中 BoxExplorer 的歷史數據(逐根 K 棒透過 updateExplorerData 更新而來)，
+        應與實盤以 setHistoryData 一次輸入 bars 所重建的結果相同
+
+        :param state: Strategy.getState 的結果
+        :param bars: 快照已處理的 K 棒
+        :return: 是否一致，沒有 BoxExplorer 的策略視為一致
+        """
+        box_explorer = state.get("box_explorer")
+
+        if box_explorer is None or len(bars) == 0:
+            return True
+
+        history = cls.getHistoryData(bars)
+
+        return (box_explorer["history_high"] == history["high"] and
+                box_explorer["history_low"] == history["low"] and
+                box_explorer["n_volumn"] == len(history["volumns"]) and
+                np.isclose(float(box_explorer["history_vol"]), np.mean(history["volumns"])))
+
+    def restore(self, strategy, bars):
+        """
+        若快照存在，且策略參數與已處理過的 K 棒皆未改變，將快照中的狀態寫回策略
+
+        :param strategy: 剛建立(尚未輸入任何數據)的策略
+        :param bars: 該股票到目前為止的所有 K 棒(結構化陣列，已依時間排序)
+        :return: 快照已處理的 K 棒數量，無法使用快照時為 None
+        """
+        _, states = self.getCheckpoint(strategy).load()
+
+        if states is None:
+            return None
+
+        n_bar = states["n_bar"]
+
+        if states["params_hash"] != self.hashParams(strategy):
+            self.logger.info(f"({strategy.stock_id}) 策略參數改變，需完整重建", extra=self.extra)
+            return None
+
+        if n_bar > len(bars) or states["data_hash"] != self.hashBars(bars[:n_bar]):
+            self.logger.info(f"({strategy.stock_id}) 歷史數據改變，需完整重建", extra=self.extra)
+            return None
+
+        if not self.isHistoryConsistent(states["strategy"], bars[:n_bar]):
+            self.logger.warning(f"({strategy.stock_id}) 快照與 setHistoryData 的重建結果不一致，需完整重建",
+                                extra=self.extra)
+            return None
+
+        strategy.setState(states["strategy"])
+
+        return n_bar
+
+    def warmUp(self, strategy, bars) -> bool:
+        """
+        以快照還原策略狀態，並只處理快照之後新增的 K 棒；快照不存在或不一致時，將所有 K 棒重新輸入。
+
+        :param strategy: 剛建立(尚未輸入任何數據)的策略
+        :param bars: 該股票到目前為止的所有 K 棒(結構化陣列，已依時間排序)
+        :return: 是否為增量執行(False 表示完整重建)
+        """
+        n_bar = self.restore(strategy, bars)
+        is_warm = n_bar is not None
+
+        if is_warm:
+            bars = bars[n_bar:]
+
+        self.replay(strategy, bars)
+        self.logger.debug(f"({strategy.stock_id}) is_warm: {is_warm}, #bar: {len(bars)}", extra=self.extra)
+
+        return is_warm
+
+    def save(self, strategy, bars):
+        """
+        收盤後保存策略狀態
+
+        :param strategy: 策略
+        :param bars: 策略到目前為止處理過的所有 K 棒
+        :return:
+        """
+        if len(bars) == 0:
+            return
+
+        states = {"strategy": strategy.getState(),
+                  "n_bar": len(bars),
+                  "data_hash": self.hashBars(bars),
+                  "params_hash": self.hashParams(strategy)}
+        checkpoint = self.getCheckpoint(strategy)
+        checkpoint.save(time=bars["time"][-1].astype(datetime.datetime), states=states)
+
+    def warmUpAll(self, strategys: list, getBars, time_budget: float = None):
+        """
+        開盤前還原所有策略。可增量執行的策略先處理(成本只和新增的 K 棒數量有關)，
+        需要完整重建的策略在剩餘的時間預算內處理，超出預算者不處理，交由呼叫者決定(例如當天不交易該股票)。
+
+        :param strategys: 剛建立的策略
+        :param getBars: getBars(strategy) -> 該策略的股票到目前為止的所有 K 棒
+        :param time_budget: 時間預算(秒)，None 表示不限制
+        :return: 已就緒的策略, 超出時間預算而未處理的策略
+        """
+        start = time.perf_counter()
+        ready = []
+        rebuilds = []
+
+        for strategy in strategys:
+            bars = getBars(strategy)
+            n_bar = self.restore(strategy, bars)
+
+            # 快照可用時立即處理，否則延後至最後
+            if n_bar is None:
+                rebuilds.append((strategy, bars))
+            else:
+                self.replay(strategy, bars[n_bar:])
+                ready.append(strategy)
+
+        skipped = []
+
+        for strategy, bars in rebuilds:
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                skipped.append(strategy)
+                continue
+
+            self.replay(strategy, bars)
+            ready.append(strategy)
+
+        self.logger.info(f"#warm: {len(strategys) - len(rebuilds)}, #rebuild: {len(rebuilds) - len(skipped)}, "
+                         f"#skipped: {len(skipped)}, cost: {time.perf_counter() - start:.2f}s", extra=self.extra)
+
+        return ready, skipped
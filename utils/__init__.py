@@ -1,9 +1,9 @@
 from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR
 
-import numpy as np
 from scipy.stats import truncnorm
 
 import utils.globals_variable as gv
+from utils.tick_size import getTickTable
 
 """
 EPS: 稅後淨利 / 股數
@@ -17,44 +17,18 @@ ROE(Return of equity): 稅後淨利 / 淨值(股東權益)
 
 
 def unitPrice(price, is_etf=False) -> Decimal:
-    if is_etf:
-        # 每受益權單位市價未滿 50 元者為 1 分；50 元以上為 5 分
-        # https://www.twse.com.tw/zh/ETF/fund/0050
-        if price < Decimal("50.0"):
-            return Decimal("0.01")
-        else:
-            return Decimal("0.05")
-    else:
-        if price < Decimal("10.0"):
-            return Decimal("0.01")
-        elif price < Decimal("50.0"):
-            return Decimal("0.05")
-        elif price < Decimal("100.0"):
-            return Decimal("0.1")
-        elif price < Decimal("500.0"):
-            return Decimal("0.5")
-        elif price < Decimal("1000.0"):
-            return Decimal("1.0")
-        else:
-            return Decimal("5.0")
-
+    """
+    股票: 未滿 10 元 0.01；10 ~ 50 元 0.05；50 ~ 100 元 0.1；100 ~ 500 元 0.5；500 ~ 1000 元 1；1000 元以上 5
+    ETF: 每受益權單位市價未滿 50 元者為 1 分；50 元以上為 5 分
+    https://www.twse.com.tw/zh/ETF/fund/0050
 
-def unitPrices(prices, is_etf=False):
-    if is_etf:
-        # 每受益權單位市價未滿 50 元者為 1 分；50 元以上為 5 分
-        # https://www.twse.com.tw/zh/ETF/fund/0050
-        unit_prices = np.ones_like(prices) * 0.05
-        unit_prices[np.where(prices < 50.0)] = 0.01
+    級距定義於 utils.tick_size，此處為單筆查詢
+    """
+    return getTickTable(is_etf=is_etf).unitPrice(price)
 
-    else:
-        unit_prices = np.ones_like(prices) * 5.0
-        unit_prices[np.where(prices < 1000.0)] = 1.0
-        unit_prices[np.where(prices < 500.0)] = 0.5
-        unit_prices[np.where(prices < 100.0)] = 0.1
-        unit_prices[np.where(prices < 50.0)] = 0.05
-        unit_prices[np.where(prices < 10.0)] = 0.01
 
-    return unit_prices
+def unitPrices(prices, is_etf=False):
+    return getTickTable(is_etf=is_etf).unitPrices(prices)
 
 
 def getValidPrice(price: Decimal, is_etf=False) -> Decimal:
@@ -69,9 +43,7 @@ def getValidPrice(price: Decimal, is_etf=False) -> Decimal:
     :param is_etf: 是否為 ETF
     :return: 符合價格跳動單位的價格
     """
-    unit_price = unitPrice(price, is_etf=is_etf)
-    unit = price // unit_price
-    return (unit_price * unit).quantize(Decimal('.00'), ROUND_HALF_UP)
+    return getTickTable(is_etf=is_etf).validPrice(price)
 
 
 def getLastValidPrice(price, is_etf=False) -> Decimal:
@@ -84,20 +56,13 @@ def getNextValidPrice(price, is_etf=False) -> Decimal:
 
 def getValidPrices(prices, is_etf=False):
     """
-    當價格在變動時可能跨過價格單位的級距，或由外部添加價格到原始價格上，外部添加的數值不一定會符合價格跳動單位，
-    透過此函式，可先:
-    1.找出計算完的數值所在級距
-    2.計算該數值為價格跳動單位多少倍(倍數須為整數)
-    3.根據倍數和價格跳動單位，計算有效的價格
+    向量化版本的 getValidPrice，在整數 tick 上計算，不會因浮點數誤差而少算一個升降單位
 
     :param prices: 在外部計算後的價格(未考慮各級距的價格跳動單位)
     :param is_etf: 是否為 ETF
     :return: 符合價格跳動單位的價格
     """
-    unit_prices = unitPrices(prices, is_etf=is_etf)
-    unit = (prices * 100) / (unit_prices * 100)
-    unit = unit.astype(np.int)
-    return unit_prices * unit
+    return getTickTable(is_etf=is_etf).floorPrices(prices)
 
 
 def alphaCost(price: Decimal, discount: Decimal, volumn=1) -> Decimal:
@@ -0,0 +1,207 @@
+import datetime
+import logging
+import os
+import pickle
+
+from submodule.Xu3.utils import getLogger
+
+"""
+回測引擎的狀態快照: 各物件以 getState() 提供"可序列化的狀態"(不含 logger、事件與監聽器等執行環境)，
+並以 setState(state) 將狀態寫回"已建立好的物件"，因此事件的連結與物件之間的參照(例如 TheWorld 持有的 OrderList)都會保留。
+快照以 pickle 一次寫出整個字典，多個物件共用的參照(例如 DayBoxStrategy.box 與 BoxExplorer.boxes 中的同一個 Box)在還原後仍為同一物件。
+"""
+
+# 快照格式版本，狀態內容的結構改變時遞增，讀取到不同版本的快照時會拋出 ValueError
+CHECKPOINT_VERSION = 1
+
+# 各類別共通的執行環境屬性
+TRANSIENT_KEYS = ("logger", "event")
+
+
+def getState(obj, exclude=()) -> dict:
+    """
+    取得物件屬性的淺層複製，排除執行環境相關的屬性
+
+    :param obj: 物件
+    :param exclude: 額外排除的屬性名稱(例如事件 onOhlcFormed，或另外處理的子物件)
+    :return:
+    """
+    return {key: value for key, value in obj.__dict__.items() if key not in TRANSIENT_KEYS and key not in exclude}
+
+
+def setState(obj, state: dict):
+    obj.__dict__.update(state)
+
+
+class Checkpoint:
+    # Brokerage 狀態在快照中的名稱(策略的名稱為 類別名稱_股票代碼，不會與之重複)
+    BROKERAGE_KEY = "Brokerage"
+
+    def __init__(self, name: str, directory="data/checkpoint",
+                 logger_dir="checkpoint", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        以時間戳記管理的狀態快照，例如訓練結束時保存，驗證與測試便可從該時間點繼續，不需從頭重播歷史數據；
+        長時間的執行中途中斷時，也可從最近一次的快照恢復。
+
+        :param name: 快照名稱(例如執行的批次名稱)，同名快照存放於同一資料夾
+        :param directory: 快照根目錄
+        """
+        self.name = name
+        self.directory = os.path.join(directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.logger_dir = logger_dir
+        self.logger_name = logger_name
+        self.extra = {"className": self.__class__.__name__}
+        self.logger = getLogger(logger_name=self.logger_name,
+                                to_file=True,
+                                time_file=False,
+                                file_dir=self.logger_dir,
+                                instance=True)
+
+    def setLoggerLevel(self, level: logging):
+        self.logger.setLevel(level)
+
+    def getPath(self, time: datetime.datetime):
+        return os.path.join(self.directory, f"{time.strftime('%Y%m%d_%H%M%S')}.pickle")
+
+    def listTimes(self):
+        """
+        :return: 所有快照的時間(由舊到新)
+        """
+        times = []
+
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".pickle"):
+                times.append(datetime.datetime.strptime(file_name[:-len(".pickle")], "%Y%m%d_%H%M%S"))
+
+        return sorted(times)
+
+    def save(self, time: datetime.datetime, states: dict):
+        """
+        先寫入暫存檔再取代，執行中斷時不會留下寫到一半的快照
+
+        :param time: 快照所代表的時間點(數據處理到哪個時間)
+        :param states: 名稱 -> 狀態
+        :return: 快照路徑
+        """
+        path = self.getPath(time=time)
+        temp_path = f"{path}.tmp"
+        checkpoint = {"version": CHECKPOINT_VERSION,
+                      "time": time,
+                      "created": datetime.datetime.now(),
+                      "states": states}
+
+        with open(temp_path, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, path)
+        self.logger.info(f"Save checkpoint({self.name}) at {time}, #state: {len(states)}", extra=self.extra)
+
+        return path
+
+    def load(self, time: datetime.datetime = None):
+        """
+        讀取 time(含)之前最近的快照
+
+        :param time: 時間點，None 為最新的快照
+        :return: 快照時間, 名稱 -> 狀態；沒有符合的快照時為 None, None
+        """
+        times = self.listTimes()
+
+        if time is not None:
+            times = [t for t in times if t <= time]
+
+        if len(times) == 0:
+            return None, None
+
+        with open(self.getPath(time=times[-1]), "rb") as f:
+            checkpoint = pickle.load(f)
+
+        if checkpoint["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint version {checkpoint['version']} is not supported "
+                             f"(current version: {CHECKPOINT_VERSION})")
+
+        self.logger.info(f"Load checkpoint({self.name}) at {checkpoint['time']}", extra=self.extra)
+
+        return checkpoint["time"], checkpoint["states"]
+
+    @staticmethod
+    def getStrategyKey(strategy):
+        return f"{strategy.__class__.__name__}_{strategy.stock_id}"
+
+    def saveStrategys(self, time: datetime.datetime, strategys: list, brokerage=None):
+        """
+        保存策略的狀態，有提供 brokerage 時一併保存其委託簿與重播進度，還原後可由 Brokerage.resume 接續播放
+
+        :param time: 快照所代表的時間點
+        :param strategys: 策略物件
+        :param brokerage: 回測所使用的 Brokerage
+        :return: 快照路徑
+        """
+        states = {self.getStrategyKey(strategy): strategy.getState() for strategy in strategys}
+
+        if brokerage is not None:
+            states[self.BROKERAGE_KEY] = brokerage.getState()
+
+        return self.save(time=time, states=states)
+
+    def restoreStrategys(self, strategys: list, time: datetime.datetime = None, brokerage=None):
+        """
+        將快照中的狀態寫回已建立的策略物件，快照中沒有的策略維持原狀
+
+        :param strategys: 策略物件
+        :param time: 時間點，None 為最新的快照
+        :param brokerage: 有提供且快照中含有 Brokerage 狀態時，一併還原
+        :return: 快照時間(沒有快照時為 None), 還原的策略
+        """
+        checkpoint_time, states = self.load(time=time)
+        restored = []
+
+        if states is None:
+            return None, restored
+
+        for strategy in strategys:
+            key = self.getStrategyKey(strategy)
+
+            if key in states:
+                strategy.setState(states[key])
+                restored.append(strategy)
+
+        if brokerage is not None and self.BROKERAGE_KEY in states:
+            brokerage.setState(states[self.BROKERAGE_KEY])
+
+        return checkpoint_time, restored
+
+
+if __name__ == "__main__":
+    from decimal import Decimal
+    import shutil
+    import tempfile
+
+    from strategy.day_box import DayBoxStrategy
+
+    # 有交易紀錄的策略(590 買入、600 賣出一張): 保存後再還原至新建立的策略，交易紀錄應完全相同
+    strategy = DayBoxStrategy(stock_id="2330")
+    strategy.history.add(("guid_0", datetime.datetime(2021, 3, 24, 9, 0), Decimal("590"), 1,
+                          datetime.datetime(2021, 3, 26, 13, 30), Decimal("600"), 1,
+                          Decimal("600000"), Decimal("590841"), Decimal("2641"), [Decimal("5")]))
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        checkpoint = Checkpoint(name="round_trip", directory=directory)
+        checkpoint.saveStrategys(time=datetime.datetime(2021, 3, 26, 13, 30), strategys=[strategy])
+
+        restored_strategy = DayBoxStrategy(stock_id="2330")
+        checkpoint_time, restored = checkpoint.restoreStrategys(strategys=[restored_strategy])
+
+        assert checkpoint_time == datetime.datetime(2021, 3, 26, 13, 30)
+        assert restored == [restored_strategy]
+
+        record = restored_strategy.history.getTradeRecord(guid="guid_0")
+        assert record.record == strategy.history.getTradeRecord(guid="guid_0").record
+        assert record.income == strategy.history.getTradeRecord(guid="guid_0").income
+        print(restored_strategy.history)
+    finally:
+        shutil.rmtree(directory)
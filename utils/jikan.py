@@ -3,8 +3,11 @@ import datetime
 import time
 from functools import total_ordering
 
+import numpy as np
 from dateutil.parser import parse
 
+from data.resource import DataBase
+
 """
 datetime
 struct_date: 還包含"一周的第幾日"、"一年的第幾日"、、、等，應可額外添加是否為交易日等資訊
@@ -520,6 +523,260 @@ class TimeDelta:
         return datetime.timedelta(days=d)
 
 
+class TradingCalendar:
+    def __init__(self, days):
+        """
+        交易日曆: 以 int32 陣列(yyyymmdd，由小到大排序)保存所有交易日。
+        另外建立以"日序(ordinal)"為索引的查表陣列，涵蓋第一個到最後一個交易日之間的每一天，
+        因此 next/prev/offset/countBetween 皆為 O(1) 的查表與索引運算。
+
+        :param days: 交易日，可為 datetime.date / datetime.datetime / int(yyyymmdd) / str(%Y/%m/%d)
+        """
+        days = sorted(set(TradingCalendar.toKey(day) for day in days))
+        self.days = np.array(days, dtype=np.int32)
+        self.n_day = len(self.days)
+
+        if self.n_day == 0:
+            self.first_ordinal = 0
+            self.last_ordinal = -1
+            self.ceil_index = np.zeros(0, dtype=np.int32)
+            self.is_trading = np.zeros(0, dtype=bool)
+            return
+
+        ordinals = TradingCalendar.keysToOrdinals(self.days)
+        self.first_ordinal = int(ordinals[0])
+        self.last_ordinal = int(ordinals[-1])
+        offsets = ordinals - self.first_ordinal
+
+        # 每一天對應的"當天或之後第一個交易日"的索引值
+        n_ordinal = self.last_ordinal - self.first_ordinal + 1
+        self.ceil_index = np.searchsorted(offsets, np.arange(n_ordinal), side="left").astype(np.int32)
+
+        # 每一天是否為交易日
+        self.is_trading = np.zeros(n_ordinal, dtype=bool)
+        self.is_trading[offsets] = True
+
+    def __repr__(self):
+        if self.n_day == 0:
+            return "TradingCalendar()"
+
+        return f"TradingCalendar({self.days[0]} ~ {self.days[-1]}, #day: {self.n_day})"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        return self.n_day
+
+    # region 建立
+    @staticmethod
+    def fromFile(path: str):
+        """
+        讀取交易日檔案，每行一個日期(yyyymmdd 或 %Y/%m/%d)
+
+        :param path: 檔案路徑
+        :return:
+        """
+        with open(path, "r") as f:
+            days = [line.strip() for line in f if len(line.strip()) > 0]
+
+        return TradingCalendar(days)
+
+    @staticmethod
+    def fromDatabase(stock_ids: list = None, db_name="stock_data",
+                     logger_dir="jikan", logger_name=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")):
+        """
+        以資料庫中 DAY_ 表格出現過的日期作為交易日
+
+        :param stock_ids: 使用哪些股票的日線數據，None 表示使用全部 DAY_ 表格
+        :param db_name: 資料庫名稱
+        :return:
+        """
+        db = DataBase(db_name=db_name, logger_dir=logger_dir, logger_name=logger_name)
+
+        if stock_ids is None:
+            table_names = [row[0] for row in db.getAllTableName() if row[0].startswith("DAY_")]
+        else:
+            table_names = [f"DAY_{stock_id}" for stock_id in stock_ids]
+            table_names = [table_name for table_name in table_names if db.isTableExists(table_name=table_name)]
+
+        days = []
+
+        if len(table_names) > 0:
+            sql = " UNION ".join([f"SELECT TIME FROM {table_name}" for table_name in table_names])
+            days = [row[0] for row in db.execute(sql).fetchall()]
+
+        db.close(auto_commit=False)
+
+        return TradingCalendar(days)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            f.write("\n".join(str(day) for day in self.days))
+
+    # endregion
+
+    # region 轉換
+    @staticmethod
+    def toKey(day) -> int:
+        if isinstance(day, (datetime.date, datetime.datetime)):
+            return day.year * 10000 + day.month * 100 + day.day
+
+        elif isinstance(day, str):
+            # %Y/%m/%d or %Y-%m-%d or yyyymmdd，月、日可不補零(例: 2021/3/24)，可帶有時間(例: 2021/03/24 09:00)
+            day = day.strip().split(" ")[0]
+
+            if len(day) == 8 and day.isdigit():
+                return int(day)
+
+            year, month, date = day.replace("-", "/").split("/")
+
+            return int(year) * 10000 + int(month) * 100 + int(date)
+
+        return int(day)
+
+    @staticmethod
+    def keyToDate(key: int) -> datetime.date:
+        key = int(key)
+        return datetime.date(key // 10000, key // 100 % 100, key % 100)
+
+    @staticmethod
+    def keysToOrdinals(keys):
+        """
+        向量化地將 yyyymmdd 轉換為 datetime.date.toordinal() 相同定義的日序
+
+        :param keys: yyyymmdd 陣列
+        :return: 日序陣列(int64)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        years = keys // 10000
+        months = keys // 100 % 100
+        days = keys % 100
+        dates = ((years - 1970).astype("M8[Y]") +
+                 (months - 1).astype("m8[M]")).astype("M8[D]") + (days - 1).astype("m8[D]")
+
+        # 1970/01/01 的日序為 719163
+        return dates.astype(np.int64) + 719163
+
+    def ordinalOffset(self, day) -> int:
+        if isinstance(day, (datetime.date, datetime.datetime)):
+            ordinal = day.toordinal()
+        else:
+            ordinal = TradingCalendar.keyToDate(TradingCalendar.toKey(day)).toordinal()
+
+        return ordinal - self.first_ordinal
+
+    # endregion
+
+    # region 查詢
+    def isTradingDay(self, day) -> bool:
+        offset = self.ordinalOffset(day)
+
+        if offset < 0 or len(self.is_trading) <= offset:
+            return False
+
+        return bool(self.is_trading[offset])
+
+    def ceilIndex(self, day) -> int:
+        """
+        day 當天(若為交易日)或之後第一個交易日的索引值，超出範圍時返回 0 或 n_day
+
+        :param day: 日期
+        :return:
+        """
+        offset = self.ordinalOffset(day)
+
+        if offset < 0:
+            return 0
+        elif len(self.ceil_index) <= offset:
+            return self.n_day
+
+        return int(self.ceil_index[offset])
+
+    def floorIndex(self, day) -> int:
+        """
+        day 當天(若為交易日)或之前最後一個交易日的索引值，超出範圍時返回 -1 或 n_day - 1
+
+        :param day: 日期
+        :return:
+        """
+        index = self.ceilIndex(day)
+
+        if index < self.n_day and self.isTradingDay(day):
+            return index
+
+        return index - 1
+
+    def getDay(self, index: int) -> datetime.date:
+        return TradingCalendar.keyToDate(self.days[index])
+
+    def next(self, day, n: int = 1):
+        """
+        day 之後的第 n 個交易日，超出日曆範圍時返回 None
+
+        :param day: 日期
+        :param n: 第幾個交易日
+        :return:
+        """
+        return self.offset(day=day, n=n)
+
+    def prev(self, day, n: int = 1):
+        return self.offset(day=day, n=-n)
+
+    def offset(self, day, n: int):
+        """
+        以 day 為基準，往後(n > 0)或往前(n < 0)數第 n 個交易日；day 不為交易日時，
+        往後數以"之前最後一個交易日"為基準，往前數以"之後第一個交易日"為基準
+
+        :param day: 日期
+        :param n: 位移量
+        :return: datetime.date，超出日曆範圍時返回 None
+        """
+        if n >= 0:
+            index = self.floorIndex(day) + n
+        else:
+            index = self.ceilIndex(day) + n
+
+        if index < 0 or self.n_day <= index:
+            return None
+
+        return self.getDay(index)
+
+    def countBetween(self, start, end) -> int:
+        """
+        start 與 end 之間(皆包含)的交易日數量
+
+        :param start: 開始日期
+        :param end: 結束日期
+        :return:
+        """
+        return max(0, self.floorIndex(end) - self.ceilIndex(start) + 1)
+
+    # endregion
+
+    # region 向量化
+    def toIndexs(self, keys):
+        """
+        將 yyyymmdd 陣列轉換為"當天或之後第一個交易日"的索引值
+
+        :param keys: yyyymmdd 陣列
+        :return: 索引值陣列(int32)
+        """
+        offsets = TradingCalendar.keysToOrdinals(keys) - self.first_ordinal
+        indexs = np.empty(len(offsets), dtype=np.int32)
+
+        in_range = (0 <= offsets) & (offsets < len(self.ceil_index))
+        indexs[in_range] = self.ceil_index[offsets[in_range]]
+        indexs[offsets < 0] = 0
+        indexs[offsets >= len(self.ceil_index)] = self.n_day
+
+        return indexs
+
+    def toKeys(self, indexs):
+        return self.days[np.asarray(indexs, dtype=np.int64)]
+
+    # endregion
+
+
 def nowDatetime() -> datetime.datetime:
     """
     datetime.datetime.now() = datetime.datetime.today()
@@ -1,5 +1,3 @@
-from collections import defaultdict
-
 import numpy as np
 
 
@@ -77,93 +75,155 @@ def getCubicInterpolation(points, x):
 
 class SparseBayes:
     def __init__(self, label: list, alpha: float, **kwargs):
+        """
+        以計數估計 p(label | features)，並以 alpha 做拉普拉斯平滑:
+        p(label | features) = (count(label, features) + alpha) / (count(features) + alpha * n_label)
+
+        類別與各特徵的數值會被編碼為整數索引，計數存放於形狀為 (n_label, n_feature_1, n_feature_2, ...) 的陣列中，
+        並快取各特徵組合的總數(對 label 的邊際加總)，因此 fit 與 predict 皆為 O(1)，批次查詢則以 numpy 向量化處理。
+
+        :param label: 所有可能的類別
+        :param alpha: 平滑參數
+        :param kwargs: 特徵名稱 -> 該特徵所有可能的數值，例: f1=[0, 1]
+        """
         self.label = label
         self.n_label = len(self.label)
         self.feature = kwargs
         self.feature_list = []
 
+        # 數值 -> 索引值
+        self.label_index = {value: index for index, value in enumerate(self.label)}
+        self.feature_indexs = []
+
+        # 批次編碼使用: 排序後的數值與其原始索引值
+        self.feature_sorted = []
+        self.feature_orders = []
+
         # 組合總數
         self.n_combination = self.n_label
+        shape = [self.n_label]
 
         for key, value in kwargs.items():
+            value = list(value)
             self.feature_list.append(key)
+            self.feature_indexs.append({v: index for index, v in enumerate(value)})
+
+            order = np.argsort(value, kind="stable")
+            self.feature_orders.append(order)
+            self.feature_sorted.append(np.asarray(value)[order])
+
             self.n_combination *= len(value)
+            shape.append(len(value))
 
         self.alpha = alpha
 
-        self.counter_dict = defaultdict(self.zero)
+        # 各 (label, features) 組合的個數
+        self.counts = np.zeros(shape, dtype=np.int64)
 
-    @staticmethod
-    def zero():
-        return 0
+        # 各 features 組合的個數(counts 對 label 加總)
+        self.totals = np.zeros(shape[1:], dtype=np.int64)
 
-    @staticmethod
-    def dataFormer(raw_data):
-        data = []
+    # region 編碼
+    def encode(self, data) -> tuple:
+        """
+        :param data: 單筆特徵數值，例: [0, 1, 0]
+        :return: 各特徵的索引值
+        """
+        return tuple(indexs[d] for indexs, d in zip(self.feature_indexs, data))
 
-        for raw in raw_data:
-            temp = ""
-            for r in raw:
-                temp += str(r)
+    def encodeBatch(self, datas) -> tuple:
+        """
+        :param datas: 多筆特徵數值，形狀為 (n_data, n_feature)
+        :return: 各特徵的索引值陣列
+        """
+        datas = np.asarray(datas)
+        indexs = []
 
-            data.append(temp)
+        for f, (values, order) in enumerate(zip(self.feature_sorted, self.feature_orders)):
+            column = datas[:, f].astype(values.dtype)
+            position = np.searchsorted(values, column)
 
-        return data
+            if np.any(position >= len(values)) or np.any(values[np.minimum(position, len(values) - 1)] != column):
+                raise KeyError(f"Unknown value of feature {self.feature_list[f]}")
 
-    def fit(self, data, label):
-        for d_i, l_i in zip(data, label):
-            tag = str(l_i)
-
-            for d_j in d_i:
-                tag += str(d_j)
+            indexs.append(order[position])
 
-            self.counter_dict[tag] += 1
+        return tuple(indexs)
 
-    def predictProbablility(self, data):
-        target = ""
+    def encodeLabels(self, labels) -> np.ndarray:
+        return np.array([self.label_index[label] for label in labels], dtype=np.int64)
 
-        for d in data:
-            target += str(d)
+    # endregion
 
-        numerators = [self.alpha for _ in range(len(self.label))]
-        n_denominator = 0
+    def fit(self, data, label):
+        """
+        :param data: 多筆特徵數值，形狀為 (n_data, n_feature)
+        :param label: 各筆數據的類別
+        :return:
+        """
+        if len(label) == 0:
+            return
+
+        feature_indexs = self.encodeBatch(data)
+        np.add.at(self.counts, (self.encodeLabels(label),) + feature_indexs, 1)
+        np.add.at(self.totals, feature_indexs, 1)
+
+    def update(self, data, label):
+        """
+        加入單筆數據
+
+        :param data: 單筆特徵數值
+        :param label: 類別
+        :return:
+        """
+        feature_index = self.encode(data)
+        self.counts[(self.label_index[label],) + feature_index] += 1
+        self.totals[feature_index] += 1
 
-        for key, value in self.counter_dict.items():
-            if key.endswith(target):
-                n_denominator += value
+    def predictProbablility(self, data):
+        feature_index = self.encode(data)
+        numerators = self.counts[(slice(None),) + feature_index] + self.alpha
+        n_denominator = self.totals[feature_index] + self.alpha * self.n_label
 
-                # 取得第 1 個位置的類別，在 self.label 當中的索引值
-                index = self.label.index(eval(key[0]))
+        return numerators / n_denominator
 
-                # 計算各個 label 的個數
-                numerators[index] += value
+    def predictProbablilities(self, datas):
+        """
+        批次查詢
 
-        np_numerators = np.array(numerators)
-        n_denominator += self.alpha * self.n_label
-        probablility = np_numerators / n_denominator
+        :param datas: 多筆特徵數值，形狀為 (n_data, n_feature)
+        :return: 形狀為 (n_data, n_label) 的機率
+        """
+        feature_indexs = self.encodeBatch(datas)
+        numerators = self.counts[(slice(None),) + feature_indexs] + self.alpha
+        n_denominators = self.totals[feature_indexs] + self.alpha * self.n_label
 
-        return probablility
+        return (numerators / n_denominators).T
 
     def prdeict(self, data):
         probablility = self.predictProbablility(data=data)
 
-        # TODO: 機率相同時，先到先得
+        # 機率相同時，先到先得(np.argmax 返回第一個最大值)
         index = int(np.argmax(probablility))
 
         return self.label[index]
 
     def predictProbablilityAndFit(self, data, label):
         probablility = self.predictProbablility(data=data)
-        self.fit(data, label)
+        self.update(data, label)
 
         return probablility
 
     def predictAndFit(self, data, label):
         prdeict_label = self.prdeict(data=data)
-        self.fit(data, label)
+        self.update(data, label)
 
         return prdeict_label
 
+    def reset(self):
+        self.counts.fill(0)
+        self.totals.fill(0)
+
 
 if __name__ == "__main__":
     num = 50
@@ -177,3 +237,4 @@ if __name__ == "__main__":
     probablility = model.predictProbablility(data=data)
     print(f"p(label|{data}): {probablility}")
     print(model.prdeict(data=[0, 1, 0]))
+    print(model.predictProbablilities(datas=x[:5]))
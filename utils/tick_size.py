@@ -0,0 +1,134 @@
+import bisect
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+"""
+台股升降單位(tick size)
+股票: 未滿 10 元 0.01；10 ~ 50 元 0.05；50 ~ 100 元 0.1；100 ~ 500 元 0.5；500 ~ 1000 元 1；1000 元以上 5
+ETF: 每受益權單位市價未滿 50 元者為 1 分；50 元以上為 5 分 (https://www.twse.com.tw/zh/ETF/fund/0050)
+
+價格以"分"為單位的整數表示，各級距的起點皆為前後兩個升降單位的整數倍，
+因此可將價格轉換為"從 0 元起算的第幾個 tick"，在整數上做 floor/next/prev 後再轉回價格，避免浮點數誤差。
+"""
+
+
+class TickTable:
+    def __init__(self, breakpoints, units):
+        """
+        :param breakpoints: 各級距的起始價格(元)，需由小到大排序，第一個必須為 0
+        :param units: 各級距的升降單位(元)
+        """
+        # Decimal 版本，提供單筆價格計算使用
+        self.decimal_bounds = tuple(Decimal(str(b)) for b in breakpoints[1:])
+        self.decimal_units = tuple(Decimal(str(u)) for u in units)
+
+        # 整數(分)版本，提供向量化計算使用
+        self.breakpoints = np.array([round(b * 100) for b in breakpoints], dtype=np.int64)
+        self.units = np.array([round(u * 100) for u in units], dtype=np.int64)
+
+        # 各級距起點的 tick 編號
+        n_ticks = np.diff(self.breakpoints) // self.units[:-1]
+        self.base_ticks = np.concatenate([[0], np.cumsum(n_ticks)]).astype(np.int64)
+
+    # region 單筆價格(Decimal)
+    def unitPrice(self, price) -> Decimal:
+        return self.decimal_units[bisect.bisect_right(self.decimal_bounds, price)]
+
+    def validPrice(self, price) -> Decimal:
+        unit_price = self.unitPrice(price)
+        unit = price // unit_price
+        return (unit_price * unit).quantize(Decimal('.00'), ROUND_HALF_UP)
+
+    # endregion
+
+    # region 向量化(numpy)
+    def toCents(self, prices):
+        # 加上極小值，避免如 19.05 * 100 = 1904.9999... 被無條件捨去成 1904
+        return np.floor(np.asarray(prices, dtype=np.float64) * 100 + 1e-6).astype(np.int64)
+
+    def unitPrices(self, prices):
+        index = np.searchsorted(self.breakpoints, self.toCents(prices), side="right") - 1
+        return self.units[index] / 100.0
+
+    def floorCents(self, cents):
+        # 以"分"表示的價格，無條件捨去至所在級距的有效價格
+        index = np.searchsorted(self.breakpoints, cents, side="right") - 1
+        return self.breakpoints[index] + (cents - self.breakpoints[index]) // self.units[index] * self.units[index]
+
+    def priceToTick(self, prices):
+        """
+        將價格轉換為 tick 編號，不在升降單位上的價格會無條件捨去至前一個有效價格
+
+        :param prices: 價格(元)
+        :return: tick 編號(int64)
+        """
+        cents = self.toCents(prices)
+        index = np.searchsorted(self.breakpoints, cents, side="right") - 1
+        return self.base_ticks[index] + (cents - self.breakpoints[index]) // self.units[index]
+
+    def tickToPrice(self, ticks):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        index = np.searchsorted(self.base_ticks, ticks, side="right") - 1
+        cents = self.breakpoints[index] + (ticks - self.base_ticks[index]) * self.units[index]
+        return cents / 100.0
+
+    def floorPrices(self, prices):
+        return self.tickToPrice(self.priceToTick(prices))
+
+    def nextPrices(self, prices, n_tick=1):
+        return self.tickToPrice(self.priceToTick(prices) + n_tick)
+
+    def lastPrices(self, prices, n_tick=1):
+        """
+        與 utils.getLastValidPrice 相同: 減去當前價格所在級距的升降單位後，再捨去至有效價格。
+        因此在級距交界時，減去的是較大的升降單位(例: 10.00 -> 9.95，而非前一個 tick 9.99)
+
+        :param prices: 價格(元)
+        :param n_tick: 重複次數
+        :return:
+        """
+        cents = self.toCents(prices)
+
+        for _ in range(n_tick):
+            index = np.searchsorted(self.breakpoints, cents, side="right") - 1
+            cents = self.floorCents(np.maximum(cents - self.units[index], 0))
+
+        return cents / 100.0
+
+    # endregion
+
+
+STOCK_TICK_TABLE = TickTable(breakpoints=[0, 10, 50, 100, 500, 1000], units=[0.01, 0.05, 0.1, 0.5, 1, 5])
+ETF_TICK_TABLE = TickTable(breakpoints=[0, 50], units=[0.01, 0.05])
+
+
+def getTickTable(is_etf=False) -> TickTable:
+    if is_etf:
+        return ETF_TICK_TABLE
+    else:
+        return STOCK_TICK_TABLE
+
+
+if __name__ == "__main__":
+    prices = np.array([9.99, 10.0, 19.05, 49.95, 50.0, 99.9, 100.0, 499.5, 500.0, 999.0, 1000.0, 1005.0])
+    ticks = STOCK_TICK_TABLE.priceToTick(prices)
+    print(ticks)
+    print(STOCK_TICK_TABLE.tickToPrice(ticks))
+    print(STOCK_TICK_TABLE.nextPrices(prices))
+    print(STOCK_TICK_TABLE.lastPrices(prices))
+    print(STOCK_TICK_TABLE.validPrice(Decimal("19.07")), STOCK_TICK_TABLE.unitPrice(Decimal("50")))
+
+    # 級距交界與非有效價格: 向量化版本須與單筆版本(utils.getLastValidPrice / getNextValidPrice)相同
+    for table in (STOCK_TICK_TABLE, ETF_TICK_TABLE):
+        checks = np.array([0.01, 9.99, 10.0, 10.02, 49.95, 50.0, 50.03, 100.0, 500.0, 1000.0, 1003.0])
+        lasts = table.lastPrices(checks)
+        nexts = table.nextPrices(checks)
+
+        for check, last, next_price in zip(checks.tolist(), lasts.tolist(), nexts.tolist()):
+            price = Decimal(f"{check:.2f}")
+            unit_price = table.unitPrice(price)
+            assert Decimal(f"{last:.2f}") == table.validPrice(price - unit_price), (check, last)
+            assert Decimal(f"{next_price:.2f}") == table.validPrice(price + unit_price), (check, next_price)
+
+    print(STOCK_TICK_TABLE.lastPrices(np.array([10.0, 50.0, 100.0])), "boundary check passed")
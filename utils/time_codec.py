@@ -0,0 +1,164 @@
+import datetime
+from functools import lru_cache
+
+import numpy as np
+
+"""
+資料庫與報價字串的時間格式固定為 %Y/%m/%d(日線) 與 %Y/%m/%d %H:%M(分線)，
+以字串切片與 int() 解析，取代逐筆呼叫 datetime.strptime / strftime。
+日期大量重複出現(同一天有多檔股票、多根分線)，因此以 lru_cache 記住解析過的日期。
+非固定長度的字串(例如 2021/3/24 或 2021-3-24)會退回使用 strptime。
+
+整數鍵值:
+date_key: yyyymmdd，例: 20200706
+minute_of_day: 當天第幾分鐘，例: 13:06 -> 786
+epoch: 自 1970/01/01 00:00 起算的秒數(不考慮時區)
+"""
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+# region 解析(str -> datetime / int)
+@lru_cache(maxsize=8192)
+def parseDate(date_str: str) -> datetime.datetime:
+    """
+    解析 %Y/%m/%d 或 %Y-%m-%d
+
+    :param date_str: 例: 2020/07/06
+    :return: datetime.datetime(2020, 7, 6)
+    """
+    if len(date_str) == 10:
+        return datetime.datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10]))
+
+    try:
+        return datetime.datetime.strptime(date_str, "%Y/%m/%d")
+    except ValueError:
+        return datetime.datetime.strptime(date_str, "%Y-%m-%d")
+
+
+def parseMinute(date_time: str) -> datetime.datetime:
+    """
+    解析 %Y/%m/%d %H:%M
+
+    :param date_time: 例: 2020/07/06 13:06
+    :return: datetime.datetime(2020, 7, 6, 13, 6)
+    """
+    if len(date_time) == 16:
+        return parseDate(date_time[:10]).replace(hour=int(date_time[11:13]), minute=int(date_time[14:16]))
+
+    return datetime.datetime.strptime(date_time, "%Y/%m/%d %H:%M")
+
+
+def parseDateTime(date_time: str) -> datetime.datetime:
+    """
+    依字串長度判斷為日線或分線時間
+
+    :param date_time: 例: 2020/07/06 或 2020/07/06 13:06
+    :return:
+    """
+    if len(date_time) > 10 and date_time[-3] == ":":
+        return parseMinute(date_time)
+
+    return parseDate(date_time)
+
+
+def dateKey(date_time: str) -> int:
+    """
+    :param date_time: 例: 2020/07/06 或 2020/07/06 13:06
+    :return: 例: 20200706
+    """
+    return int(date_time[:4]) * 10000 + int(date_time[5:7]) * 100 + int(date_time[8:10])
+
+
+def minuteOfDay(date_time: str) -> int:
+    """
+    :param date_time: 例: 2020/07/06 13:06
+    :return: 例: 786
+    """
+    return int(date_time[11:13]) * 60 + int(date_time[14:16])
+
+
+def toEpoch(date_time: str) -> int:
+    return int((parseDateTime(date_time) - EPOCH).total_seconds())
+
+
+# endregion
+
+# region 格式化(datetime -> str / int)
+def formatDate(date_time: datetime.date) -> str:
+    return f"{date_time.year:04d}/{date_time.month:02d}/{date_time.day:02d}"
+
+
+def formatMinute(date_time: datetime.datetime) -> str:
+    return f"{date_time.year:04d}/{date_time.month:02d}/{date_time.day:02d} " \
+           f"{date_time.hour:02d}:{date_time.minute:02d}"
+
+
+def toDateKey(date_time: datetime.date) -> int:
+    return date_time.year * 10000 + date_time.month * 100 + date_time.day
+
+
+def fromDateKey(date_key: int) -> datetime.datetime:
+    return datetime.datetime(date_key // 10000, date_key // 100 % 100, date_key % 100)
+
+
+def toHmsKey(date_time: datetime.datetime) -> int:
+    """
+    :param date_time: 例: datetime.datetime(2020, 7, 7, 13, 25, 5)
+    :return: 例: 132505
+    """
+    return date_time.hour * 10000 + date_time.minute * 100 + date_time.second
+
+
+def secondsToHmsKey(seconds: int) -> int:
+    """
+    :param seconds: 當天第幾秒
+    :return: HHMMSS
+    """
+    return (seconds // 3600) * 10000 + (seconds // 60 % 60) * 100 + seconds % 60
+
+
+# endregion
+
+# region 向量化
+def toCharMatrix(date_times, width: int):
+    """
+    將字串陣列轉為 (n, width) 的數字矩陣(每個字元減去 '0')
+
+    :param date_times: 字串陣列，長度需固定
+    :param width: 字串長度
+    :return:
+    """
+    chars = np.asarray(date_times, dtype=f"S{width}")
+    return chars.view(np.uint8).reshape(len(chars), width).astype(np.int32) - ord("0")
+
+
+def dateKeys(date_times) -> np.ndarray:
+    """
+    :param date_times: %Y/%m/%d 或 %Y/%m/%d %H:%M 字串陣列
+    :return: yyyymmdd 陣列(int32)
+    """
+    digits = toCharMatrix(date_times, width=10)
+    weights = np.array([10000000, 1000000, 100000, 10000, 0, 1000, 100, 0, 10, 1], dtype=np.int32)
+
+    return digits @ weights
+
+
+def minuteOfDays(date_times) -> np.ndarray:
+    """
+    :param date_times: %Y/%m/%d %H:%M 字串陣列
+    :return: 當天第幾分鐘(int32)
+    """
+    digits = toCharMatrix(date_times, width=16)[:, 11:]
+    weights = np.array([600, 60, 0, 10, 1], dtype=np.int32)
+
+    return digits @ weights
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    print(parseDate("2020/07/06"), parseMinute("2020/07/06 13:06"), parseDateTime("2021/3/24"))
+    print(dateKey("2020/07/06 13:06"), minuteOfDay("2020/07/06 13:06"), toEpoch("2020/07/06"))
+    print(dateKeys(["2020/07/06", "2021/12/31 09:01"]), minuteOfDays(["2020/07/06 13:06", "2021/12/31 09:01"]))